@@ -0,0 +1,267 @@
+"""
+Storage scalability benchmarks for LoopStorage.
+
+Generates synthetic libraries and measures load time, peak RSS, write latency,
+get_all_loops throughput and list rendering. Each size runs in its own process
+so peak RSS is not polluted by the previous one; the library files are written
+by the parent process beforehand, so generating them is not measured either.
+
+    python benchmarks/storage_bench.py --output baseline.json
+    python benchmarks/storage_bench.py --sizes 1000 10000 --compare baseline.json
+"""
+import os
+import sys
+import io
+import json
+import builtins
+import time
+import random
+import argparse
+import tempfile
+import platform
+import statistics
+import subprocess
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loopspot import cli
+from loopspot.storage import LoopStorage
+from loopspot.sync import HybridClock
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000)
+LOOPS_PER_TRACK = 4
+
+# Metrics where a higher value is better; all others are times or sizes
+HIGHER_IS_BETTER = {"get_all_loops_loops_per_s"}
+
+def generate_library(path, loop_count, seed=0, versioned=True):
+    """Write a synthetic loop_points.json with loop_count loops.
+    
+    Without versioned, the loops look like those of a library saved before sync
+    existed, so the first load has to migrate them.
+    """
+    rng = random.Random(seed)
+    clock = HybridClock("bench")
+    loops = {}
+    for i in range(loop_count):
+        track_id = f"track{i // LOOPS_PER_TRACK:07d}"
+        point_a = rng.randrange(0, 240000)
+        loop = {
+            "id": f"{i:032x}",
+            "name": f"Loop {i % LOOPS_PER_TRACK + 1}",
+            "track_name": f"Track {i // LOOPS_PER_TRACK}",
+            "artist": f"Artist {rng.randrange(1000)}",
+            "point_a": point_a,
+            "point_b": point_a + rng.randrange(1000, 30000),
+            "created": "2024-01-01 00:00:00",
+            "last_used": f"2024-01-01 {rng.randrange(24):02d}:{rng.randrange(60):02d}:{rng.randrange(60):02d}",
+            "use_count": rng.randrange(50)
+        }
+        if versioned:
+            loop["version"] = clock.tick()
+        loops.setdefault(track_id, []).append(loop)
+    with open(path, 'w') as f:
+        json.dump(loops, f)
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None where unsupported."""
+    if not resource:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def timed_ms(fn, repeat):
+    """Run fn repeat times; returns the median and worst time in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(samples), 3), round(max(samples), 3)
+
+class StubPlayer:
+    """Player stand-in so list rendering can be timed without Spotify."""
+    
+    def get_current_track(self):
+        return None
+    
+    def format_time(self, milliseconds, precise=False):
+        seconds = int(milliseconds) // 1000
+        return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+def render_list(storage):
+    """Render the list view once with the player and terminal stubbed out."""
+    view = cli.LoopSpotCLI.__new__(cli.LoopSpotCLI)
+    view.player = StubPlayer()
+    view.storage = storage
+    
+    original_input, original_clear = builtins.input, cli.clear_screen
+    builtins.input = lambda prompt="": ""  # Leave the view after the first page
+    cli.clear_screen = lambda: None
+    try:
+        with redirect_stdout(io.StringIO()):
+            view.list_saved_loops()
+    finally:
+        builtins.input, cli.clear_screen = original_input, original_clear
+
+def run_size(loop_count, repeat, data_dir, legacy_dir):
+    """Benchmark one library size in this process; returns a dict of metrics.
+    
+    data_dir holds a generated library with sync versions, legacy_dir the same
+    library without them, which is only loaded last to time the migration.
+    """
+    file_mb = os.path.getsize(os.path.join(data_dir, "loop_points.json")) / (1024 * 1024)
+    
+    started = time.perf_counter()
+    storage = LoopStorage(storage_dir=data_dir)
+    first_load_ms = (time.perf_counter() - started) * 1000
+    load_ms, load_max_ms = timed_ms(storage._load_loops, repeat)
+    rss_mb = peak_rss_mb()
+    
+    rng = random.Random(1)
+    track_ids = list(storage.loops)
+    
+    def save():
+        storage.save_loop(rng.choice(track_ids), "Bench Track", "Bench Artist", 1000, 2000, name="bench")
+    
+    def update():
+        storage.update_loop(rng.choice(track_ids), 0, point_b=rng.randrange(2000, 3000))
+    
+    def delete():
+        # Delete the loops added by save() so the library size stays put
+        for track_id in track_ids:
+            loops = storage.loops.get(track_id, [])
+            if loops and loops[-1]["name"] == "bench":
+                storage.delete_loop(track_id, len(loops) - 1)
+                return
+    
+    save_ms, save_max_ms = timed_ms(save, repeat)
+    update_ms, update_max_ms = timed_ms(update, repeat)
+    delete_ms, delete_max_ms = timed_ms(delete, repeat)
+    
+    total_loops = sum(len(loops) for loops in storage.loops.values())
+    all_loops_ms, _ = timed_ms(storage.get_all_loops, repeat)
+    render_ms, render_max_ms = timed_ms(lambda: render_list(storage), repeat)
+    
+    # Loading a pre-sync library stamps every loop and rewrites the file once
+    del storage
+    started = time.perf_counter()
+    LoopStorage(storage_dir=legacy_dir)
+    migrate_load_ms = (time.perf_counter() - started) * 1000
+    
+    return {
+        "loops": loop_count,
+        "file_mb": round(file_mb, 2),
+        "first_load_ms": round(first_load_ms, 3),
+        "migrate_load_ms": round(migrate_load_ms, 3),
+        "load_ms": load_ms,
+        "load_max_ms": load_max_ms,
+        "peak_rss_mb": rss_mb,
+        "save_loop_ms": save_ms,
+        "save_loop_max_ms": save_max_ms,
+        "update_loop_ms": update_ms,
+        "update_loop_max_ms": update_max_ms,
+        "delete_loop_ms": delete_ms,
+        "delete_loop_max_ms": delete_max_ms,
+        "get_all_loops_ms": all_loops_ms,
+        "get_all_loops_loops_per_s": round(total_loops / (all_loops_ms / 1000)) if all_loops_ms else None,
+        "render_list_ms": render_ms,
+        "render_list_max_ms": render_max_ms
+    }
+
+def run_in_subprocess(loop_count, repeat):
+    """Benchmark one size in a fresh interpreter so peak RSS is per size."""
+    with tempfile.TemporaryDirectory() as work_dir:
+        data_dir = os.path.join(work_dir, "current")
+        legacy_dir = os.path.join(work_dir, "legacy")
+        for path, versioned in ((data_dir, True), (legacy_dir, False)):
+            os.makedirs(path)
+            generate_library(os.path.join(path, "loop_points.json"), loop_count, versioned=versioned)
+        
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", str(loop_count), "--repeat", str(repeat),
+             "--data-dir", data_dir, "--legacy-dir", legacy_dir],
+            check=True, capture_output=True, text=True
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def compare(results, baseline, threshold):
+    """Print each metric against the baseline; returns the number of regressions."""
+    previous = {entry["loops"]: entry for entry in baseline["results"]}
+    regressions = 0
+    
+    for entry in results:
+        base = previous.get(entry["loops"])
+        if not base:
+            print(f"\n{entry['loops']:,} loops: not in baseline")
+            continue
+        
+        print(f"\n{entry['loops']:,} loops:")
+        for metric, value in entry.items():
+            old = base.get(metric)
+            if metric == "loops" or not value or not old:
+                continue
+            ratio = value / old
+            # Normalize so that a ratio above 1 always means "worse"
+            worse = 1 / ratio if metric in HIGHER_IS_BETTER else ratio
+            flag = ""
+            if worse > threshold:
+                flag = "  REGRESSION"
+                regressions += 1
+            elif worse < 1 / threshold:
+                flag = "  improved"
+            print(f"  {metric:<28} {old:>14,.3f} -> {value:>14,.3f}  x{ratio:.2f}{flag}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark LoopStorage at growing library sizes.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="library sizes in loops")
+    parser.add_argument("--repeat", type=int, default=5, help="samples per latency metric (default: 5)")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare against a previous results file")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="slowdown ratio reported as a regression (default: 1.2)")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--data-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--legacy-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    
+    if args.child:
+        print(json.dumps(run_size(args.child, args.repeat, args.data_dir, args.legacy_dir)))
+        return 0
+    
+    results = []
+    for loop_count in args.sizes:
+        print(f"Benchmarking {loop_count:,} loops...", file=sys.stderr)
+        results.append(run_in_subprocess(loop_count, args.repeat))
+    
+    report = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": results
+    }
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
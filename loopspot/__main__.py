@@ -2,23 +2,317 @@
 """
 Main entry point for LoopSpot CLI.
 """
+import os
 import sys
-from .cli import LoopSpotCLI
+import json
+import argparse
+import subprocess
+import multiprocessing
+from .log import setup_logging
+from .utils import parse_timestamp
 
-def main():
-    """Run the LoopSpot CLI application."""
-    cli = LoopSpotCLI()
+def timestamp(text):
+    """argparse type for mm:ss[.mmm] timestamps, in milliseconds."""
     try:
-        success = cli.run()
-        sys.exit(0 if success else 1)
+        return parse_timestamp(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid timestamp {text!r}, expected mm:ss or mm:ss.mmm")
+
+def build_parser():
+    """Build the command-line argument parser."""
+    from .library_io import FORMATS
+    
+    parser = argparse.ArgumentParser(prog="loopspot", description="Spotify AB looper.")
+    parser.add_argument("--startup-timings", action="store_true", help="show how long each startup stage took")
+    subparsers = parser.add_subparsers(dest="command")
+    
+    export_parser = subparsers.add_parser("export", help="export the loop library to a file")
+    export_parser.add_argument("path", help="destination file")
+    export_parser.add_argument("--format", choices=FORMATS, help="dump format (default: from extension)")
+    
+    import_parser = subparsers.add_parser("import", help="import loops from an exported file")
+    import_parser.add_argument("path", help="file to import")
+    import_parser.add_argument("--format", choices=FORMATS, help="dump format (default: from extension)")
+    import_parser.add_argument("--batch-size", type=int, default=10000, help="loops written per batch")
+    import_parser.add_argument("--workers", type=int, help="parser processes (default: CPU count)")
+    
+    check_parser = subparsers.add_parser("check", help="refresh track names and find broken loops")
+    check_parser.add_argument("--repair", action="store_true", help="clamp loops to the track length and follow relinked tracks")
+    
+    # Headless commands for scripts and hotkey daemons
+    output_parser = argparse.ArgumentParser(add_help=False)
+    output_parser.add_argument("--json", action="store_true", help="print machine-readable JSON")
+    engine_parser = argparse.ArgumentParser(add_help=False, parents=[output_parser])
+    engine_parser.add_argument("--timeout", type=float, default=5.0, help="seconds to wait for the engine (default: 5)")
+    
+    loop_parser = subparsers.add_parser("loop", parents=[engine_parser], help="loop a range of the current track")
+    loop_parser.add_argument("--a", required=True, type=timestamp, help="point A as mm:ss[.mmm]")
+    loop_parser.add_argument("--b", required=True, type=timestamp, help="point B as mm:ss[.mmm]")
+    
+    load_parser = subparsers.add_parser("load", parents=[engine_parser], help="load a saved loop by name or ID")
+    load_parser.add_argument("name", help="loop name or ID")
+    load_parser.add_argument("--track", help="only match loops of this track (ID or part of the name)")
+    
+    list_parser = subparsers.add_parser("list", parents=[output_parser], help="list saved loops")
+    list_parser.add_argument("--track", help="only list loops of this track (ID or part of the name)")
+    
+    save_parser = subparsers.add_parser("save", parents=[engine_parser], help="save the current loop")
+    save_parser.add_argument("--name", help="loop name (default: Loop <n>)")
+    
+    stop_parser = subparsers.add_parser("stop", parents=[engine_parser], help="stop the active loop")
+    stop_parser.add_argument("--shutdown", action="store_true", help="also shut down a background engine")
+    
+    subparsers.add_parser("status", parents=[output_parser], help="show the loop state without calling the API")
+    subparsers.add_parser("serve", help="run the loop engine in the background without the menu")
+    
+    sync_parser = subparsers.add_parser("sync", parents=[output_parser], help="exchange loop changes with a sync server")
+    sync_parser.add_argument("url", help="sync server URL, e.g. http://192.168.1.10:8765")
+    sync_parser.add_argument("--token", help="shared secret the server was started with")
+    
+    server_parser = subparsers.add_parser("sync-server", help="run a sync server for other machines")
+    server_parser.add_argument("--host", default="127.0.0.1", help="address to listen on (0.0.0.0 for the LAN)")
+    server_parser.add_argument("--port", type=int, default=8765, help="port to listen on (default: 8765)")
+    server_parser.add_argument("--token", help="require this shared secret from clients")
+    
+    return parser
+
+def emit(args, data, text):
+    """Print a command result as JSON or as text."""
+    print(json.dumps(data) if args.json else text)
+    return data.get("ok", True)
+
+def format_ms(milliseconds):
+    """Format milliseconds as mm:ss.mmm."""
+    if milliseconds is None:
+        return "--:--.---"
+    seconds, millis = divmod(int(milliseconds), 1000)
+    return f"{seconds // 60:02d}:{seconds % 60:02d}.{millis:03d}"
+
+def start_engine():
+    """Start 'loopspot serve' as a detached background process."""
+    command = [sys.executable] if getattr(sys, 'frozen', False) else [sys.executable, "-m", "loopspot"]
+    options = {}
+    if os.name == 'nt':
+        options["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        options["start_new_session"] = True
+    subprocess.Popen(command + ["serve"], stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                     stderr=subprocess.DEVNULL, close_fds=True, **options)
+
+def send_to_engine(args, action, start=False, **params):
+    """Hand a command to the process running the loop engine and wait for its result."""
+    from .control import ControlChannel
+    
+    channel = ControlChannel()
+    if not channel.engine_running():
+        if not start:
+            return {"ok": False, "error": "No LoopSpot engine is running."}
+        start_engine()
+        # The timeout for the command itself only starts once the new engine is up
+        if not channel.wait_engine(args.timeout):
+            return {"ok": False, "error": "The LoopSpot engine did not start."}
+    
+    command_id = channel.send(action, expires_in=args.timeout, **params)
+    result = channel.wait_result(command_id, args.timeout)
+    return result or {"ok": False, "error": "The LoopSpot engine did not respond."}
+
+def describe_state(result):
+    """One-line text summary of an engine result."""
+    if not result["ok"]:
+        return f"Error: {result['error']}"
+    state = result.get("state")
+    if not state or state["point_a"] is None or state["point_b"] is None:
+        return "No loop set."
+    status = "active" if state["active"] else "inactive"
+    name = f" '{state['loop_name']}'" if state["loop_name"] else ""
+    return f"Loop{name} {format_ms(state['point_a'])} - {format_ms(state['point_b'])} ({status})"
+
+def match_track(track, query):
+    """Check whether a get_all_loops() entry matches a track ID or name fragment."""
+    return query == track["track_id"] or query.lower() in track["track_name"].lower()
+
+def run_export(args):
+    """Export the loop library."""
+    from .storage import LoopStorage
+    from .library_io import export_library
+    
+    count = export_library(LoopStorage(), args.path, args.format)
+    print(f"Exported {count} loops to {args.path}")
+    return True
+
+def run_import(args):
+    """Import loops into the library."""
+    from .storage import LoopStorage
+    from .library_io import import_library
+    
+    stats = import_library(LoopStorage(), args.path, args.format, args.batch_size, args.workers)
+    print(f"Imported {stats['imported']} loops "
+          f"({stats['duplicates']} duplicates skipped, {stats['rejected']} invalid)")
+    return True
+
+def run_check(args):
+    """Refresh track metadata for the whole library."""
+    from .auth import SpotifyAuth
+    from .spotify_api import SpotifyPlayer
+    from .storage import LoopStorage
+    from .library_check import LibraryValidator
+    
+    sp = SpotifyAuth().get_spotify_client()
+    if not sp:
+        print("Failed to authenticate with Spotify.")
+        return False
+    
+    report = LibraryValidator(SpotifyPlayer(sp), LoopStorage()).run(repair=args.repair)
+    print(f"{report['renamed']} renamed, {report['relinked']} relinked, {report['repaired']} repaired")
+    if report['unchecked']:
+        print(f"{report['unchecked']} tracks could not be checked (API errors); run the check again later")
+    for track_name, loop_name, issue in report['flagged']:
+        print(f"  ! {track_name} / {loop_name}: {issue.replace('_', ' ')}")
+    return True
+
+def run_loop(args):
+    """Loop a range of the current track."""
+    result = send_to_engine(args, "loop", start=True, point_a=args.a, point_b=args.b)
+    return emit(args, result, describe_state(result))
+
+def run_load(args):
+    """Load a saved loop by name or ID."""
+    from .storage import LoopStorage
+    
+    matches = []
+    for track in LoopStorage().get_all_loops():
+        if args.track and not match_track(track, args.track):
+            continue
+        for loop in track["loops"]:
+            if args.name == loop["id"] or args.name.lower() == loop["name"].lower():
+                matches.append((track, loop))
+    
+    if len(matches) != 1:
+        error = "No loop matches that name." if not matches else "Several loops match; narrow it down with --track."
+        result = {"ok": False, "error": error,
+                  "matches": [{"track_id": track["track_id"], "track_name": track["track_name"], "id": loop["id"]}
+                              for track, loop in matches]}
+        text = "\n".join([f"Error: {error}"] + [f"  {track['track_name']} ({loop['id']})" for track, loop in matches])
+        return emit(args, result, text)
+    
+    track, loop = matches[0]
+    result = send_to_engine(args, "load", start=True, track_id=track["track_id"], loop_id=loop["id"])
+    return emit(args, result, describe_state(result))
+
+def run_list(args):
+    """List saved loops from the library file; needs no Spotify login."""
+    from .storage import LoopStorage
+    
+    tracks = [track for track in LoopStorage().get_all_loops() if not args.track or match_track(track, args.track)]
+    if args.json:
+        print(json.dumps(tracks))
+        return True
+    
+    for track in tracks:
+        print(f"{track['track_name']} - {track['artist']} ({track['track_id']})")
+        for loop in track["loops"]:
+            print(f"  {loop['name']}: {format_ms(loop['point_a'])} - {format_ms(loop['point_b'])}")
+    return True
+
+def run_save(args):
+    """Save the engine's current loop."""
+    result = send_to_engine(args, "save", name=args.name)
+    text = describe_state(result)
+    if result["ok"]:
+        text = f"Saved '{result['loop']['name']}' ({result['loop']['id']})"
+    return emit(args, result, text)
+
+def run_stop(args):
+    """Stop the active loop."""
+    result = send_to_engine(args, "stop", shutdown=args.shutdown)
+    return emit(args, result, describe_state(result))
+
+def run_status(args):
+    """Show the last persisted loop state; reads only the session file."""
+    from .control import ControlChannel
+    from .session import SessionStore
+    
+    session = SessionStore().load() or {}
+    state = {field: session.get(field) for field in ("track_id", "point_a", "point_b", "loop_name", "active")}
+    result = {"ok": True, "engine_running": ControlChannel().engine_running(), "state": state,
+              "device_id": session.get("device_id"), "saved_at": session.get("saved_at")}
+    engine = "engine running" if result["engine_running"] else "engine not running"
+    return emit(args, result, f"{describe_state(result)} [{engine}]")
+
+def run_serve(args):
+    """Run the loop engine without the interactive menu."""
+    from .cli import LoopSpotCLI
+    
+    return LoopSpotCLI().serve()
+
+def run_sync(args):
+    """Exchange loop changes with a sync server."""
+    from .storage import LoopStorage
+    from .sync import SyncClient
+    
+    stats = SyncClient(LoopStorage(), args.url, token=args.token).sync()
+    return emit(args, dict(stats, ok=True),
+                f"Pushed {stats['pushed']} and pulled {stats['pulled']} changes "
+                f"({stats['applied']} applied; {stats['bytes_sent']} B sent, {stats['bytes_received']} B received)")
+
+def run_sync_server(args):
+    """Run a sync server until interrupted."""
+    from .sync import SyncHub, SyncServer
+    
+    server = SyncServer(SyncHub(), args.host, args.port, token=args.token)
+    print(f"Sync server listening on http://{args.host}:{server.server_address[1]} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return True
+
+def run_interactive(args):
+    """Run the interactive LoopSpot menu."""
+    from .cli import LoopSpotCLI
+    
+    cli = LoopSpotCLI(show_startup_timings=args.startup_timings)
+    try:
+        return cli.run()
     except KeyboardInterrupt:
         print("\nProgram interrupted by user. Exiting...")
         if cli.loop_controller and cli.loop_controller.active:
             cli.loop_controller.stop_loop()
-        sys.exit(0)
+        return True
+
+def main(argv=None):
+    """Run the LoopSpot CLI application."""
+    # Needed for the import worker processes in frozen executables
+    multiprocessing.freeze_support()
+    setup_logging()
+    args = build_parser().parse_args(argv)
+    
+    commands = {
+        "export": run_export,
+        "import": run_import,
+        "check": run_check,
+        "loop": run_loop,
+        "load": run_load,
+        "list": run_list,
+        "save": run_save,
+        "stop": run_stop,
+        "status": run_status,
+        "serve": run_serve,
+        "sync": run_sync,
+        "sync-server": run_sync_server
+    }
+    
+    try:
+        if args.command in commands:
+            success = commands[args.command](args)
+        else:
+            success = run_interactive(args)
+        sys.exit(0 if success else 1)
     except Exception as e:
         print(f"Error: {e}")
         sys.exit(1)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,117 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+from .utils import get_application_path
+
+logger = logging.getLogger(__name__)
+
+SNAP_MODES = (None, "beat", "bar")
+
+class AnalysisCache:
+    """Disk cache of beat and bar start times taken from Spotify audio analysis."""
+    
+    def __init__(self, fetch_analysis, storage_dir="data", max_bytes=20 * 1024 * 1024, memory_items=8):
+        """Initialize with a callable that returns the audio analysis for a track ID."""
+        self.fetch_analysis = fetch_analysis
+        self.cache_dir = os.path.join(get_application_path(), storage_dir, "analysis")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self._memory = OrderedDict()  # Recently used grids, track_id -> dict of arrays
+        self._unavailable = set()  # Tracks whose analysis could not be fetched this run
+        self._lock = threading.Lock()
+    
+    def _path(self, track_id):
+        return os.path.join(self.cache_dir, f"{track_id}.npz")
+    
+    def get(self, track_id):
+        """Get {'beat': array, 'bar': array} of start times in ms, or None if unavailable."""
+        with self._lock:
+            if track_id in self._memory:
+                self._memory.move_to_end(track_id)
+                return self._memory[track_id]
+            if track_id in self._unavailable:
+                return None
+        
+        grids = self._load(track_id)
+        if grids is None:
+            grids = self._fetch(track_id)
+            if grids is None:
+                with self._lock:
+                    self._unavailable.add(track_id)
+                return None
+        
+        with self._lock:
+            self._memory[track_id] = grids
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+        return grids
+    
+    def _load(self, track_id):
+        """Load grids from disk and mark the file as recently used."""
+        path = self._path(track_id)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                grids = {"beat": data["beat"], "bar": data["bar"]}
+            os.utime(path)  # The mtime doubles as the LRU timestamp
+            return grids
+        except Exception as e:
+            logger.error("Error loading analysis cache: %s", e)
+            return None
+    
+    def _fetch(self, track_id):
+        """Fetch the analysis once and store the beat and bar grids on disk."""
+        try:
+            analysis = self.fetch_analysis(track_id)
+        except Exception as e:
+            logger.info("Audio analysis unavailable: %s", e, extra={"track_id": track_id})
+            return None
+        if not analysis:
+            return None
+        
+        # Start times in whole milliseconds, already sorted by Spotify
+        grids = {
+            "beat": np.array([round(b["start"] * 1000) for b in analysis.get("beats", [])], dtype=np.int32),
+            "bar": np.array([round(b["start"] * 1000) for b in analysis.get("bars", [])], dtype=np.int32)
+        }
+        try:
+            np.savez_compressed(self._path(track_id), **grids)
+            self._evict()
+        except Exception as e:
+            logger.error("Error saving analysis cache: %s", e)
+        return grids
+    
+    def _evict(self):
+        """Remove least recently used files until the cache fits in max_bytes."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+        
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+def snap_to_grid(grid, position_ms):
+    """Snap a position (or array of positions) to the nearest grid point."""
+    if grid is None or len(grid) == 0:
+        return position_ms
+    
+    positions = np.asarray(position_ms)
+    right = np.clip(np.searchsorted(grid, positions), 1, len(grid) - 1)
+    left = right - 1
+    # Pick whichever neighbour is closer; a single-point grid collapses to it
+    use_left = np.abs(positions - grid[left]) <= np.abs(grid[right] - positions)
+    snapped = np.where(use_left, grid[left], grid[right])
+    
+    if np.ndim(position_ms) == 0:
+        return int(snapped)
+    return snapped
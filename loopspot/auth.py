@@ -1,13 +1,17 @@
 import os
 import json
+import logging
 import webbrowser
 import sys
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
+import requests
 import spotipy
 from spotipy.oauth2 import SpotifyOAuth
 from .utils import get_application_path
 
+logger = logging.getLogger(__name__)
+
 # Paths
 BASE_DIR = get_application_path()
 DATA_DIR = os.path.join(BASE_DIR, "data")
@@ -18,6 +22,17 @@ TOKEN_PATH = os.path.join(DATA_DIR, "spotify_token.json")
 DEFAULT_REDIRECT_URI = "http://127.0.0.1:8888/"
 DEFAULT_SCOPE = "user-read-playback-state user-modify-playback-state user-read-currently-playing"
 
+# (connect, read) timeout in seconds for every Web API request. Clients get a
+# plain requests session without spotipy's retry adapter, so a request never
+# blocks for longer than this; retries and backoff are left to the circuit
+# breaker and the loop engine.
+REQUEST_TIMEOUT = (3.05, 5)
+
+def build_client(access_token, requests_session=None):
+    """Create a Spotify client whose requests are bounded by REQUEST_TIMEOUT."""
+    return spotipy.Spotify(auth=access_token, requests_session=requests_session or requests.Session(),
+                           requests_timeout=REQUEST_TIMEOUT)
+
 class AuthCallbackHandler(BaseHTTPRequestHandler):
     """Handler for OAuth callback."""
     
@@ -47,11 +62,14 @@ class AuthCallbackHandler(BaseHTTPRequestHandler):
 class SpotifyAuth:
     """Handle Spotify authentication."""
     
-    def __init__(self, cache_dir="data"):
-        """Initialize the auth manager."""
+    def __init__(self, cache_dir="data", account=None):
+        """Initialize the auth manager, optionally for an additional named account."""
         os.makedirs(DATA_DIR, exist_ok=True)
         self.credentials_path = CREDENTIALS_PATH
-        self.token_path = TOKEN_PATH
+        if account:
+            self.token_path = os.path.join(DATA_DIR, f"spotify_token_{account}.json")
+        else:
+            self.token_path = TOKEN_PATH
         
         # Get or create credentials
         self.credentials = self._get_or_create_credentials()
@@ -121,17 +139,30 @@ class SpotifyAuth:
         except Exception as e:
             print(f"Error saving credentials: {e}")
     
-    def get_spotify_client(self):
-        """Get an authenticated Spotify client."""
+    def get_spotify_client(self, requests_session=None):
+        """Get an authenticated Spotify client, optionally on an existing requests session."""
         token_info = self._get_token_info()
         
         if not token_info:
             token_info = self._authenticate()
             
         if token_info:
-            return spotipy.Spotify(auth=token_info['access_token'])
+            return build_client(token_info['access_token'], requests_session=requests_session)
         return None
     
+    def refresh_client(self):
+        """Get a client with a freshly refreshed token, without prompting; None on failure."""
+        try:
+            with open(self.token_path, 'r') as f:
+                token_info = json.load(f)
+            token_info = self.sp_oauth.refresh_access_token(token_info['refresh_token'])
+            with open(self.token_path, 'w') as f:
+                json.dump(token_info, f)
+            return build_client(token_info['access_token'])
+        except Exception as e:
+            logger.warning("Token refresh failed: %s", e, extra={"event": "token_refresh_failed"})
+            return None
+    
     def _get_token_info(self):
         """Get token info from cache."""
         try:
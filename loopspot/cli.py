@@ -1,10 +1,24 @@
 import os
 import sys
 import time
+import requests
 from .auth import SpotifyAuth
 from .spotify_api import SpotifyPlayer
-from .storage import LoopStorage
+from .storage import LoopStorage, StorageError
+from .session import SessionStore
+from .control import ControlChannel
+from .analysis import AnalysisCache, SNAP_MODES
+from .library_check import LibraryValidator
+from .hotlist import HotList
 from .loop_logic import LoopController
+from .startup import StartupPipeline
+from .intervals import LoopIndex
+from .keys import read_key, single_keys, KEY_ESCAPE
+from .search import CatalogSearch, normalize_query
+from .utils import parse_timestamp
+from .ticker import LiveTicker, format_ticker
+
+API_URL = "https://api.spotify.com/v1/"
 
 def clear_screen():
     """Clear the terminal screen."""
@@ -13,40 +27,122 @@ def clear_screen():
 class LoopSpotCLI:
     """Command-line interface for LoopSpot."""
     
-    def __init__(self):
-        """Initialize the CLI."""
-        self.auth = SpotifyAuth()
+    PAGE_SIZE = 10  # Tracks per page in library listings
+    SORT_ORDERS = ("recent", "name")
+    SEARCH_DEBOUNCE = 0.3  # Pause in typing (seconds) before a typeahead search is sent
+    SEARCH_MIN_LENGTH = 2
+    
+    def __init__(self, show_startup_timings=False):
+        """Initialize the CLI; the heavy lifting happens in initialize()."""
+        self.auth = None
         self.sp = None
         self.player = None
-        self.storage = LoopStorage()
+        self.storage = None
+        self.hotlist = None
+        self.session = SessionStore()
+        self.control = ControlChannel()
         self.loop_controller = None
         self.running = True
+        self.interactive = True
+        self.show_startup_timings = show_startup_timings
+        self.startup = None  # StartupPipeline of the last initialize(), for its timings
+        self.first_track = None  # Playback fetched during startup, drawn on the first frame
+        self.ticker = LiveTicker(self.ticker_line)  # Live status line above the command prompt
+    
+    def _load_storage(self):
+        """Load the loop library and the hotlist built from it."""
+        storage = LoopStorage()
+        storage.start_watching()  # Pick up loops saved by other LoopSpot processes
+        self.hotlist = HotList.from_storage(storage)
+        return storage
+    
+    def _prewarm_session(self, session):
+        """Open the API connection (DNS, TCP and TLS) ahead of the first real request."""
+        try:
+            session.head(API_URL, timeout=5)
+        except requests.RequestException:
+            pass  # The first API call will simply connect on its own
+    
+    def _fetch_first_playback(self, sp):
+        """Create the player and fetch the playback shown on the first frame."""
+        player = SpotifyPlayer(sp)
+        return player, player.get_current_track()
     
     def initialize(self):
-        """Initialize the Spotify client and other components."""
+        """Initialize the Spotify client and other components.
+        
+        Independent stages (loading the library, reading and refreshing the token,
+        connecting to the API, fetching playback) run concurrently.
+        """
         print("Initializing LoopSpot CLI...")
-        self.sp = self.auth.get_spotify_client()
+        # The client shares this session, so it reuses the prewarmed connection
+        session = requests.Session()
+        startup = self.startup = StartupPipeline()
+        startup.add("credentials", lambda: self.auth or SpotifyAuth())
+        startup.add("storage", lambda: self.storage or self._load_storage())
+        startup.add("prewarm", lambda: self._prewarm_session(session))
+        startup.add("token", lambda auth: auth.get_spotify_client(requests_session=session),
+                    deps=("credentials",))
+        startup.add("playback", lambda sp, _: sp and self._fetch_first_playback(sp), deps=("token", "prewarm"))
         
-        if not self.sp:
-            print("Failed to authenticate with Spotify.")
-            return False
+        try:
+            self.auth = startup.result("credentials")
+            self.sp = startup.result("token")
+            if not self.sp:
+                print("Failed to authenticate with Spotify.")
+                return False
+            
+            self.player, self.first_track = startup.result("playback")
+            self.storage = startup.result("storage")
+        finally:
+            startup.shutdown()
         
-        self.player = SpotifyPlayer(self.sp)
+        self.player.token_refresher = self._refresh_client
         self.loop_controller = LoopController(self.player)
+        self.analysis = AnalysisCache(self.player.get_audio_analysis)
+        self.library_validator = LibraryValidator(self.player, self.storage)
+        self.loop_index = LoopIndex(self.storage)
+        self.catalog = CatalogSearch(self.player)
         
         # Set UI refresh callback
         self.loop_controller.set_ui_refresh_callback(self.refresh_ui)
         
+        # Persist every state change and pick up where the last run left off
+        self.loop_controller.set_state_callback(self._save_session)
+        self._resume_session(self.first_track)
+        
         return True
     
+    def _save_session(self, state):
+        """Persist the loop state for a warm restart."""
+        self.session.save(state, device_id=self.player.devices.pinned_device_id)
+    
+    def _resume_session(self, track):
+        """Restore the previous session if its track is still playing."""
+        session = self.session.load()
+        if not session:
+            return
+        
+        if session.get('device_id'):
+            self.player.devices.pin(session['device_id'])
+        
+        if not session.get('track_id'):
+            return
+        
+        if not self.loop_controller.resume(session, track):
+            print("Previous loop session is for a different track; not resuming.")
+    
     def refresh_ui(self):
         """Refresh the UI after loop monitor actions."""
-        # Clear the screen and redraw the UI
-        clear_screen()
-        self.print_header()
-        self.print_current_track()
-        self.print_menu()
-        sys.stdout.flush()  # Ensure output is displayed
+        # Clear the screen and redraw the UI; the ticker waits so it cannot draw mid-frame
+        with self.ticker.lock:
+            clear_screen()
+            self.print_header()
+            self.print_current_track()
+            self.print_hotlist()
+            self.print_library_check_status()
+            self.print_menu()
+            sys.stdout.flush()  # Ensure output is displayed
     
     def print_header(self):
         """Print the application header."""
@@ -55,30 +151,113 @@ class LoopSpotCLI:
         print("LoopSpot - Spotify AB Looper")
         print("=" * 60)
     
-    def print_current_track(self):
-        """Print information about the current track."""
+    def print_current_track(self, track=None):
+        """Print information about the current track, fetching it unless it is given."""
+        track = track or self.player.get_current_track()
         print("\nCurrent Track:")
-        print(self.player.get_pretty_playback_status())
+        print(self.player.get_pretty_playback_status(track) if track else "No track is currently playing.")
+        self.print_inside_loops(track)
+        
+        # Read a single snapshot so the display never mixes old and new points
+        state = self.loop_controller.state
         
         # Show point A regardless of whether point B is set
-        if self.loop_controller.point_a is not None:
-            point_a_time = self.player.format_time(self.loop_controller.point_a)
+        if state.point_a is not None:
+            point_a_time = self.player.format_time(state.point_a, precise=True)
             print(f"Point A: {point_a_time}")
             
             # Show point B if it's also set
-            if self.loop_controller.point_b is not None:
-                point_b_time = self.player.format_time(self.loop_controller.point_b)
+            if state.point_b is not None:
+                point_b_time = self.player.format_time(state.point_b, precise=True)
                 print(f"Point B: {point_b_time}")
                 
                 # Show loop name if it exists
-                if self.loop_controller.current_loop_name:
-                    print(f"Loop Name: {self.loop_controller.current_loop_name}")
+                if state.loop_name:
+                    print(f"Loop Name: {state.loop_name}")
                 
                 # Only show loop status when both points are set
-                if self.loop_controller.active:
+                if state.active:
                     print("Loop Status: ACTIVE")
+                    self.print_engine_health()
+                    if self.player.poll_stats.polls:
+                        size, cpu_ms = self.player.poll_stats.summary()
+                        print(f"Poll cost: {size} B, {cpu_ms:.2f} ms CPU per poll")
                 else:
                     print("Loop Status: INACTIVE")
+        
+        self.print_api_health()
+    
+    def print_inside_loops(self, track):
+        """Print the saved loops that contain the playback position, innermost first."""
+        if not track:
+            return
+        
+        loops = self.loop_index.containing(track['id'], track['progress_ms'])
+        if loops:
+            print("Inside saved loops: " + ", ".join(self.format_loop(loop) for loop in loops))
+    
+    def arm_innermost_loop(self):
+        """Load and start the innermost saved loop around the current position."""
+        track = self.player.get_current_track()
+        loops = self.loop_index.containing(track['id'], track['progress_ms']) if track else ()
+        if not loops:
+            print("No saved loop contains the current position.")
+            time.sleep(1)
+            return
+        
+        self.activate_loop(track['id'], loops[0], track)
+    
+    def capture_points(self):
+        """Mark points with single keypresses, timed at the moment each key is pressed."""
+        print("\nCapture mode: press 'a' for point A, 'b' for point B, 's' to start the loop, 'q' to go back.")
+        # Stay in cbreak mode throughout, so a key pressed while a point is still being set is kept
+        with single_keys():
+            while True:
+                key, pressed_at = read_key()
+                key = key.lower()
+                if key == 'a':
+                    self.loop_controller.set_point_a(pressed_at)
+                elif key == 'b':
+                    self.loop_controller.set_point_b(pressed_at)
+                elif key == 's':
+                    self.loop_controller.start_loop()
+                elif key in ('q', KEY_ESCAPE, ''):  # '' is the end of piped input
+                    return
+    
+    def print_engine_health(self):
+        """Print the engine's scheduling lag, and warn when it has stalled or been restarted."""
+        health = self.loop_controller.engine_health()
+        if not health['running']:
+            print("Engine: NOT RUNNING")
+        elif health['stalled_ms'] >= 10000:  # Longer than any healthy tick, even one with slow requests
+            print(f"Engine: STALLED for {health['stalled_ms'] / 1000:.1f}s (restarts after "
+                  f"{self.loop_controller.STALL_THRESHOLD:.0f}s)")
+        elif health['tick_lag_ms'] is not None:
+            print(f"Engine: tick lag {health['tick_lag_ms']:.0f} ms (worst {health['max_tick_lag_ms']:.0f} ms)")
+        if health['restarts']:
+            print(f"Engine restarted {health['restarts']}x by the watchdog")
+    
+    def print_api_health(self):
+        """Print API error counters and the circuit state once anything has failed."""
+        counts = self.player.error_counts
+        if not counts:
+            return
+        
+        summary = ", ".join(f"{error_class} {count}" for error_class, count in counts.most_common())
+        print(f"API errors: {summary} (circuit {self.player.breaker.state})")
+    
+    def print_library_check_status(self):
+        """Print the state of the background library check, if one was started."""
+        if self.library_validator.running:
+            print("\nLibrary check: running...")
+            return
+        
+        report = self.library_validator.last_report
+        if report:
+            print(f"\nLibrary check: {report['renamed']} renamed, {report['relinked']} relinked, "
+                  f"{report['repaired']} repaired, {len(report['flagged'])} flagged")
+            if report['unchecked']:
+                print(f"{report['unchecked']} tracks could not be checked (API errors); run the check again later")
     
     def print_menu(self):
         """Print the main menu."""
@@ -95,48 +274,95 @@ class LoopSpotCLI:
         print("  10. Delete a saved loop")
         print("  11. Refresh spotify token and show current track")
         print("  12. Reset Spotify credentials")
+        print("  13. Select playback device")
+        print("  14. Configure fan-out devices")
+        print(f"  15. Toggle beat/bar snapping (now: {self.loop_controller.snap_mode or 'off'})")
+        print("  16. Check library (refresh track names, find broken loops)")
+        print("  17. Find a track in the catalog")
+        print("  r1-r5 / f1-f3. Recall a recent / most used loop")
+        print("  i. Arm the innermost saved loop at the current position")
+        print("  c. Capture mode (mark A/B with a single keypress)")
         print("  0. Exit")
-        print("\nEnter command: ", end="")
+        print("\n" + self.ticker_line())
+        print("Enter command: ", end="")
+    
+    def ticker_line(self):
+        """Get the live status line, extrapolated from the last poll without calling the API."""
+        return format_ticker(self.player.last_sample(), self.loop_controller.state, self.player.format_time)
+    
+    def format_loop(self, loop):
+        """Format a saved loop for listings, marking loops flagged by the library check."""
+        text = f"{loop['name']}: {self.player.format_time(loop['point_a'])} - {self.player.format_time(loop['point_b'])}"
+        if loop.get('issue'):
+            text += f" [! {loop['issue'].replace('_', ' ')}]"
+        return text
+    
+    def _library_page(self, page, order_by, exclude):
+        """Get (page, page count, tracks) for one page of the library, clamping the page number."""
+        pages = max(1, -(-self.storage.count_tracks(exclude) // self.PAGE_SIZE))
+        page = max(0, min(page, pages - 1))
+        tracks = list(self.storage.iter_tracks(page * self.PAGE_SIZE, self.PAGE_SIZE, order_by, exclude))
+        return page, pages, tracks
+    
+    def _current_track_entry(self, current_track):
+        """Get the library entry of the current track, or None if it has no loops."""
+        if not current_track:
+            return None
+        loops = self.storage.get_loops_for_track(current_track['id'])
+        if not loops:
+            return None
+        return {'track_id': current_track['id'], 'track_name': loops[0]['track_name'],
+                'artist': loops[0]['artist'], 'loops': loops}
+    
+    def _page_navigation(self, choice, page, order_by):
+        """Apply an n/p/s paging command; returns (page, order_by) or None for other input."""
+        if choice == 'n':
+            return page + 1, order_by
+        if choice == 'p':
+            return page - 1, order_by
+        if choice == 's':
+            # Cycle the sort order and start again from the first page
+            return 0, self.SORT_ORDERS[(self.SORT_ORDERS.index(order_by) + 1) % len(self.SORT_ORDERS)]
+        return None
     
     def list_saved_loops(self):
-        """List all saved loops."""
-        clear_screen()
-        print("Saved Loops:")
-        print("=" * 60)
-        
-        all_loops = self.storage.get_all_loops()
+        """List saved loops a page at a time."""
+        current_track = self.player.get_current_track()
+        current_track_loops = self._current_track_entry(current_track)
+        exclude = current_track['id'] if current_track else None
         
-        if not all_loops:
+        if not current_track_loops and not self.storage.count_tracks():
+            clear_screen()
             print("No saved loops found.")
             input("\nPress Enter to continue...")
             return
         
-        # Check if current track has loops
-        current_track = self.player.get_current_track()
-        current_track_loops = None
-        
-        if current_track:
-            for track in all_loops:
-                if track['track_id'] == current_track['id']:
-                    current_track_loops = track
-                    break
-        
-        # Display loops for current track first
-        if current_track_loops:
-            print(f"\nCurrent Track: {current_track_loops['track_name']} - {current_track_loops['artist']}")
-            for i, loop in enumerate(current_track_loops['loops']):
-                print(f"  {i+1}. {loop['name']}: {self.player.format_time(loop['point_a'])} - {self.player.format_time(loop['point_b'])}")
-        
-        # Display other tracks
-        print("\nOther Tracks:")
-        other_tracks = [track for track in all_loops if not (current_track and track['track_id'] == current_track['id'])]
-        
-        for i, track in enumerate(other_tracks):
-            print(f"\n{i+1}. {track['track_name']} - {track['artist']}")
-            for j, loop in enumerate(track['loops']):
-                print(f"    {j+1}. {loop['name']}: {self.player.format_time(loop['point_a'])} - {self.player.format_time(loop['point_b'])}")
-        
-        input("\nPress Enter to continue...")
+        page, order_by = 0, self.SORT_ORDERS[0]
+        while True:
+            page, pages, tracks = self._library_page(page, order_by, exclude)
+            
+            clear_screen()
+            print("Saved Loops:")
+            print("=" * 60)
+            
+            # Display loops for current track first
+            if current_track_loops:
+                print(f"\nCurrent Track: {current_track_loops['track_name']} - {current_track_loops['artist']}")
+                for i, loop in enumerate(current_track_loops['loops']):
+                    print(f"  {i+1}. {self.format_loop(loop)}")
+            
+            # Display one page of the other tracks
+            print(f"\nOther Tracks (page {page + 1}/{pages}, by {order_by}):")
+            for i, track in enumerate(tracks):
+                print(f"\n{page * self.PAGE_SIZE + i + 1}. {track['track_name']} - {track['artist']}")
+                for j, loop in enumerate(track['loops']):
+                    print(f"    {j+1}. {self.format_loop(loop)}")
+            
+            choice = input("\n[n]ext page, [p]revious page, [s]ort, or Enter to go back: ").strip().lower()
+            navigation = self._page_navigation(choice, page, order_by)
+            if navigation is None:
+                return
+            page, order_by = navigation
     
     def save_current_loop(self):
         """Save the current loop."""
@@ -152,6 +378,14 @@ class LoopSpotCLI:
             time.sleep(1)
             return
         
+        duplicates = self.loop_index.near_duplicates(track['id'], points['point_a'], points['point_b'])
+        if duplicates:
+            print("Similar loops are already saved:")
+            for loop in duplicates:
+                print(f"  {self.format_loop(loop)}")
+            if input("Save anyway? (y/n): ").strip().lower() != 'y':
+                return
+        
         name = input("Enter a name for this loop (or press Enter for default): ")
         if not name:
             name = None  # Use default naming
@@ -170,110 +404,157 @@ class LoopSpotCLI:
     
     def load_saved_loop(self):
         """Load a saved loop for the current track or play a different track."""
-        all_loops = self.storage.get_all_loops()
+        # Get current track info
+        current_track = self.player.get_current_track()
+        current_track_loops = self._current_track_entry(current_track)
+        exclude = current_track['id'] if current_track else None
         
-        if not all_loops:
+        if not current_track_loops and not self.storage.count_tracks():
             print("No saved loops found.")
             time.sleep(1)
             return
         
-        clear_screen()
-        print("Load Loop:")
-        print("=" * 60)
-        
-        # Get current track info
-        current_track = self.player.get_current_track()
-        current_track_loops = None
-        other_tracks = []
-        
-        # Separate current track and other tracks
-        if current_track:
-            for track in all_loops:
-                if track['track_id'] == current_track['id']:
-                    current_track_loops = track
-                else:
-                    other_tracks.append(track)
-        else:
-            other_tracks = all_loops
-        
-        # Display current track loops if any
-        track_selection = []
-        
-        if current_track_loops:
-            print(f"\nCurrent Track: {current_track_loops['track_name']} - {current_track_loops['artist']}")
-            for i, loop in enumerate(current_track_loops['loops']):
-                print(f"  {i+1}. {loop['name']}: {self.player.format_time(loop['point_a'])} - {self.player.format_time(loop['point_b'])}")
-            track_selection.append(current_track_loops)
-        
-        # Display other tracks
-        if other_tracks:
-            print("\nOther Tracks:")
-            for i, track in enumerate(other_tracks):
-                # If current track exists, we offset the numbering
-                display_num = i+1 if not current_track_loops else i+2
-                print(f"{display_num}. {track['track_name']} - {track['artist']}")
-                for j, loop in enumerate(track['loops']):
-                    print(f"    {j+1}. {loop['name']}: {self.player.format_time(loop['point_a'])} - {self.player.format_time(loop['point_b'])}")
-                track_selection.append(track)
+        # The current track is always number 1; other tracks are numbered across pages
+        first_number = 2 if current_track_loops else 1
+        page, order_by = 0, self.SORT_ORDERS[0]
+        while True:
+            page, pages, tracks = self._library_page(page, order_by, exclude)
+            page_start = first_number + page * self.PAGE_SIZE
+            
+            clear_screen()
+            print("Load Loop:")
+            print("=" * 60)
+            
+            if current_track_loops:
+                print(f"\n1. Current Track: {current_track_loops['track_name']} - {current_track_loops['artist']}")
+                for i, loop in enumerate(current_track_loops['loops']):
+                    print(f"    {i+1}. {self.format_loop(loop)}")
+            
+            if tracks:
+                print(f"\nOther Tracks (page {page + 1}/{pages}, by {order_by}):")
+                for i, track in enumerate(tracks):
+                    print(f"{page_start + i}. {track['track_name']} - {track['artist']}")
+                    for j, loop in enumerate(track['loops']):
+                        print(f"    {j+1}. {self.format_loop(loop)}")
+            
+            choice = input("\nSelect track number, [n]ext/[p]revious page, [s]ort (0 to cancel): ").strip().lower()
+            navigation = self._page_navigation(choice, page, order_by)
+            if navigation is not None:
+                page, order_by = navigation
+                continue
+            break
         
         # Get track selection
         try:
-            track_choice = int(input("\nSelect track number (0 to cancel): "))
+            track_choice = int(choice)
             if track_choice == 0:
                 return
             
-            if 1 <= track_choice <= len(track_selection):
-                selected_track = track_selection[track_choice-1]
-                
-                # Display loops for selected track
-                print(f"\nLoops for: {selected_track['track_name']} - {selected_track['artist']}")
-                for i, loop in enumerate(selected_track['loops']):
-                    print(f"  {i+1}. {loop['name']}: {self.player.format_time(loop['point_a'])} - {self.player.format_time(loop['point_b'])}")
-                
-                # Get loop selection
-                loop_choice = int(input("\nSelect loop number (0 to cancel): "))
-                if loop_choice == 0:
-                    return
-                
-                if 1 <= loop_choice <= len(selected_track['loops']):
-                    selected_loop = selected_track['loops'][loop_choice-1]
-                    
-                    # Check if we need to switch tracks
-                    if current_track is None or selected_track['track_id'] != current_track['id']:
-                        print(f"\nChanging track to: {selected_track['track_name']} - {selected_track['artist']}")
-                        if not self.player.play_track(selected_track['track_id']):
-                            print("Failed to play track. Please check your Spotify playback.")
-                            time.sleep(2)
-                            return
-                        
-                        time.sleep(1)
-                    
-                    # Now load the loop
-                    loop_data = {
-                        'track_id': selected_track['track_id'],
-                        'point_a': selected_loop['point_a'],
-                        'point_b': selected_loop['point_b'],
-                        'loop_name': selected_loop['name']
-                    }
-                    
-                    if self.loop_controller.load_loop(loop_data):
-                        print(f"Loop '{selected_loop['name']}' loaded successfully.")
-                        # Automatically start the loop
-                        self.loop_controller.start_loop()
-                    else:
-                        print("Failed to load loop.")
-                    
-                    time.sleep(1)
-                else:
-                    print("Invalid loop selection.")
-                    time.sleep(1)
+            if current_track_loops and track_choice == 1:
+                selected_track = current_track_loops
+            elif 0 <= track_choice - page_start < len(tracks):
+                selected_track = tracks[track_choice - page_start]
             else:
                 print("Invalid track selection.")
                 time.sleep(1)
+                return
+            
+            # Display loops for selected track
+            print(f"\nLoops for: {selected_track['track_name']} - {selected_track['artist']}")
+            for i, loop in enumerate(selected_track['loops']):
+                print(f"  {i+1}. {self.format_loop(loop)}")
+            
+            # Get loop selection
+            loop_choice = int(input("\nSelect loop number (0 to cancel): "))
+            if loop_choice == 0:
+                return
+            
+            if 1 <= loop_choice <= len(selected_track['loops']):
+                selected_loop = selected_track['loops'][loop_choice-1]
+                self.activate_loop(selected_track['track_id'], selected_loop, current_track)
+            else:
+                print("Invalid loop selection.")
+                time.sleep(1)
         except ValueError:
             print("Invalid input.")
             time.sleep(1)
     
+    def activate_loop(self, track_id, loop, current_track):
+        """Switch to the loop's track if needed, load the loop and start it."""
+        # Check if we need to switch tracks
+        if current_track is None or track_id != current_track['id']:
+            print(f"\nChanging track to: {loop['track_name']} - {loop['artist']}")
+            if not self.player.play_track(track_id):
+                print("Failed to play track. Please check your Spotify playback.")
+                time.sleep(2)
+                return False
+            
+            time.sleep(1)
+        
+        # Now load the loop
+        loop_data = {
+            'track_id': track_id,
+            'point_a': loop['point_a'],
+            'point_b': loop['point_b'],
+            'loop_name': loop['name']
+        }
+        
+        loaded = self.loop_controller.load_loop(loop_data)
+        if loaded:
+            print(f"Loop '{loop['name']}' loaded successfully.")
+            # Automatically start the loop
+            self.loop_controller.start_loop()
+            
+            used = self.storage.mark_used(track_id, loop['id'])
+            if used:
+                self.hotlist.touch(track_id, loop['id'], used['use_count'])
+        else:
+            print("Failed to load loop.")
+        
+        if self.interactive:
+            time.sleep(1)
+        return loaded
+    
+    def print_hotlist(self):
+        """Print recently and frequently used loops for one-keystroke recall."""
+        recent = self._hotlist_entries(self.hotlist.recent())
+        frequent = self._hotlist_entries(self.hotlist.frequent())
+        if not recent and not frequent:
+            return
+        
+        if recent:
+            print("\nRecent Loops:")
+            for i, (track_id, loop) in enumerate(recent):
+                print(f"  r{i+1}. {loop['track_name']} - {self.format_loop(loop)}")
+        if frequent:
+            print("Most Used:")
+            for i, (track_id, loop) in enumerate(frequent):
+                print(f"  f{i+1}. {loop['track_name']} - {self.format_loop(loop)} ({loop.get('use_count', 0)}x)")
+    
+    def _hotlist_entries(self, keys):
+        """Resolve hotlist keys to loops, dropping loops that were deleted."""
+        entries = []
+        for track_id, loop_id in keys:
+            loop = self.storage.find_loop(track_id, loop_id)
+            if loop:
+                entries.append((track_id, loop))
+            else:
+                self.hotlist.discard(track_id, loop_id)
+        return entries
+    
+    def recall_hotlist(self, command):
+        """Load the loop behind an r<n> or f<n> hotlist command."""
+        keys = self.hotlist.recent() if command[0] == 'r' else self.hotlist.frequent()
+        entries = self._hotlist_entries(keys)
+        index = int(command[1:]) - 1
+        if not 0 <= index < len(entries):
+            print("Invalid selection.")
+            time.sleep(1)
+            return
+        
+        track_id, loop = entries[index]
+        self.activate_loop(track_id, loop, self.player.get_current_track())
+    
     def delete_saved_loop(self):
         """Delete a saved loop."""
         track = self.player.get_current_track()
@@ -293,7 +574,7 @@ class LoopSpotCLI:
         print("=" * 60)
         
         for i, loop in enumerate(loops):
-            print(f"{i+1}. {loop['name']}: {self.player.format_time(loop['point_a'])} - {self.player.format_time(loop['point_b'])}")
+            print(f"{i+1}. {self.format_loop(loop)}")
         
         try:
             choice = int(input("\nEnter loop number to delete (0 to cancel): "))
@@ -334,7 +615,7 @@ class LoopSpotCLI:
         print(f"\nCurrent track: {track['name']} - {track['artist']}")
         print(f"Track duration: {self.player.format_time(track['duration_ms'])}")
         
-        timestamp = input("\nEnter point A timestamp (mm:ss format): ")
+        timestamp = input("\nEnter point A timestamp (mm:ss or mm:ss.mmm): ")
         self.loop_controller.set_point_a_timestamp(timestamp)
         time.sleep(1)
     
@@ -365,10 +646,310 @@ class LoopSpotCLI:
         print(f"Track duration: {self.player.format_time(track['duration_ms'])}")
         print(f"Point A: {self.player.format_time(self.loop_controller.point_a)}")
         
-        timestamp = input("\nEnter point B timestamp (mm:ss format): ")
+        timestamp = input("\nEnter point B timestamp (mm:ss or mm:ss.mmm): ")
         self.loop_controller.set_point_b_timestamp(timestamp)
         time.sleep(1)
     
+    def select_device(self):
+        """Pin playback commands to one of the available devices."""
+        clear_screen()
+        print("Select Playback Device")
+        print("=" * 60)
+        
+        try:
+            devices = self.player.devices.get_devices(force=True)
+        except Exception as e:
+            print(f"Error getting devices: {e}")
+            time.sleep(1)
+            return
+        
+        if not devices:
+            print("No Spotify Connect devices found.")
+            time.sleep(1)
+            return
+        
+        pinned = self.player.devices.pinned_device_id
+        for i, device in enumerate(devices):
+            markers = []
+            if device['is_active']:
+                markers.append("active")
+            if device['id'] == pinned:
+                markers.append("pinned")
+            suffix = f" ({', '.join(markers)})" if markers else ""
+            print(f"{i+1}. {device['name']} [{device['type']}]{suffix}")
+        
+        try:
+            choice = int(input("\nSelect device number (0 to unpin): "))
+            if choice == 0:
+                self.player.devices.pin(None)
+                print("Device unpinned. Commands go to the active device.")
+            elif 1 <= choice <= len(devices):
+                device = devices[choice-1]
+                self.player.devices.pin(device['id'])
+                print(f"Pinned to {device['name']}.")
+            else:
+                print("Invalid selection.")
+                time.sleep(1)
+                return
+            
+            # Record the choice in the session right away
+            self._save_session(self.loop_controller.state)
+            time.sleep(1)
+        except ValueError:
+            print("Invalid input.")
+            time.sleep(1)
+    
+    def configure_fanout(self):
+        """Add or clear extra devices that mirror the loop."""
+        clear_screen()
+        print("Fan-out Devices")
+        print("=" * 60)
+        print("Each extra device needs its own Spotify account, since one account")
+        print("can only play on one device at a time.")
+        
+        players = self.loop_controller.fanout_players
+        if players:
+            print("\nMirroring to:")
+            for player in players:
+                skew = self.loop_controller.fanout_skew.get(player.devices.pinned_device_id)
+                skew_text = f" (skew {skew} ms)" if skew is not None else ""
+                print(f"  - {player.account_name}{skew_text}")
+            if self.loop_controller.last_fanout_spread_ms is not None:
+                print(f"Last spread: {self.loop_controller.last_fanout_spread_ms} ms")
+        else:
+            print("\nNo fan-out devices configured.")
+        
+        choice = input("\n(a)dd account, (c)lear all, Enter to go back: ").strip().lower()
+        if choice == 'c':
+            self.loop_controller.set_fanout_players([])
+            print("Fan-out disabled.")
+            time.sleep(1)
+        elif choice == 'a':
+            self._add_fanout_account()
+    
+    def _add_fanout_account(self):
+        """Authenticate another account and pick the device it should play on."""
+        account = input("Account label (e.g. 'bass-rig'): ").strip()
+        if not account:
+            return
+        
+        sp = SpotifyAuth(account=account).get_spotify_client()
+        if not sp:
+            print("Failed to authenticate that account.")
+            time.sleep(1)
+            return
+        
+        player = SpotifyPlayer(sp)
+        player.account_name = account
+        try:
+            devices = player.devices.get_devices(force=True)
+        except Exception as e:
+            print(f"Error getting devices: {e}")
+            time.sleep(1)
+            return
+        
+        if not devices:
+            print("No devices found for that account.")
+            time.sleep(1)
+            return
+        
+        for i, device in enumerate(devices):
+            print(f"{i+1}. {device['name']} [{device['type']}]")
+        try:
+            choice = int(input("\nSelect device number: "))
+        except ValueError:
+            print("Invalid input.")
+            time.sleep(1)
+            return
+        
+        if not 1 <= choice <= len(devices):
+            print("Invalid selection.")
+            time.sleep(1)
+            return
+        
+        player.devices.pin(devices[choice-1]['id'])
+        self.loop_controller.set_fanout_players(self.loop_controller.fanout_players + [player])
+        print(f"Added {account} on {devices[choice-1]['name']}.")
+        time.sleep(1)
+    
+    def toggle_snapping(self):
+        """Cycle point snapping between off, beat and bar."""
+        current = SNAP_MODES.index(self.loop_controller.snap_mode)
+        mode = SNAP_MODES[(current + 1) % len(SNAP_MODES)]
+        self.loop_controller.set_snap_mode(mode, self.analysis)
+        
+        if not mode:
+            print("Snapping disabled.")
+            time.sleep(1)
+            return
+        
+        # Fetch the grid now so setting points later needs no API call
+        track = self.player.get_current_track()
+        if track and not self.analysis.get(track['id']):
+            print("No beat data for this track; points keep millisecond precision.")
+        print(f"Snapping to nearest {mode}.")
+        time.sleep(1)
+    
+    def check_library(self):
+        """Start a background check of every saved loop against the catalog."""
+        if self.library_validator.running:
+            print("A library check is already running.")
+            time.sleep(1)
+            return
+        
+        repair = input("Repair loops that run past the track end or were relinked? (y/n): ").strip().lower() == 'y'
+        self.library_validator.run_in_background(repair=repair)
+        print("Library check started in the background.")
+        time.sleep(1)
+    
+    def _print_search_results(self, result_page):
+        """Print one page of catalog search results, numbered across pages."""
+        if not result_page['items']:
+            print("\nNo tracks found.")
+            return
+        
+        page = result_page['offset'] // self.catalog.page_size
+        print(f"\nResults (page {page + 1}/{self.catalog.page_count(result_page)}):")
+        for i, track in enumerate(result_page['items']):
+            print(f"{result_page['offset'] + i + 1}. {track['name']} - {track['artist']} "
+                  f"[{track['album']}, {self.player.format_time(track['duration_ms'])}]")
+    
+    def _draw_search(self, query, result_page, status=None):
+        """Redraw the typeahead view with the query being typed on the last line."""
+        clear_screen()
+        print("Find Track")
+        print("=" * 60)
+        print("Type to search, Enter when done (Enter on an empty search goes back).")
+        if result_page:
+            self._print_search_results(result_page)
+        if status:
+            print(f"\n{status}")
+        print(f"\nSearch: {query}", end="", flush=True)
+    
+    def _type_query(self):
+        """Read a search query key by key, showing results whenever typing pauses."""
+        if not sys.stdin.isatty():
+            return input("Search: ")
+        
+        query, shown, result_page = "", "", None
+        last_key = time.monotonic()
+        self._draw_search(query, result_page)
+        with single_keys():
+            while True:
+                key, pressed_at = read_key(timeout=0.05)
+                if key is None:
+                    # Debounce: search once typing has paused, not on every key
+                    if (query == shown or len(normalize_query(query)) < self.SEARCH_MIN_LENGTH
+                            or time.monotonic() - last_key < self.SEARCH_DEBOUNCE):
+                        continue
+                    try:
+                        page = self.catalog.search(query, wait=False)
+                    except Exception as e:
+                        shown = query
+                        self._draw_search(query, result_page, f"Search failed: {e}")
+                        continue
+                    if page is not None:  # None while the rate budget is empty; retried on the next tick
+                        shown, result_page = query, page
+                        self._draw_search(query, result_page)
+                    continue
+                
+                if key in ('\n', '\r'):
+                    print()
+                    return query
+                if key in ('\x7f', '\x08'):
+                    query = query[:-1]
+                elif len(key) == 1 and key.isprintable():  # Named keys such as arrows are not typed text
+                    query += key
+                else:
+                    continue
+                last_key = pressed_at
+                
+                # Queries seen before are answered from the cache right away
+                cached = self.catalog.cached(query)
+                if cached:
+                    shown, result_page = query, cached
+                    self._draw_search(query, result_page)
+                else:
+                    print(f"\rSearch: {query}\033[K", end="", flush=True)
+    
+    def find_track(self):
+        """Search the catalog for a track and play it, optionally starting at point A."""
+        query = self._type_query()
+        if not normalize_query(query):
+            return
+        
+        # Later pages are only fetched when the user asks for them
+        page = 0
+        try:
+            while True:
+                try:
+                    result_page = self.catalog.search(query, page)
+                except Exception as e:
+                    print(f"Search failed: {e}")
+                    time.sleep(1)
+                    return
+                
+                clear_screen()
+                print("Find Track")
+                print("=" * 60)
+                print(f"Search: {query}")
+                self._print_search_results(result_page)
+                
+                choice = input("\nSelect track number, [n]ext/[p]revious page (0 to cancel): ").strip().lower()
+                if choice == 'n':
+                    page = min(page + 1, self.catalog.page_count(result_page) - 1)
+                elif choice == 'p':
+                    page = max(page - 1, 0)
+                else:
+                    break
+        finally:
+            self.catalog.cache.save()
+        
+        try:
+            number = int(choice)
+        except ValueError:
+            print("Invalid input.")
+            time.sleep(1)
+            return
+        if number == 0:
+            return
+        
+        index = number - 1 - result_page['offset']
+        if not 0 <= index < len(result_page['items']):
+            print("Invalid selection.")
+            time.sleep(1)
+            return
+        
+        self._play_found_track(result_page['items'][index])
+    
+    def _play_found_track(self, track):
+        """Start a search result, at point A if one is entered."""
+        print(f"\nSelected: {track['name']} - {track['artist']} ({self.player.format_time(track['duration_ms'])})")
+        timestamp = input("Point A (mm:ss or mm:ss.mmm, Enter to play from the start): ").strip()
+        
+        position_ms = 0
+        if timestamp:
+            try:
+                position_ms = parse_timestamp(timestamp)
+            except ValueError:
+                print("Invalid timestamp format. Please use mm:ss or mm:ss.mmm format.")
+                time.sleep(1)
+                return
+            if not 0 <= position_ms < track['duration_ms']:
+                print(f"Timestamp out of range. Track duration is {self.player.format_time(track['duration_ms'])}.")
+                time.sleep(1)
+                return
+        
+        # One request starts the track right at point A
+        if not self.player.play_track(track['id'], position_ms=position_ms):
+            print("Failed to play track. Please check your Spotify playback.")
+            time.sleep(2)
+            return
+        
+        if timestamp:
+            self.loop_controller.set_point_a_position(track, position_ms)
+        time.sleep(1)
+    
     def reset_credentials(self):
         """Reset Spotify API credentials."""
         clear_screen()
@@ -387,9 +968,9 @@ class LoopSpotCLI:
             # Reinitialize the CLI components
             self.auth = SpotifyAuth()
             
-            # Stop active loop if running
-            if self.loop_controller and self.loop_controller.active:
-                self.loop_controller.stop_loop()
+            # Stop active loop and its engine thread
+            if self.loop_controller:
+                self.loop_controller.shutdown()
             
             # Clear references to old instances
             self.sp = None
@@ -420,43 +1001,159 @@ class LoopSpotCLI:
             '10': self.delete_saved_loop,                  # Delete a saved loop
             '11': self.refresh_token,                      # Refresh token
             '12': self.reset_credentials,                  # Reset Spotify credentials
+            '13': self.select_device,                      # Select playback device
+            '14': self.configure_fanout,                   # Configure fan-out devices
+            '15': self.toggle_snapping,                    # Toggle beat/bar snapping
+            '16': self.check_library,                      # Check library in the background
+            '17': self.find_track,                         # Search the catalog and play a track
+            'i': self.arm_innermost_loop,                  # Arm the saved loop around the position
+            'c': self.capture_points,                      # Mark points with single keypresses
             '0': self._exit_app                            # Exit
         }
         
-        if command in command_map:
-            command_map[command]()
-        else:
-            print("Invalid command.")
+        try:
+            if command in command_map:
+                command_map[command]()
+            elif len(command) > 1 and command[0] in 'rf' and command[1:].isdigit():
+                self.recall_hotlist(command)
+            else:
+                print("Invalid command.")
+                time.sleep(1)
+        except StorageError as e:
+            print(f"{e}. The library was not changed.")
             time.sleep(1)
     
     def _exit_app(self):
         """Exit the application."""
         self.running = False
-        if self.loop_controller and self.loop_controller.active:
-            self.loop_controller.stop_loop()
+        if self.loop_controller:
+            self.loop_controller.shutdown()
         print("Exiting LoopSpot. Goodbye!")
     
     def run(self):
         """Run the main CLI loop."""
+        # Claim the engine before a resumed session can start it: two engines would
+        # fight over the same playback, and the menu could not stop the other one
+        if not self.control.claim_engine():
+            print("A background LoopSpot engine is already running. "
+                  "Stop it with 'python run.py stop --shutdown', then start the menu again.")
+            return False
+        
         if not self.initialize():
             return False
         
+        # Take commands from headless invocations
+        self.control.watch(self.handle_remote_command)
+        
         while self.running:
             self.print_header()
-            self.print_current_track()
+            # The first frame reuses the playback fetched during startup
+            self.print_current_track(self.first_track)
+            self.first_track = None
+            self.print_hotlist()
+            self.print_library_check_status()
+            if self.show_startup_timings and self.startup:
+                self.startup.mark("first frame")
+                print("\n" + "\n".join(self.startup.format_timings()))
+                self.startup = None
             self.print_menu()
             
-            command = input()
+            self.ticker.start()
+            try:
+                command = input()
+            finally:
+                self.ticker.stop()
             self.process_command(command)
         
         return True
     
+    def serve(self):
+        """Run the loop engine without the menu, taking commands from headless invocations."""
+        if not self.control.claim_engine():
+            print("Another LoopSpot process is already running the loop engine.")
+            return False
+        
+        self.interactive = False
+        if not self.initialize():
+            return False
+        self.loop_controller.set_ui_refresh_callback(None)
+        self.control.watch(self.handle_remote_command)
+        
+        try:
+            while self.running:
+                time.sleep(0.5)
+        finally:
+            self.loop_controller.shutdown()
+        return True
+    
+    def handle_remote_command(self, action, params):
+        """Apply a command sent by a headless invocation; returns a result dict."""
+        handlers = {
+            'loop': self._remote_loop,
+            'load': self._remote_load,
+            'save': self._remote_save,
+            'stop': self._remote_stop
+        }
+        if action not in handlers:
+            return {"ok": False, "error": f"Unknown command: {action}"}
+        
+        result = handlers[action](**params)
+        result["state"] = self.loop_controller.state._asdict()
+        result["engine"] = self.loop_controller.engine_health()
+        if self.interactive:
+            self.refresh_ui()
+        return result
+    
+    def _remote_loop(self, point_a, point_b):
+        track = self.player.get_current_track()
+        if not track:
+            return {"ok": False, "error": "No track is currently playing."}
+        if not 0 <= point_a < point_b <= track['duration_ms']:
+            return {"ok": False, "error": "Points must satisfy 0 <= A < B <= track duration."}
+        
+        loop_data = {'track_id': track['id'], 'point_a': point_a, 'point_b': point_b, 'loop_name': None}
+        ok = self.loop_controller.load_loop(loop_data) and self.loop_controller.start_loop()
+        return {"ok": ok}
+    
+    def _remote_load(self, track_id, loop_id):
+        loop = self.storage.find_loop(track_id, loop_id)
+        if not loop:
+            return {"ok": False, "error": "Loop not found."}
+        
+        if not self.activate_loop(track_id, loop, self.player.get_current_track()):
+            return {"ok": False, "error": "Failed to load loop."}
+        return {"ok": True}
+    
+    def _remote_save(self, name=None):
+        points = self.loop_controller.get_current_points()
+        track = self.player.get_current_track()
+        if not points or not track or track['id'] != points['track_id']:
+            return {"ok": False, "error": "No loop points set to save."}
+        
+        duplicates = self.loop_index.near_duplicates(track['id'], points['point_a'], points['point_b'])
+        loop = self.storage.save_loop(track['id'], track['name'], track['artist'],
+                                      points['point_a'], points['point_b'], name=name)
+        return {"ok": True, "loop": loop, "near_duplicates": [dup["id"] for dup in duplicates]}
+    
+    def _remote_stop(self, shutdown=False):
+        if self.loop_controller.active:
+            self.loop_controller.stop_loop()
+        if shutdown:
+            self.running = False
+        return {"ok": True}
+    
+    def _refresh_client(self):
+        """Swap a client with a fresh token into the player; used after a 401."""
+        sp = self.auth.refresh_client()
+        if not sp:
+            return False
+        self.sp = sp
+        self.player.sp = sp
+        return True
+    
     def refresh_token(self):
         # Get a new client with a fresh token
-        self.sp = self.auth.get_spotify_client()
-        if self.sp:
-            # Update the player with the new client
-            self.player.sp = self.sp
+        if self._refresh_client():
             print("Token refreshed successfully.")
         else:
             print("Failed to refresh token.")
\ No newline at end of file
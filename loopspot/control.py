@@ -0,0 +1,176 @@
+import os
+import logging
+import json
+import time
+import uuid
+import threading
+from .utils import get_application_path, atomic_write_json, file_lock, try_lock_file
+
+logger = logging.getLogger(__name__)
+
+class ControlChannel:
+    """Pass commands from headless invocations to the process that runs the loop engine.
+    
+    A command is written to data/command.json and the engine host writes its result
+    back into the same file. The engine host holds data/engine.lock while it runs,
+    so other processes can tell whether anyone will pick the command up.
+    """
+    
+    def __init__(self, storage_dir="data"):
+        """Initialize the command and lock file paths."""
+        data_dir = os.path.join(get_application_path(), storage_dir)
+        os.makedirs(data_dir, exist_ok=True)
+        self.command_path = os.path.join(data_dir, "command.json")
+        self.lock_path = self.command_path + ".lock"
+        self.engine_lock_path = os.path.join(data_dir, "engine.lock")
+        self._engine_lock = None
+        self._watch_thread = None
+    
+    def engine_running(self):
+        """Check whether some process is hosting the loop engine."""
+        if self._engine_lock:
+            return True
+        lock = try_lock_file(self.engine_lock_path)
+        if lock is None:
+            return True
+        lock.close()
+        return False
+    
+    def wait_engine(self, timeout, interval=0.05):
+        """Wait until some process hosts the loop engine; returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        while not self.engine_running():
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(interval)
+        return True
+    
+    def claim_engine(self):
+        """Become the engine host; returns False if another process already is."""
+        if not self._engine_lock:
+            self._engine_lock = try_lock_file(self.engine_lock_path)
+        return self._engine_lock is not None
+    
+    def _read(self):
+        try:
+            with open(self.command_path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+    
+    def send(self, action, expires_in=None, **params):
+        """Post a command for the engine host; returns its ID.
+        
+        With expires_in, the engine host ignores the command once that many
+        seconds have passed, so it never runs after the sender has given up.
+        """
+        command = {
+            "id": uuid.uuid4().hex,
+            "action": action,
+            "params": params,
+            "sent_at": time.time()
+        }
+        if expires_in is not None:
+            command["expires_at"] = command["sent_at"] + expires_in
+        with file_lock(self.lock_path):
+            atomic_write_json(self.command_path, command)
+        return command["id"]
+    
+    def wait_result(self, command_id, timeout=5.0, interval=0.02):
+        """Wait for the engine host to answer a command; None on timeout.
+        
+        A command not yet taken by the engine host when the time is up is withdrawn,
+        so it is never applied later. One already being applied gets another timeout
+        to finish.
+        """
+        deadline = time.monotonic() + timeout
+        extended = False
+        while True:
+            command = self._read()
+            if not command or command["id"] != command_id:
+                return {"ok": False, "error": "Superseded by a newer command."}
+            if "result" in command:
+                return command["result"]
+            if time.monotonic() >= deadline:
+                if self._withdraw(command_id) or extended:
+                    return None
+                deadline, extended = time.monotonic() + timeout, True
+                continue
+            time.sleep(interval)
+    
+    def _withdraw(self, command_id):
+        """Cancel a command the engine host has not taken yet; returns True if it was cancelled."""
+        with file_lock(self.lock_path):
+            command = self._read()
+            if not command or command["id"] != command_id or "result" in command or command.get("taken"):
+                return False
+            command["result"] = {"ok": False, "error": "Withdrawn: the sender stopped waiting."}
+            atomic_write_json(self.command_path, command)
+            return True
+    
+    def _take(self, command_id, max_age):
+        """Mark a pending command as being applied; returns it, or None if it is no longer pending."""
+        with file_lock(self.lock_path):
+            command = self._read()
+            if not command or command["id"] != command_id or "result" in command or command.get("taken"):
+                return None
+            now = time.time()
+            if now - command["sent_at"] >= max_age or now >= command.get("expires_at", now + 1):
+                return None
+            command["taken"] = True
+            atomic_write_json(self.command_path, command)
+            return command
+    
+    def _complete(self, command_id, result):
+        with file_lock(self.lock_path):
+            command = self._read()
+            # Don't overwrite a command that arrived while this one was being handled
+            if command and command["id"] == command_id:
+                command["result"] = result
+                atomic_write_json(self.command_path, command)
+    
+    def _signature(self):
+        try:
+            stat = os.stat(self.command_path)
+            return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            return None
+    
+    def watch(self, handler, interval=0.1, max_age=10.0):
+        """Apply incoming commands on a background thread.
+        
+        handler(action, params) returns a result dict. Commands older than max_age
+        seconds, or past their own expiry, are ignored, so a restart never replays
+        a stale command, while one sent just before the engine host started is
+        still picked up.
+        """
+        if self._watch_thread and self._watch_thread.is_alive():
+            return
+        
+        def apply(command):
+            try:
+                result = handler(command["action"], command.get("params", {}))
+            except Exception as e:
+                logger.error("Error handling %s command: %s", command["action"], e)
+                result = {"ok": False, "error": str(e)}
+            self._complete(command["id"], result)
+        
+        def watch():
+            signature = None
+            while True:
+                try:
+                    current = self._signature()
+                    if current != signature:
+                        signature = current
+                        command = self._read()
+                        if command and "result" not in command and not command.get("taken"):
+                            # Taking the command rewrites the file; the next pass sees it as taken
+                            command = self._take(command["id"], max_age)
+                            if command:
+                                apply(command)
+                except Exception as e:
+                    logger.error("Error reading command: %s", e)
+                time.sleep(interval)
+        
+        self._watch_thread = threading.Thread(target=watch, daemon=True)
+        self._watch_thread.start()
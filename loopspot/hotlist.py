@@ -0,0 +1,67 @@
+import heapq
+from collections import OrderedDict
+
+class HotList:
+    """Bounded index of the most recently and most frequently used loops.
+    
+    Entries are keyed by (track_id, loop_id). Both lists have a fixed size,
+    so every update is constant time regardless of the library size.
+    """
+    
+    def __init__(self, recent_size=5, frequent_size=3):
+        """Initialize empty recent and frequent lists."""
+        self.recent_size = recent_size
+        self.frequent_size = frequent_size
+        self._recent = OrderedDict()  # key -> None, most recent last
+        self._frequent = {}  # key -> use count
+    
+    @classmethod
+    def from_storage(cls, storage, recent_size=5, frequent_size=3):
+        """Build the hotlist from the last_used and use_count fields in storage."""
+        hotlist = cls(recent_size, frequent_size)
+        
+        def loops():
+            for track_id, track_loops in storage.loops.items():
+                for loop in track_loops:
+                    yield track_id, loop
+        
+        recent = heapq.nlargest(recent_size, loops(), key=lambda item: item[1].get("last_used", ""))
+        for track_id, loop in reversed(recent):
+            hotlist._recent[(track_id, loop["id"])] = None
+        
+        frequent = heapq.nlargest(frequent_size, loops(), key=lambda item: item[1].get("use_count", 0))
+        for track_id, loop in frequent:
+            if loop.get("use_count"):
+                hotlist._frequent[(track_id, loop["id"])] = loop["use_count"]
+        return hotlist
+    
+    def touch(self, track_id, loop_id, use_count):
+        """Record a use of a loop."""
+        key = (track_id, loop_id)
+        self._recent[key] = None
+        self._recent.move_to_end(key)
+        if len(self._recent) > self.recent_size:
+            self._recent.popitem(last=False)
+        
+        if key in self._frequent or len(self._frequent) < self.frequent_size:
+            self._frequent[key] = use_count
+            return
+        # Replace the least used entry if this loop has overtaken it
+        least = min(self._frequent, key=self._frequent.get)
+        if use_count > self._frequent[least]:
+            del self._frequent[least]
+            self._frequent[key] = use_count
+    
+    def discard(self, track_id, loop_id):
+        """Forget a loop, e.g. after it was deleted."""
+        key = (track_id, loop_id)
+        self._recent.pop(key, None)
+        self._frequent.pop(key, None)
+    
+    def recent(self):
+        """Get keys of recently used loops, most recent first."""
+        return list(reversed(self._recent))
+    
+    def frequent(self):
+        """Get keys of frequently used loops, most used first."""
+        return sorted(self._frequent, key=self._frequent.get, reverse=True)
@@ -0,0 +1,65 @@
+import bisect
+
+class TrackIntervals:
+    """Static interval index over the saved loops of one track.
+    
+    The track is cut into elementary segments at every point A and point B.
+    Each segment stores the tuple of loops covering it, innermost (shortest)
+    first, so a position lookup is one binary search that returns an existing
+    tuple and allocates nothing.
+    """
+    
+    EMPTY = ()
+    
+    def __init__(self, loops):
+        """Build the index from a list of saved loops."""
+        self.by_start = sorted(loops, key=lambda loop: loop["point_a"])
+        self.starts = [loop["point_a"] for loop in self.by_start]
+        
+        self.bounds = sorted({loop["point_a"] for loop in loops} | {loop["point_b"] for loop in loops})
+        innermost_first = sorted(loops, key=lambda loop: loop["point_b"] - loop["point_a"])
+        self.segments = [
+            tuple(loop for loop in innermost_first if loop["point_a"] <= start < loop["point_b"])
+            for start in self.bounds
+        ]
+    
+    def containing(self, position_ms):
+        """Get the loops with A <= position < B, innermost first."""
+        index = bisect.bisect_right(self.bounds, position_ms) - 1
+        if index < 0:
+            return self.EMPTY
+        return self.segments[index]
+    
+    def near_duplicates(self, point_a, point_b, tolerance_ms):
+        """Get loops whose A and B are both within tolerance_ms of the given points."""
+        low = bisect.bisect_left(self.starts, point_a - tolerance_ms)
+        high = bisect.bisect_right(self.starts, point_a + tolerance_ms)
+        return [loop for loop in self.by_start[low:high] if abs(loop["point_b"] - point_b) <= tolerance_ms]
+
+class LoopIndex:
+    """Interval indexes for every track in a LoopStorage, rebuilt lazily after changes."""
+    
+    def __init__(self, storage):
+        """Initialize with a LoopStorage."""
+        self.storage = storage
+        self._revision = None
+        self._tracks = {}
+    
+    def _track(self, track_id):
+        # Any write or reload bumps the storage revision and drops the stale indexes
+        if self._revision != self.storage.revision:
+            self._revision = self.storage.revision
+            self._tracks = {}
+        
+        index = self._tracks.get(track_id)
+        if index is None:
+            index = self._tracks[track_id] = TrackIntervals(self.storage.get_loops_for_track(track_id))
+        return index
+    
+    def containing(self, track_id, position_ms):
+        """Get the saved loops of a track that contain a position, innermost first."""
+        return self._track(track_id).containing(position_ms)
+    
+    def near_duplicates(self, track_id, point_a, point_b, tolerance_ms=250):
+        """Get saved loops of a track that nearly match the given points."""
+        return self._track(track_id).near_duplicates(point_a, point_b, tolerance_ms)
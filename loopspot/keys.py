@@ -0,0 +1,139 @@
+import os
+import sys
+import time
+import select
+from contextlib import contextmanager
+
+try:
+    import termios
+    import tty
+except ImportError:  # Windows
+    termios = None
+    import msvcrt
+
+# Keys that arrive as escape sequences are returned under these names
+KEY_ESCAPE = "\x1b"
+KEY_UP = "up"
+KEY_DOWN = "down"
+KEY_RIGHT = "right"
+KEY_LEFT = "left"
+KEY_HOME = "home"
+KEY_END = "end"
+KEY_DELETE = "delete"
+
+# Final part of the CSI (ESC [) or SS3 (ESC O) sequence -> key name
+ESCAPE_KEYS = {"A": KEY_UP, "B": KEY_DOWN, "C": KEY_RIGHT, "D": KEY_LEFT, "H": KEY_HOME, "F": KEY_END,
+               "1~": KEY_HOME, "4~": KEY_END, "3~": KEY_DELETE}
+# Second code msvcrt returns after a '\x00' or '\xe0' prefix -> key name
+WINDOWS_KEYS = {"H": KEY_UP, "P": KEY_DOWN, "M": KEY_RIGHT, "K": KEY_LEFT, "G": KEY_HOME, "O": KEY_END,
+                "S": KEY_DELETE}
+
+# The bytes of one key arrive together; nothing following an Escape this soon means the Escape key itself
+SEQUENCE_TIMEOUT = 0.05
+
+_cbreak_depth = 0  # Nested single_keys() blocks; only the outermost one switches the terminal mode
+
+@contextmanager
+def single_keys():
+    """Keep the terminal in cbreak mode, so keys typed between reads are neither echoed nor line-buffered.
+    
+    Blocks may nest. Switching modes never discards input already typed.
+    """
+    global _cbreak_depth
+    if not termios or not sys.stdin.isatty() or _cbreak_depth:
+        _cbreak_depth += 1
+        try:
+            yield
+        finally:
+            _cbreak_depth -= 1
+        return
+    
+    fd = sys.stdin.fileno()
+    old_settings = termios.tcgetattr(fd)
+    _cbreak_depth += 1
+    try:
+        tty.setcbreak(fd, termios.TCSANOW)
+        yield
+    finally:
+        _cbreak_depth -= 1
+        termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
+
+def _utf8_length(lead):
+    """Get the length of the UTF-8 sequence a lead byte starts."""
+    if lead >= 0xF0:
+        return 4
+    if lead >= 0xE0:
+        return 3
+    if lead >= 0xC0:
+        return 2
+    return 1
+
+def _read_more(fd):
+    """Read the next byte of a key that is still arriving, or b"" if none follows."""
+    if not select.select([fd], [], [], SEQUENCE_TIMEOUT)[0]:
+        return b""
+    return os.read(fd, 1)
+
+def _read_escape(fd):
+    """Read the rest of an escape sequence after ESC and name the key."""
+    introducer = _read_more(fd)
+    if introducer not in (b"[", b"O"):
+        # A lone Escape, or Alt with a key
+        return KEY_ESCAPE + introducer.decode(errors="replace")
+    
+    sequence = b""
+    while True:
+        byte = _read_more(fd)
+        sequence += byte
+        # SS3 sequences are one byte; CSI ones end with a byte in @..~
+        if not byte or introducer == b"O" or 0x40 <= byte[0] <= 0x7E:
+            break
+    sequence = sequence.decode(errors="replace")
+    # Unknown sequences come back whole, so they never look like a typed character
+    return ESCAPE_KEYS.get(sequence, KEY_ESCAPE + introducer.decode() + sequence)
+
+def _read_rest(fd, data):
+    """Read the remaining bytes of the key whose first byte is data and decode it."""
+    if not data:
+        return ""
+    if data == b"\x1b":
+        return _read_escape(fd)
+    for _ in range(_utf8_length(data[0]) - 1):
+        data += _read_more(fd)
+    return data.decode(errors="replace")
+
+def read_key(timeout=None):
+    """Wait for a single keypress without Enter; returns (key, monotonic time of the press).
+    
+    The key is one character, or one of the KEY_ names for arrows and other keys
+    sent as escape sequences. The time is taken as soon as the key arrives, before
+    any other work. If timeout seconds pass first, the key is None. When stdin is
+    not a terminal, a whole line is read and its first character used; at the end
+    of input the key is "".
+    """
+    if not sys.stdin.isatty():
+        line = sys.stdin.readline()
+        return line[:1], time.monotonic()
+    
+    if not termios:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not msvcrt.kbhit():
+            if deadline is not None and time.monotonic() >= deadline:
+                return None, time.monotonic()
+            time.sleep(0.01)
+        key = msvcrt.getwch()
+        pressed_at = time.monotonic()
+        # Arrows and the like come as a prefix and a code; a typed 'à' has nothing queued behind it
+        if key in ("\x00", "\xe0") and msvcrt.kbhit():
+            code = msvcrt.getwch()
+            key = WINDOWS_KEYS.get(code, key + code)
+        return key, pressed_at
+    
+    fd = sys.stdin.fileno()
+    with single_keys():
+        if timeout is not None and not select.select([fd], [], [], timeout)[0]:
+            return None, time.monotonic()
+        data = os.read(fd, 1)
+        pressed_at = time.monotonic()
+        key = _read_rest(fd, data)
+    return key, pressed_at
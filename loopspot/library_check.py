@@ -0,0 +1,148 @@
+import os
+import logging
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .utils import get_application_path, atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+TRACKS_PER_REQUEST = 50  # Limit of the batch tracks endpoint
+
+class TrackMetadataCache:
+    """Disk cache of track metadata with a time-to-live."""
+    
+    def __init__(self, storage_dir="data", ttl=7 * 24 * 3600):
+        """Initialize the cache file under the data directory."""
+        self.cache_path = os.path.join(get_application_path(), storage_dir, "track_cache.json")
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.entries = self._load()
+    
+    def _load(self):
+        if os.path.exists(self.cache_path):
+            try:
+                with open(self.cache_path, 'r') as f:
+                    return json.load(f)
+            except Exception as e:
+                logger.error("Error loading track cache: %s", e)
+        return {}
+    
+    def get(self, track_id):
+        """Get (hit, metadata) for a track; metadata is None for removed tracks."""
+        entry = self.entries.get(track_id)
+        if entry and time.time() - entry["fetched_at"] < self.ttl:
+            return True, entry["track"]
+        return False, None
+    
+    def put_many(self, tracks):
+        """Store a {track_id: metadata} mapping."""
+        now = time.time()
+        with self._lock:
+            for track_id, track in tracks.items():
+                self.entries[track_id] = {"fetched_at": now, "track": track}
+    
+    def save(self):
+        """Write the cache to disk, dropping expired entries."""
+        now = time.time()
+        with self._lock:
+            self.entries = {k: v for k, v in self.entries.items() if now - v["fetched_at"] < self.ttl}
+            try:
+                atomic_write_json(self.cache_path, self.entries)
+            except Exception as e:
+                logger.error("Error saving track cache: %s", e)
+
+def _summarize(track):
+    """Keep only the fields the library check needs."""
+    if not track:
+        return None
+    return {
+        "id": track["id"],
+        "name": track["name"],
+        "artist": ", ".join(artist["name"] for artist in track["artists"]),
+        "duration_ms": track["duration_ms"],
+        "is_playable": track.get("is_playable", True)
+    }
+
+class LibraryValidator:
+    """Refresh track metadata for saved loops and find loops that no longer fit."""
+    
+    def __init__(self, player, storage, cache=None, rate_budget=None, max_concurrency=3):
+        """Initialize with a SpotifyPlayer and LoopStorage."""
+        self.player = player
+        self.storage = storage
+        self.cache = cache or TrackMetadataCache()
+        self.rate_budget = rate_budget or player.rate_budget
+        self.max_concurrency = max_concurrency
+        self.last_report = None
+        self.running = False
+    
+    def _fetch_batch(self, track_ids):
+        """Fetch one batch of up to 50 tracks within the rate budget; None if the request failed."""
+        self.rate_budget.acquire()
+        try:
+            response = self.player.get_tracks(track_ids)
+        except Exception as e:
+            # One failed batch must not throw away the batches that succeeded
+            logger.warning("Library check batch failed: %s", e, extra={"error_class": getattr(e, 'error_class', None)})
+            return None
+        # The endpoint returns null for IDs that no longer exist
+        return {track_id: _summarize(track) for track_id, track in zip(track_ids, response["tracks"])}
+    
+    def fetch_metadata(self, track_ids):
+        """Get ({track_id: metadata or None}, [track IDs that could not be fetched]).
+        
+        The cache is used where it is fresh. Metadata is None for tracks removed
+        from the catalog, while tracks of failed requests are left out of it.
+        """
+        result = {}
+        unchecked = []
+        missing = []
+        for track_id in track_ids:
+            hit, track = self.cache.get(track_id)
+            if hit:
+                result[track_id] = track
+            else:
+                missing.append(track_id)
+        
+        batches = [missing[i:i + TRACKS_PER_REQUEST] for i in range(0, len(missing), TRACKS_PER_REQUEST)]
+        if batches:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+                for batch, fetched in zip(batches, pool.map(self._fetch_batch, batches)):
+                    if fetched is None:
+                        unchecked.extend(batch)
+                        continue
+                    self.cache.put_many(fetched)
+                    result.update(fetched)
+            self.cache.save()
+        return result, unchecked
+    
+    def run(self, repair=False):
+        """Check every saved loop; returns a report of renamed, relinked and flagged loops."""
+        self.running = True
+        try:
+            metadata, unchecked = self.fetch_metadata(list(self.storage.loops.keys()))
+            report = self.storage.apply_track_metadata(metadata, repair=repair)
+            report["unchecked"] = len(unchecked)
+            self.last_report = report
+            return report
+        finally:
+            self.running = False
+    
+    def run_in_background(self, repair=False, on_done=None):
+        """Run the check on a daemon thread."""
+        def job():
+            try:
+                report = self.run(repair=repair)
+            except Exception as e:
+                logger.error("Library check failed: %s", e)
+                return
+            if on_done:
+                on_done(report)
+        
+        self.running = True
+        thread = threading.Thread(target=job, daemon=True)
+        thread.start()
+        return thread
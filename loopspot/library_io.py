@@ -0,0 +1,255 @@
+import os
+import sys
+import csv
+import json
+import time
+import struct
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+FORMATS = ("jsonl", "csv", "bin")
+
+FIELDS = ["track_id", "track_name", "artist", "name", "point_a", "point_b", "created", "last_used"]
+STRING_FIELDS = ["track_id", "track_name", "artist", "name", "created", "last_used"]
+
+# Binary layout: magic header, then one length-prefixed frame per loop.
+# A frame holds point_a and point_b as uint32 followed by each string field
+# as a uint16 length and UTF-8 bytes.
+BINARY_MAGIC = b"LSPT\x01"
+FRAME_HEADER = struct.Struct(">I")
+POINTS = struct.Struct(">II")
+STRING_LENGTH = struct.Struct(">H")
+
+def guess_format(path):
+    """Guess the dump format from a file extension."""
+    extension = os.path.splitext(path)[1].lower().lstrip(".")
+    if extension in ("json", "jsonl", "ndjson"):
+        return "jsonl"
+    if extension == "csv":
+        return "csv"
+    return "bin"
+
+def iter_records(storage):
+    """Yield flat loop records from storage one at a time."""
+    for track_id, loops in storage.loops.items():
+        for loop in loops:
+            record = {"track_id": track_id}
+            for field in FIELDS[1:]:
+                record[field] = loop.get(field)
+            yield record
+
+def encode_frame(record):
+    """Encode one record as a length-prefixed binary frame."""
+    payload = [POINTS.pack(record["point_a"], record["point_b"])]
+    for field in STRING_FIELDS:
+        data = (record.get(field) or "").encode("utf-8")
+        payload.append(STRING_LENGTH.pack(len(data)))
+        payload.append(data)
+    body = b"".join(payload)
+    return FRAME_HEADER.pack(len(body)) + body
+
+def decode_frame(body):
+    """Decode the body of a binary frame back into a record."""
+    point_a, point_b = POINTS.unpack_from(body, 0)
+    offset = POINTS.size
+    record = {"point_a": point_a, "point_b": point_b}
+    for field in STRING_FIELDS:
+        (length,) = STRING_LENGTH.unpack_from(body, offset)
+        offset += STRING_LENGTH.size
+        record[field] = body[offset:offset + length].decode("utf-8")
+        offset += length
+    return record
+
+def validate_record(record):
+    """Normalize a raw record, or return None if it is not a valid loop."""
+    try:
+        track_id = str(record.get("track_id") or "").strip()
+        point_a = int(record.get("point_a"))
+        point_b = int(record.get("point_b"))
+    except (TypeError, ValueError):
+        return None
+    
+    if not track_id or point_a < 0 or point_b <= point_a:
+        return None
+    
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return {
+        "track_id": track_id,
+        "track_name": record.get("track_name") or "Unknown track",
+        "artist": record.get("artist") or "Unknown artist",
+        "name": record.get("name") or "Imported loop",
+        "point_a": point_a,
+        "point_b": point_b,
+        "created": record.get("created") or timestamp,
+        "last_used": record.get("last_used") or timestamp
+    }
+
+def parse_chunk(fmt, chunk):
+    """Parse and validate a chunk of raw records; runs in a worker process.
+    
+    Returns (valid records, number of rejected records).
+    """
+    records = []
+    rejected = 0
+    for raw in chunk:
+        try:
+            if fmt == "jsonl":
+                record = json.loads(raw)
+            elif fmt == "bin":
+                record = decode_frame(raw)
+            else:
+                record = dict(zip(FIELDS, raw))
+        except (ValueError, struct.error, UnicodeDecodeError):
+            rejected += 1
+            continue
+        
+        record = validate_record(record) if isinstance(record, dict) else None
+        if record is None:
+            rejected += 1
+        else:
+            records.append(record)
+    return records, rejected
+
+class Progress:
+    """Rate-limited progress and throughput readout on stderr."""
+    
+    def __init__(self, label, interval=0.5):
+        self.label = label
+        self.interval = interval
+        self.count = 0
+        self.started = time.monotonic()
+        self._last_report = 0.0
+    
+    def update(self, count, force=False):
+        self.count += count
+        now = time.monotonic()
+        if force or now - self._last_report >= self.interval:
+            self._last_report = now
+            elapsed = max(now - self.started, 1e-6)
+            sys.stderr.write(f"\r{self.label}: {self.count} records ({self.count / elapsed:,.0f}/s)")
+            sys.stderr.flush()
+    
+    def finish(self):
+        self.update(0, force=True)
+        sys.stderr.write("\n")
+
+def export_library(storage, path, fmt=None):
+    """Stream every saved loop to path in the given format."""
+    fmt = fmt or guess_format(path)
+    progress = Progress("Exported")
+    
+    if fmt == "bin":
+        with open(path, "wb") as f:
+            f.write(BINARY_MAGIC)
+            for record in iter_records(storage):
+                f.write(encode_frame(record))
+                progress.update(1)
+    else:
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            if fmt == "csv":
+                writer = csv.writer(f)
+                writer.writerow(FIELDS)
+            for record in iter_records(storage):
+                if fmt == "csv":
+                    writer.writerow([record[field] for field in FIELDS])
+                else:
+                    f.write(json.dumps(record, separators=(",", ":")) + "\n")
+                progress.update(1)
+    
+    progress.finish()
+    return progress.count
+
+def _read_raw(f, fmt):
+    """Yield raw records without parsing them."""
+    if fmt == "jsonl":
+        for line in f:
+            if line.strip():
+                yield line
+    elif fmt == "csv":
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header != FIELDS:
+            raise ValueError("CSV header does not match the LoopSpot export format")
+        # Quoted fields may span lines, so rows are split here rather than in workers
+        yield from reader
+    else:
+        if f.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+            raise ValueError("Not a LoopSpot binary export")
+        while True:
+            header = f.read(FRAME_HEADER.size)
+            if len(header) < FRAME_HEADER.size:
+                break
+            (length,) = FRAME_HEADER.unpack(header)
+            yield f.read(length)
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _parsed_chunks(f, fmt, chunk_size, workers):
+    """Parse chunks in a process pool, keeping a bounded number in flight."""
+    raw_chunks = _chunks(_read_raw(f, fmt), chunk_size)
+    if workers <= 1:
+        for chunk in raw_chunks:
+            yield parse_chunk(fmt, chunk)
+        return
+    
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in raw_chunks:
+            pending.append(pool.submit(parse_chunk, fmt, chunk))
+            # Bound memory: never hold more than two chunks per worker
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def import_library(storage, path, fmt=None, batch_size=10000, workers=None):
+    """Stream loops from path into storage, skipping invalid and duplicate loops.
+    
+    Returns a dict with the number of imported, duplicate and rejected loops.
+    The whole import is one storage transaction, so the library file is written
+    once at the end.
+    """
+    fmt = fmt or guess_format(path)
+    workers = workers or os.cpu_count() or 1
+    stats = {"imported": 0, "duplicates": 0, "rejected": 0}
+    progress = Progress("Imported")
+    
+    mode = "rb" if fmt == "bin" else "r"
+    encoding = None if fmt == "bin" else "utf-8"
+    with storage.bulk(), open(path, mode, newline="" if fmt == "csv" else None, encoding=encoding) as f:
+        # Loops are duplicates when the track and both points match. Only the 64-bit
+        # hash of each key is kept, a third of the memory of the tuples; a collision
+        # among a million loops is about a one in ten million chance
+        seen = {hash((track_id, loop["point_a"], loop["point_b"]))
+                for track_id, loops in storage.loops.items() for loop in loops}
+        batch = []
+        for records, rejected in _parsed_chunks(f, fmt, max(batch_size // 4, 1), workers):
+            stats["rejected"] += rejected
+            for record in records:
+                key = hash((record["track_id"], record["point_a"], record["point_b"]))
+                if key in seen:
+                    stats["duplicates"] += 1
+                    continue
+                seen.add(key)
+                batch.append(record)
+            
+            if len(batch) >= batch_size:
+                stats["imported"] += storage.add_loops(batch)
+                progress.update(len(batch))
+                batch = []
+        
+        if batch:
+            stats["imported"] += storage.add_loops(batch)
+            progress.update(len(batch))
+    
+    progress.finish()
+    return stats
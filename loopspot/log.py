@@ -0,0 +1,132 @@
+import os
+import sys
+import copy
+import json
+import queue
+import atexit
+import logging
+import logging.handlers
+from .rate_limit import RateBudget
+from .utils import get_application_path
+
+LOG_PATH = os.path.join(get_application_path(), "data", "loopspot.log")
+
+# Extra fields callers may attach with extra={...}
+STRUCTURED_FIELDS = ("event", "latency_ms", "track_id", "position_ms", "device_id", "error_class")
+
+_listener = None
+
+class JSONFormatter(logging.Formatter):
+    """Format records as one JSON object per line."""
+    
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%d %H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for field in STRUCTURED_FIELDS + ("repeats", "previous_repeats"):
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+class ConsoleFormatter(logging.Formatter):
+    """Short human-readable format for the terminal."""
+    
+    def format(self, record):
+        message = record.getMessage()
+        repeats = getattr(record, "repeats", None)
+        if repeats:
+            message += f" (repeated {repeats} more times)"
+        previous_repeats = getattr(record, "previous_repeats", None)
+        if previous_repeats:
+            message = f"(previous message repeated {previous_repeats} more times)\n{message}"
+        return message
+
+class DuplicateFilter(logging.Filter):
+    """Collapse runs of identical messages into one line with a repeat count.
+    
+    The first message is passed through. Repeats within the window are counted
+    and dropped; the count is reported when the window expires or on the next
+    different message.
+    """
+    
+    def __init__(self, window=30.0):
+        super().__init__()
+        self.window = window
+        self._key = None
+        self._since = 0.0
+        self._repeats = 0
+    
+    def filter(self, record):
+        key = (record.levelno, record.name, record.getMessage())
+        if key == self._key:
+            if record.created - self._since < self.window:
+                self._repeats += 1
+                return False
+            record.repeats = self._repeats
+        elif self._repeats:
+            record.previous_repeats = self._repeats
+        self._key = key
+        self._since = record.created
+        self._repeats = 0
+        return True
+
+class RateLimitFilter(logging.Filter):
+    """Drop records beyond a sustained rate so a flood cannot swamp the terminal."""
+    
+    def __init__(self, rate=2.0, burst=5):
+        super().__init__()
+        self.budget = RateBudget(rate=rate, burst=burst)
+    
+    def filter(self, record):
+        return self.budget.try_acquire()
+
+class SinkListener(logging.handlers.QueueListener):
+    """Queue listener that hands each handler its own copy of a record.
+    
+    DuplicateFilter stores its repeat counts on the record, so sharing one
+    record would leak one sink's counts into the other's output.
+    """
+    
+    def handle(self, record):
+        record = self.prepare(record)
+        for handler in self.handlers:
+            if not self.respect_handler_level or record.levelno >= handler.level:
+                handler.handle(copy.copy(record))
+
+def setup_logging(console_level=logging.WARNING, log_path=LOG_PATH):
+    """Route 'loopspot' logging through a queue to a rotating file and the console.
+    
+    Callers only enqueue records; formatting and I/O happen on the listener thread.
+    """
+    global _listener
+    if _listener:
+        return _listener
+    
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    file_handler = logging.handlers.RotatingFileHandler(log_path, maxBytes=1024 * 1024, backupCount=3)
+    file_handler.setLevel(logging.DEBUG)
+    file_handler.setFormatter(JSONFormatter())
+    file_handler.addFilter(DuplicateFilter())
+    
+    console_handler = logging.StreamHandler(sys.stderr)
+    console_handler.setLevel(console_level)
+    console_handler.setFormatter(ConsoleFormatter())
+    console_handler.addFilter(DuplicateFilter())
+    console_handler.addFilter(RateLimitFilter())
+    
+    log_queue = queue.SimpleQueue()
+    logger = logging.getLogger("loopspot")
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.propagate = False
+    
+    _listener = SinkListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
@@ -1,110 +1,286 @@
+import logging
 import threading
 import time
+from collections import namedtuple, deque
+from concurrent.futures import ThreadPoolExecutor
+from .analysis import snap_to_grid
+from .resilience import SpotifyAPIError, FATAL
+from .utils import parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+# Immutable snapshot of the loop configuration. The controller swaps the whole
+# tuple under a lock, so the monitor thread always sees a consistent A/B pair.
+LoopState = namedtuple('LoopState', ['track_id', 'point_a', 'point_b', 'loop_name', 'active'])
+
+class TickStats:
+    """Scheduling lag of the loop engine: how late each tick started compared to its plan."""
+    
+    def __init__(self, window=100):
+        """Keep the lag of the last window ticks."""
+        self.lags = deque(maxlen=window)
+    
+    def record(self, lag_ms):
+        self.lags.append(lag_ms)
+    
+    def summary(self):
+        """Get (last lag, worst lag in the window) in ms, or None before the first tick."""
+        if not self.lags:
+            return None
+        return self.lags[-1], max(self.lags)
 
 class LoopController:
     """Control the AB looping logic."""
     
+    MAX_BACKOFF = 15.0  # Longest wait between polls while the API is failing
+    SAMPLE_MAX_AGE = 0.5  # Reuse a playback sample this recent (seconds) when marking points
+    STALL_THRESHOLD = 30.0  # An engine this late (seconds) for its next tick is restarted
+    WATCHDOG_INTERVAL = 1.0
+    POLL_INTERVAL = 0.3
+    
+    # End-of-track mode, for loops whose point B is at or near the track end.
+    # Spotify moves on to the next track before a poll can see the boundary,
+    # so the jump is timed from the predicted position instead.
+    END_GUARD_MS = 1500  # B this close to the end switches the mode on
+    END_MARGIN_MS = 250  # Never let the seek land later than this before the end
+    RECOVERY_WINDOW = 5.0  # Seconds after nearing the end in which a track change is an auto-advance
+    
     def __init__(self, spotify_player):
         """Initialize with a Spotify player."""
         self.player = spotify_player
-        self.point_a = None
-        self.point_b = None
-        self.current_track_id = None
-        self.current_loop_name = None
-        self.active = False
+        self._state = LoopState(None, None, None, None, False)
+        self._state_lock = threading.Lock()
+        self._wake_event = threading.Event()  # Set whenever the state changes
         self.loop_thread = None
-        self.stop_event = threading.Event()
+        self.stop_event = threading.Event()  # Set to shut the engine thread down
+        self.watchdog_thread = None
+        self._generation = 0  # Bumped on restart; an engine thread of an older generation exits
+        self._planned_tick = None  # Monotonic time the engine should start its next tick; None while idle
+        self.heartbeat = None  # Monotonic time the engine last started a tick
+        self.tick_stats = TickStats()
+        self.engine_restarts = 0
         self.ui_refresh_callback = None  # Callback for UI refresh
+        self.snap_mode = None  # None, 'beat' or 'bar'
+        self.analysis = None  # AnalysisCache used for snapping
+        self.state_callback = None  # Callback for persisting state changes
+        self._callback_lock = threading.Lock()
+        
+        # Fan-out mode: extra players (other devices/accounts) mirrored at each jump
+        self.fanout_players = []
+        self.fanout_tolerance_ms = 250
+        self.fanout_skew = {}  # Per-device offset from the primary player in ms
+        self.last_fanout_spread_ms = None
+        self._fanout_pool = None
+    
+    @property
+    def state(self):
+        """Get the current loop state snapshot."""
+        return self._state
+    
+    @property
+    def point_a(self):
+        return self._state.point_a
+    
+    @point_a.setter
+    def point_a(self, value):
+        self._update_state(point_a=value)
+    
+    @property
+    def point_b(self):
+        return self._state.point_b
+    
+    @point_b.setter
+    def point_b(self, value):
+        self._update_state(point_b=value)
+    
+    @property
+    def current_track_id(self):
+        return self._state.track_id
+    
+    @current_track_id.setter
+    def current_track_id(self, value):
+        self._update_state(track_id=value)
+    
+    @property
+    def current_loop_name(self):
+        return self._state.loop_name
+    
+    @current_loop_name.setter
+    def current_loop_name(self, value):
+        self._update_state(loop_name=value)
+    
+    @property
+    def active(self):
+        return self._state.active
+    
+    def _update_state(self, expected=None, **changes):
+        """Atomically swap in a new state snapshot and wake the engine.
+        
+        If expected is given, the swap only happens when the current snapshot
+        is still that object. Returns the new state, or None if the swap was skipped.
+        """
+        with self._state_lock:
+            if expected is not None and self._state is not expected:
+                return None
+            self._state = self._state._replace(**changes)
+            state = self._state
+        self._wake_event.set()
+        
+        if self.state_callback:
+            # Always hand over the latest snapshot, so whichever thread reports
+            # last also reports the newest state
+            with self._callback_lock:
+                self.state_callback(self._state)
+        return state
     
     def set_ui_refresh_callback(self, callback):
         """Set callback function to refresh UI after seeking."""
         self.ui_refresh_callback = callback
     
-    def set_point_a(self):
-        """Set point A to the current playback position."""
-        track = self.player.get_current_track()
-        if not track:
-            print("No track is currently playing.")
-            return False
+    def set_state_callback(self, callback):
+        """Set callback function called with the new state after every change."""
+        self.state_callback = callback
+    
+    def set_snap_mode(self, mode, analysis_cache=None):
+        """Snap new A/B points to the nearest 'beat' or 'bar' (None to disable)."""
+        self.snap_mode = mode
+        if analysis_cache is not None:
+            self.analysis = analysis_cache
+    
+    def _snap(self, track_id, position_ms):
+        """Snap a position to the beat/bar grid, or return it unchanged if unavailable."""
+        if not self.snap_mode or not self.analysis:
+            return position_ms, False
         
-        position = track['progress_ms']
-        self.point_a = position
-        self.current_track_id = track['id']
+        grids = self.analysis.get(track_id)
+        if not grids or len(grids[self.snap_mode]) == 0:
+            return position_ms, False
+        return snap_to_grid(grids[self.snap_mode], position_ms), True
+    
+    def _describe_point(self, label, position_ms, snapped):
+        """Print the confirmation for a newly set point."""
+        formatted_time = self.player.format_time(position_ms, precise=True)
+        suffix = f" (snapped to {self.snap_mode})" if snapped else ""
+        print(f"Point {label} set at {formatted_time}{suffix}")
+    
+    def _parse_position(self, timestamp, track):
+        """Parse a timestamp and check it lies within the track, or return None."""
+        try:
+            position_ms = parse_timestamp(timestamp)
+        except ValueError:
+            print("Invalid timestamp format. Please use mm:ss or mm:ss.mmm format.")
+            return None
         
-        formatted_time = self.player.format_time(position)
-        print(f"Point A set at {formatted_time}")
-        return True
+        # Validate the timestamp
+        if position_ms < 0 or position_ms > track['duration_ms']:
+            print(f"Timestamp out of range. Track duration is {self.player.format_time(track['duration_ms'])}.")
+            return None
+        return position_ms
     
-    def set_point_a_timestamp(self, timestamp):
-        """Set point A to a specific timestamp (mm:ss format)."""
-        track = self.player.get_current_track()
+    def _current_track(self):
+        """Get the playback state, or None if nothing is playing. Raises SpotifyAPIError."""
+        return self.player.sample_playback(max_age=self.SAMPLE_MAX_AGE)[0]
+    
+    def _report_unavailable(self, error):
+        """Tell the user a command failed because of the API, not the playback state."""
+        logger.warning("Error sampling playback: %s", error, extra={"error_class": error.error_class})
+        print("Spotify unavailable, try again.")
+    
+    def _position_at(self, pressed_at):
+        """Get (track, position in ms) at a monotonic keypress time, or (None, None).
+        
+        The sampled position is moved forward or back by the time between the
+        server's sample and the keypress, so request latency and jitter cancel out.
+        Raises SpotifyAPIError, so an outage is not mistaken for stopped playback.
+        """
+        track, sampled_at = self.player.sample_playback(max_age=self.SAMPLE_MAX_AGE)
+        if not track:
+            return None, None
+        
+        position_ms = track['progress_ms']
+        if track['is_playing']:
+            position_ms += (pressed_at - sampled_at) * 1000
+        return track, int(round(min(max(position_ms, 0), track['duration_ms'])))
+    
+    def set_point_a(self, pressed_at=None):
+        """Set point A to the playback position when the key was pressed (default: now)."""
+        try:
+            track, position_ms = self._position_at(pressed_at or time.monotonic())
+        except SpotifyAPIError as e:
+            self._report_unavailable(e)
+            return False
         if not track:
             print("No track is currently playing.")
             return False
         
+        return self._apply_point_a(track, position_ms)
+    
+    def set_point_a_timestamp(self, timestamp):
+        """Set point A to a specific timestamp (mm:ss or mm:ss.mmm format)."""
         try:
-            # Parse mm:ss format into milliseconds
-            parts = timestamp.strip().split(':')
-            if len(parts) != 2:
-                print("Invalid timestamp format. Please use mm:ss format.")
-                return False
-            
-            minutes = int(parts[0])
-            seconds = int(parts[1])
-            position_ms = (minutes * 60 + seconds) * 1000
-            
-            # Validate the timestamp
-            if position_ms < 0 or position_ms > track['duration_ms']:
-                print(f"Timestamp out of range. Track duration is {self.player.format_time(track['duration_ms'])}.")
-                return False
-            
-            self.point_a = position_ms
-            self.current_track_id = track['id']
-            
-            formatted_time = self.player.format_time(position_ms)
-            print(f"Point A set at {formatted_time}")
-            return True
-            
-        except ValueError:
-            print("Invalid timestamp format. Please use mm:ss format.")
+            track = self._current_track()
+        except SpotifyAPIError as e:
+            self._report_unavailable(e)
             return False
-    
-    def set_point_b(self):
-        """Set point B to the current playback position."""
-        track = self.player.get_current_track()
         if not track:
             print("No track is currently playing.")
             return False
         
-        if not self.point_a:
-            print("Please set point A first.")
+        position_ms = self._parse_position(timestamp, track)
+        if position_ms is None:
             return False
-        
-        if track['id'] != self.current_track_id:
-            print("Track has changed. Please set point A again.")
-            self.point_a = None
+        return self._apply_point_a(track, position_ms)
+    
+    def set_point_a_position(self, track, position_ms):
+        """Set point A on a track just started at that position, without polling playback."""
+        # The loop on the previous track ends here, and its point B does not carry over
+        self._update_state(point_b=None, loop_name=None, active=False)
+        return self._apply_point_a(track, position_ms)
+    
+    def _apply_point_a(self, track, position_ms):
+        """Snap and store point A for the given track."""
+        position_ms, snapped = self._snap(track['id'], position_ms)
+        self._update_state(point_a=position_ms, track_id=track['id'])
+        self._describe_point("A", position_ms, snapped)
+        return True
+    
+    def set_point_b(self, pressed_at=None):
+        """Set point B to the playback position when the key was pressed (default: now)."""
+        try:
+            track, position_ms = self._position_at(pressed_at or time.monotonic())
+        except SpotifyAPIError as e:
+            self._report_unavailable(e)
             return False
-        
-        position = track['progress_ms']
-        
-        # Ensure point B is after point A
-        if position <= self.point_a:
-            print("Point B must be after point A.")
+        if not track:
+            print("No track is currently playing.")
             return False
         
-        self.point_b = position
-        formatted_time = self.player.format_time(position)
-        print(f"Point B set at {formatted_time}")
-        return True
+        if not self._check_point_a(track):
+            return False
+        return self._apply_point_b(track, position_ms)
     
     def set_point_b_timestamp(self, timestamp):
-        """Set point B to a specific timestamp (mm:ss format)."""
-        track = self.player.get_current_track()
+        """Set point B to a specific timestamp (mm:ss or mm:ss.mmm format)."""
+        try:
+            track = self._current_track()
+        except SpotifyAPIError as e:
+            self._report_unavailable(e)
+            return False
         if not track:
             print("No track is currently playing.")
             return False
         
-        if not self.point_a:
+        if not self._check_point_a(track):
+            return False
+        
+        position_ms = self._parse_position(timestamp, track)
+        if position_ms is None:
+            return False
+        return self._apply_point_b(track, position_ms)
+    
+    def _check_point_a(self, track):
+        """Check that point A is set for the given track before setting point B."""
+        if self.point_a is None:
             print("Please set point A first.")
             return False
         
@@ -112,89 +288,79 @@ class LoopController:
             print("Track has changed. Please set point A again.")
             self.point_a = None
             return False
+        return True
+    
+    def _apply_point_b(self, track, position_ms):
+        """Snap and store point B, keeping it after point A."""
+        position_ms, snapped = self._snap(track['id'], position_ms)
         
-        try:
-            # Parse mm:ss format into milliseconds
-            parts = timestamp.strip().split(':')
-            if len(parts) != 2:
-                print("Invalid timestamp format. Please use mm:ss format.")
-                return False
-            
-            minutes = int(parts[0])
-            seconds = int(parts[1])
-            position_ms = (minutes * 60 + seconds) * 1000
-            
-            # Validate the timestamp
-            if position_ms < 0 or position_ms > track['duration_ms']:
-                print(f"Timestamp out of range. Track duration is {self.player.format_time(track['duration_ms'])}.")
-                return False
-            
-            # Ensure point B is after point A
-            if position_ms <= self.point_a:
-                print("Point B must be after point A.")
-                return False
-            
-            self.point_b = position_ms
-            formatted_time = self.player.format_time(position_ms)
-            print(f"Point B set at {formatted_time}")
-            return True
-            
-        except ValueError:
-            print("Invalid timestamp format. Please use mm:ss format.")
+        # Ensure point B is after point A
+        if position_ms <= self.point_a:
+            print("Point B must be after point A.")
             return False
+        
+        self.point_b = position_ms
+        self._describe_point("B", position_ms, snapped)
+        return True
     
     def clear_points(self):
         """Clear the current loop points."""
-        self.point_a = None
-        self.point_b = None
-        self.current_track_id = None
+        self._update_state(point_a=None, point_b=None, track_id=None)
         print("Loop points cleared.")
     
     def get_current_points(self):
         """Get the current loop points."""
-        if self.point_a is not None and self.point_b is not None:
+        state = self._state
+        if state.point_a is not None and state.point_b is not None:
             return {
-                'track_id': self.current_track_id,
-                'point_a': self.point_a,
-                'point_b': self.point_b,
-                'point_a_formatted': self.player.format_time(self.point_a),
-                'point_b_formatted': self.player.format_time(self.point_b)
+                'track_id': state.track_id,
+                'point_a': state.point_a,
+                'point_b': state.point_b,
+                'point_a_formatted': self.player.format_time(state.point_a),
+                'point_b_formatted': self.player.format_time(state.point_b)
             }
         return None
     
     def start_loop(self):
         """Start the looping process."""
-        if not self.point_a or not self.point_b:
+        state = self._state
+        if state.point_a is None or state.point_b is None:
             print("Both points A and B must be set before starting the loop.")
             return False
         
-        track = self.player.get_current_track()
-        if not track or track['id'] != self.current_track_id:
+        # An API error says nothing about the track, so the points are kept
+        try:
+            track = self._current_track()
+        except SpotifyAPIError as e:
+            self._report_unavailable(e)
+            return False
+        if not track or track['id'] != state.track_id:
             print("Track has changed. Please set points again.")
             self.clear_points()
             return False
         
-        if self.active:
+        if state.active:
             print("Loop is already active.")
             return True
         
+        # In fan-out mode every device starts together at point A
+        if self.fanout_players:
+            print("Starting all fan-out devices at point A.")
+            self._jump_to(state.point_a)
         # If track is paused, start at point A and resume playback
-        if not track['is_playing']:
+        elif not track['is_playing']:
             print(f"Track is paused. Seeking to point A and resuming playback.")
-            self.player.seek_to_position_and_play(self.point_a)
+            self.player.seek_to_position_and_play(state.point_a)
         # If track is already playing but outside loop range, seek to point A
-        elif track['progress_ms'] < self.point_a or track['progress_ms'] >= self.point_b:
+        elif track['progress_ms'] < state.point_a or track['progress_ms'] >= state.point_b:
             print(f"Playback outside loop range. Seeking to point A.")
-            self.player.seek_to_position(self.point_a)
+            self.player.seek_to_position(state.point_a)
         
-        # Start the loop thread
-        self.active = True
-        self.stop_event.clear()
-        self.loop_thread = threading.Thread(target=self._loop_monitor)
-        self.loop_thread.daemon = True
-        self.loop_thread.start()
+        # Arm the loop and make sure the engine thread is running
+        self._update_state(active=True)
+        self._ensure_engine()
         
-        print(f"Loop started: {self.player.format_time(self.point_a)} - {self.player.format_time(self.point_b)}")
+        print(f"Loop started: {self.player.format_time(state.point_a)} - {self.player.format_time(state.point_b)}")
         return True
     
     def stop_loop(self):
@@ -203,11 +369,8 @@ class LoopController:
             print("No active loop to stop.")
             return False
         
-        self.active = False
-        self.stop_event.set()
-        
-        if self.loop_thread and self.loop_thread.is_alive():
-            self.loop_thread.join(timeout=1.0)
+        # The engine is woken by the state change and goes idle immediately
+        self._update_state(active=False)
         
         print("Loop stopped.")
         return True
@@ -217,59 +380,322 @@ class LoopController:
         if not loop_data:
             return False
         
-        track = self.player.get_current_track()
+        try:
+            track = self._current_track()
+        except SpotifyAPIError as e:
+            self._report_unavailable(e)
+            return False
         if not track or track['id'] != loop_data.get('track_id'):
             print("This loop is for a different track.")
             return False
         
-        self.point_a = loop_data.get('point_a')
-        self.point_b = loop_data.get('point_b')
-        self.current_track_id = loop_data.get('track_id')
-        self.current_loop_name = loop_data.get('loop_name')
+        # Swap all points in one step; an active loop picks them up on its next tick
+        state = self._update_state(
+            point_a=loop_data.get('point_a'),
+            point_b=loop_data.get('point_b'),
+            track_id=loop_data.get('track_id'),
+            loop_name=loop_data.get('loop_name')
+        )
         
-        print(f"Loop loaded: {self.player.format_time(self.point_a)} - {self.player.format_time(self.point_b)}")
+        print(f"Loop loaded: {self.player.format_time(state.point_a)} - {self.player.format_time(state.point_b)}")
         return True
     
-    def _loop_monitor(self):
+    def resume(self, session, track):
+        """Restore a persisted session if its track is still playing."""
+        if not session or not track or track['id'] != session.get('track_id'):
+            return False
+        
+        point_a = session.get('point_a')
+        point_b = session.get('point_b')
+        if point_a is None:
+            return False
+        
+        # Re-arm straight away; the engine seeks back into range on its first tick
+        active = bool(session.get('active')) and point_b is not None
+        self._update_state(
+            track_id=track['id'],
+            point_a=point_a,
+            point_b=point_b,
+            loop_name=session.get('loop_name'),
+            active=active
+        )
+        if active:
+            self._ensure_engine()
+            print(f"Resumed loop: {self.player.format_time(point_a)} - {self.player.format_time(point_b)}")
+        return True
+    
+    def set_fanout_players(self, players, max_workers=4):
+        """Mirror the loop onto additional players, each pinned to its own device."""
+        if self._fanout_pool:
+            self._fanout_pool.shutdown(wait=False)
+            self._fanout_pool = None
+        
+        self.fanout_players = list(players)
+        self.fanout_skew = {}
+        self.last_fanout_spread_ms = None
+        if self.fanout_players:
+            # One worker per device up to the bound, including the primary player
+            workers = min(len(self.fanout_players) + 1, max_workers)
+            self._fanout_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="loopspot-fanout")
+    
+    def _jump_to(self, position_ms):
+        """Seek every target device to position_ms and resume playback."""
+        if not self.fanout_players:
+            return self.player.seek_to_position_and_play(position_ms)
+        
+        players = [self.player] + self.fanout_players
+        results = list(self._fanout_pool.map(lambda p: p.seek_to_position_and_play(position_ms), players))
+        self._align_fanout(players)
+        return results[0]
+    
+    def _sample_position(self, player):
+        """Get (position_ms, monotonic time the position was sampled) for a player."""
+        sent = time.monotonic()
+        try:
+            state = player.poll_state()
+        except Exception as e:
+            logger.warning("Error polling fan-out device: %s", e, extra={"device_id": player.devices.pinned_device_id})
+            state = None
+        received = time.monotonic()
+        position = state['progress_ms'] if state else None
+        # Assume the server sampled the position halfway through the request
+        return position, (sent + received) / 2
+    
+    def _align_fanout(self, players):
+        """Measure inter-device skew and re-seek devices that drifted past the tolerance."""
+        samples = list(self._fanout_pool.map(self._sample_position, players))
+        reference_position, reference_time = samples[0]
+        if reference_position is None:
+            return
+        
+        # Project every sample onto the primary's sample time before comparing
+        skews = {}
+        for player, (position, sampled_at) in zip(players[1:], samples[1:]):
+            if position is None:
+                continue
+            projected = position + (reference_time - sampled_at) * 1000
+            skews[player.devices.pinned_device_id] = int(projected - reference_position)
+        
+        self.fanout_skew = skews
+        offsets = [0] + list(skews.values())
+        self.last_fanout_spread_ms = max(offsets) - min(offsets)
+        logger.info("Fan-out spread: %d ms across %d devices", self.last_fanout_spread_ms, len(offsets),
+                    extra={"event": "fanout_spread", "latency_ms": self.last_fanout_spread_ms})
+        
+        drifted = [p for p in players[1:] if abs(skews.get(p.devices.pinned_device_id, 0)) > self.fanout_tolerance_ms]
+        if drifted:
+            target = reference_position + int((time.monotonic() - reference_time) * 1000)
+            list(self._fanout_pool.map(lambda p: p.seek_to_position(target), drifted))
+            logger.info("Re-aligned %d device(s)", len(drifted), extra={"event": "fanout_realign", "position_ms": target})
+    
+    def shutdown(self):
+        """Stop the engine thread, leaving the loop state as it is for a later resume."""
+        self.stop_event.set()
+        self._wake_event.set()
+        if self.loop_thread and self.loop_thread.is_alive():
+            self.loop_thread.join(timeout=1.0)
+        if self._fanout_pool:
+            self._fanout_pool.shutdown(wait=False)
+    
+    def _ensure_engine(self):
+        """Start the persistent engine thread and its watchdog if they are not running yet."""
+        if not (self.loop_thread and self.loop_thread.is_alive()):
+            self.stop_event.clear()
+            self._start_engine_thread()
+        if not (self.watchdog_thread and self.watchdog_thread.is_alive()):
+            self.watchdog_thread = threading.Thread(target=self._watchdog, name="loopspot-watchdog")
+            self.watchdog_thread.daemon = True
+            self.watchdog_thread.start()
+    
+    def _start_engine_thread(self):
+        """Start a new engine thread; any older one exits as soon as it gets control back."""
+        self._generation += 1
+        self._planned_tick = time.monotonic()
+        self.loop_thread = threading.Thread(target=self._loop_monitor, args=(self._generation,),
+                                            name="loopspot-engine")
+        self.loop_thread.daemon = True
+        self.loop_thread.start()
+    
+    def _watchdog(self):
+        """Restart the engine if it misses its planned tick by more than STALL_THRESHOLD."""
+        while not self.stop_event.wait(self.WATCHDOG_INTERVAL):
+            stalled_for = self.stalled_for()
+            if stalled_for > self.STALL_THRESHOLD:
+                self.engine_restarts += 1
+                logger.error("Loop engine stalled for %.1fs, restarting it", stalled_for,
+                             extra={"event": "engine_restarted", "latency_ms": round(stalled_for * 1000)})
+                # The loop state lives in the controller, so the new thread carries on where the old one hung
+                self._start_engine_thread()
+    
+    def stalled_for(self):
+        """Get how many seconds the engine is overdue for its planned tick (0 while on time or idle)."""
+        planned = self._planned_tick
+        if planned is None:
+            return 0.0
+        return max(0.0, time.monotonic() - planned)
+    
+    def engine_health(self):
+        """Get a dict of engine liveness and scheduling lag metrics."""
+        lag = self.tick_stats.summary()
+        return {
+            "running": bool(self.loop_thread and self.loop_thread.is_alive()),
+            "stalled_ms": round(self.stalled_for() * 1000),
+            "tick_lag_ms": lag and round(lag[0], 1),
+            "max_tick_lag_ms": lag and round(lag[1], 1),
+            "restarts": self.engine_restarts
+        }
+    
+    def _tick(self, generation):
+        """Record the start of an engine tick and how late it is against the planned time."""
+        planned = self._planned_tick
+        if planned is not None and generation == self._generation:
+            # Early wake-ups from state changes count as on time
+            self.tick_stats.record(max(0.0, time.monotonic() - planned) * 1000)
+        self._heartbeat(generation)
+    
+    def _heartbeat(self, generation):
+        """Mark the engine as making progress; it counts as due from now until its next wait."""
+        if generation != self._generation:
+            return  # A replaced thread must not mask a stall of its successor
+        self.heartbeat = self._planned_tick = time.monotonic()
+    
+    def _wait(self, timeout=None):
+        """Sleep until the timeout expires or the loop state changes."""
+        if threading.current_thread() is self.loop_thread:
+            self._planned_tick = None if timeout is None else time.monotonic() + timeout
+        self._wake_event.wait(timeout)
+    
+    def _loop_back(self, state, position):
+        """Jump back to point A, then refresh the UI."""
+        started = time.perf_counter()
+        self._jump_to(state.point_a)
+        logger.info("Playback outside loop range. Returned to %s", self.player.format_time(state.point_a),
+                    extra={"event": "loop_jump", "track_id": state.track_id, "position_ms": position,
+                           "latency_ms": round((time.perf_counter() - started) * 1000, 1)})
+        
+        # Give the seek a moment to take effect
+        self._wait(0.5)
+        
+        # Call UI refresh callback if set
+        if self.ui_refresh_callback:
+            self.ui_refresh_callback()
+    
+    def _restart_track(self, state):
+        """Start the looped track again at point A on every target device; returns success."""
+        players = [self.player] + self.fanout_players
+        if self._fanout_pool:
+            results = list(self._fanout_pool.map(lambda p: p.play_track(state.track_id, position_ms=state.point_a),
+                                                 players))
+        else:
+            results = [self.player.play_track(state.track_id, position_ms=state.point_a)]
+        
+        if self.ui_refresh_callback:
+            self.ui_refresh_callback()
+        return results[0]
+    
+    def _loop_monitor(self, generation):
         """Background thread that monitors playback position and performs looping."""
-        print("Loop monitor started.")
+        logger.debug("Loop monitor started.", extra={"event": "monitor_started"})
+        
+        failures = 0  # Consecutive API errors, for backoff
+        one_way = None  # Smoothed one-way request latency in seconds
+        near_end_at = None  # Monotonic time an end-of-track loop was last seen close to the end
         
-        while not self.stop_event.is_set():
+        while not self.stop_event.is_set() and generation == self._generation:
+            self._tick(generation)
+            # Clear before reading the snapshot so no state change can be missed
+            self._wake_event.clear()
+            state = self._state
+            
+            if not state.active or state.point_a is None or state.point_b is None:
+                # Idle until start, load or shutdown wakes us up
+                self._wait()
+                continue
+            
             try:
-                # Check if track is still the same
-                track = self.player.get_current_track()
-                if not track or track['id'] != self.current_track_id:
-                    print("Track changed. Stopping loop.")
-                    self.active = False
-                    break
+                # Check if track is still the same, using the lean polling path
+                sent = time.monotonic()
+                track, sampled_at = self.player.sample_playback()
+                self._heartbeat(generation)  # A jump may follow; its budget starts after the poll
+                latency = (time.monotonic() - sent) / 2
+                one_way = latency if one_way is None else 0.8 * one_way + 0.2 * latency
+                failures = 0
+                if self._state is not state or generation != self._generation:
+                    # Points were swapped, or the watchdog replaced this thread, while the request was in flight
+                    continue
+                
+                # Spotify moved past the end of an end-of-track loop before the jump landed
+                auto_advanced = near_end_at is not None and time.monotonic() - near_end_at < self.RECOVERY_WINDOW
+                
+                if not track or track['id'] != state.track_id:
+                    if auto_advanced:
+                        near_end_at = None
+                        logger.warning("Track ended inside the loop. Restarting it at point A.",
+                                       extra={"event": "end_of_track_recovery", "track_id": state.track_id})
+                        if self._restart_track(state):
+                            self._wait(0.5)
+                            continue
+                    if self._update_state(expected=state, active=False):
+                        logger.warning("Track changed. Stopping loop.", extra={"event": "track_changed", "track_id": track and track['id']})
+                    continue
+                
+                # Check playback position
+                position = track['progress_ms']
                 
                 # Check if track is paused
                 if not track['is_playing']:
+                    if auto_advanced and position < state.point_a:
+                        # The queue ran out and Spotify stopped at the start of the track
+                        near_end_at = None
+                        self._loop_back(state, position)
+                        continue
                     # Don't do anything while paused, just keep checking
-                    time.sleep(0.5)
+                    self._wait(0.5)
                     continue
                 
-                # Check playback position
-                position = track['progress_ms']
+                near_end_at = None  # Still on the track and playing, so any earlier jump landed
                 
                 # STRICT LOOPING: Check if current position is outside our loop range
-                if position < self.point_a or position >= self.point_b:
+                if position < state.point_a or position >= state.point_b:
                     # If it's before point A or after/at point B, jump back to point A
-                    print(f"Playback outside loop range. Returning to {self.player.format_time(self.point_a)}")
-                    self.player.seek_to_position_and_play(self.point_a)
-                    
-                    # Give the seek a moment to take effect
-                    time.sleep(0.5)
-                    
-                    # Call UI refresh callback if set
-                    if self.ui_refresh_callback:
-                        self.ui_refresh_callback()
+                    self._loop_back(state, position)
+                    self._wait(self.POLL_INTERVAL)
+                    continue
+                
+                if state.point_b >= track['duration_ms'] - self.END_GUARD_MS:
+                    # End-of-track mode: predict when playback reaches the boundary and send
+                    # the seek early enough to land on it, one request latency ahead
+                    boundary = min(state.point_b, track['duration_ms'] - self.END_MARGIN_MS)
+                    jump_at = sampled_at + (boundary - position) / 1000 - one_way
+                    if jump_at - time.monotonic() <= self.POLL_INTERVAL + 2 * one_way:
+                        # The next poll would come too late; this is the last chance
+                        near_end_at = time.monotonic()
+                        self._wait(max(0.0, jump_at - time.monotonic()))
+                        if self._state is not state or generation != self._generation or self.stop_event.is_set():
+                            continue  # Points changed, the loop was stopped or the engine shut down while waiting
+                        logger.debug("End of track ahead, jumping early", extra={"event": "end_of_track_jump"})
+                        self._loop_back(state, boundary)
+                        continue
                 
                 # Sleep for a short time to avoid excessive API calls
-                time.sleep(0.3)
+                self._wait(self.POLL_INTERVAL)
+                
+            except SpotifyAPIError as e:
+                if e.error_class == FATAL:
+                    # Retrying will not help, so disarm the loop instead of spinning
+                    if self._update_state(expected=state, active=False):
+                        logger.error("Spotify API error, stopping loop: %s", e,
+                                     extra={"event": "monitor_error", "error_class": e.error_class})
+                    continue
                 
+                # Transient outage: keep the loop armed and back off until the API recovers
+                failures += 1
+                delay = max(e.retry_after or 0, min(0.5 * 2 ** failures, self.MAX_BACKOFF))
+                logger.warning("Spotify API unavailable (%s), retrying in %.1fs", e.error_class, delay,
+                               extra={"event": "monitor_backoff", "error_class": e.error_class})
+                self._wait(delay)
             except Exception as e:
-                print(f"Error in loop monitor: {e}")
-                time.sleep(1)  # Wait a bit longer if there's an error
+                logger.error("Error in loop monitor: %s", e, extra={"event": "monitor_error"})
+                self._wait(1)  # Wait a bit longer if there's an error
         
-        print("Loop monitor stopped.") 
\ No newline at end of file
+        logger.debug("Loop monitor stopped.", extra={"event": "monitor_stopped"})
\ No newline at end of file
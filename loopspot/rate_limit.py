@@ -0,0 +1,43 @@
+import time
+import threading
+
+class RateBudget:
+    """Token bucket shared by background jobs that call the Web API."""
+    
+    def __init__(self, rate=5.0, burst=10):
+        """Allow rate requests per second on average, with bursts up to burst."""
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+    
+    def try_acquire(self):
+        """Take a token if one is available; never blocks."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+    
+    def acquire(self):
+        """Block until a token is available."""
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+    
+    def penalize(self, seconds):
+        """Drain the bucket after a 429 so callers back off for the given time."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 0) - seconds * self.rate
@@ -0,0 +1,106 @@
+import time
+import threading
+import requests
+from spotipy.exceptions import SpotifyException
+
+# Error classes used for counters and for deciding how the loop engine reacts
+TRANSIENT = "transient"  # Network failures, timeouts and 5xx responses
+RATE_LIMITED = "rate_limited"  # 429
+UNAUTHORIZED = "unauthorized"  # 401, usually an expired token
+NOT_FOUND = "not_found"  # 404, typically "no active device"
+FATAL = "fatal"  # Anything else; retrying will not help
+CIRCUIT_OPEN = "circuit_open"  # Call skipped because the breaker is open
+
+ERROR_CLASSES = (TRANSIENT, RATE_LIMITED, UNAUTHORIZED, NOT_FOUND, FATAL, CIRCUIT_OPEN)
+
+class SpotifyAPIError(Exception):
+    """A failed Spotify API call with its error class."""
+    
+    def __init__(self, error_class, message, retry_after=None):
+        super().__init__(message)
+        self.error_class = error_class
+        self.retry_after = retry_after
+
+def classify_error(exc):
+    """Get (error class, retry-after seconds or None) for an exception."""
+    if isinstance(exc, SpotifyAPIError):
+        return exc.error_class, exc.retry_after
+    
+    if isinstance(exc, SpotifyException):
+        status = exc.http_status
+        if status == 429:
+            retry_after = (exc.headers or {}).get("Retry-After")
+            return RATE_LIMITED, float(retry_after) if retry_after else None
+        if status == 401:
+            return UNAUTHORIZED, None
+        if status == 404:
+            return NOT_FOUND, None
+        if status in (408, 500, 502, 503, 504):
+            return TRANSIENT, None
+        return FATAL, None
+    
+    if isinstance(exc, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return TRANSIENT, None
+    return FATAL, None
+
+class CircuitBreaker:
+    """Stop calling a degraded API for a while, then probe it with a single request.
+    
+    Closed: calls go through and consecutive failures are counted.
+    Open: calls fail fast until reset_timeout, or a 429's Retry-After, has passed.
+    Half-open: one probe call is allowed; success closes the circuit, failure reopens it.
+    """
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(self, failure_threshold=5, reset_timeout=10.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._open_for = reset_timeout
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+    
+    def before_call(self):
+        """Raise SpotifyAPIError if the call should not be made right now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            remaining = self._opened_at + self._open_for - time.monotonic()
+            if self.state == self.OPEN and remaining <= 0:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+        raise SpotifyAPIError(CIRCUIT_OPEN, "Spotify API circuit is open", retry_after=max(remaining, 0.5))
+    
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+    
+    def record_failure(self, error_class, retry_after=None):
+        """Count a failure; only errors that indicate a degraded API trip the breaker."""
+        with self._lock:
+            self._probe_in_flight = False
+            if error_class not in (TRANSIENT, RATE_LIMITED):
+                if self.state == self.HALF_OPEN:
+                    # The API answered, so it is reachable again
+                    self.state = self.CLOSED
+                    self._failures = 0
+                return
+            
+            self._failures += 1
+            # A 429 opens the circuit immediately for as long as the server asked
+            if error_class == RATE_LIMITED or self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                if error_class == RATE_LIMITED and retry_after:
+                    self._open_for = retry_after
+                else:
+                    self._open_for = self.reset_timeout
@@ -0,0 +1,140 @@
+import os
+import logging
+import json
+import time
+import threading
+from collections import OrderedDict
+from .utils import get_application_path, atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+MAX_OFFSET = 1000  # The search endpoint returns nothing past this offset
+
+def normalize_query(query):
+    """Collapse case and whitespace so equivalent queries share a cache entry."""
+    return " ".join(query.lower().split())
+
+def _summarize(track):
+    """Keep only the fields the search results view needs."""
+    return {
+        "id": track["id"],
+        "name": track["name"],
+        "artist": ", ".join(artist["name"] for artist in track["artists"]),
+        "album": track["album"]["name"],
+        "duration_ms": track["duration_ms"]
+    }
+
+class SearchCache:
+    """Disk-backed LRU cache of search result pages with a time-to-live."""
+    
+    def __init__(self, storage_dir="data", ttl=24 * 3600, max_entries=500):
+        """Initialize the cache file under the data directory."""
+        self.cache_path = os.path.join(get_application_path(), storage_dir, "search_cache.json")
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.dirty = False
+        self.entries = self._load()  # "offset:query" -> page, least recently used first
+    
+    def _load(self):
+        entries = OrderedDict()
+        if os.path.exists(self.cache_path):
+            try:
+                with open(self.cache_path, 'r') as f:
+                    # Stored as a list so the LRU order survives the round trip
+                    for key, page in json.load(f):
+                        entries[key] = page
+            except Exception as e:
+                logger.error("Error loading search cache: %s", e)
+        return entries
+    
+    def get(self, query, offset):
+        """Get a cached page, or None if it is missing or expired."""
+        key = f"{offset}:{query}"
+        with self._lock:
+            page = self.entries.get(key)
+            if page is None:
+                return None
+            if time.time() - page["fetched_at"] >= self.ttl:
+                del self.entries[key]
+                self.dirty = True
+                return None
+            self.entries.move_to_end(key)
+            return page
+    
+    def put(self, query, offset, page):
+        """Store a page, evicting the least recently used ones past max_entries."""
+        with self._lock:
+            self.entries[f"{offset}:{query}"] = page
+            self.entries.move_to_end(f"{offset}:{query}")
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.dirty = True
+    
+    def save(self):
+        """Write the cache to disk if it changed, dropping expired entries."""
+        now = time.time()
+        with self._lock:
+            if not self.dirty:
+                return
+            fresh = [(key, page) for key, page in self.entries.items() if now - page["fetched_at"] < self.ttl]
+            try:
+                atomic_write_json(self.cache_path, fresh)
+                self.dirty = False
+            except Exception as e:
+                logger.error("Error saving search cache: %s", e)
+
+class CatalogSearch:
+    """Search the Spotify catalog for tracks, a page at a time."""
+    
+    def __init__(self, player, cache=None, rate_budget=None, page_size=10):
+        """Initialize with a SpotifyPlayer."""
+        self.player = player
+        self.cache = cache or SearchCache()
+        self.rate_budget = rate_budget or player.rate_budget
+        self.page_size = page_size
+    
+    def cached(self, query, page=0):
+        """Get a page of results from the cache only, or None."""
+        query = normalize_query(query)
+        if not query:
+            return None
+        return self.cache.get(query, page * self.page_size)
+    
+    def search(self, query, page=0, wait=True):
+        """Get {'items', 'total', 'offset'} for one page of results.
+        
+        Cached pages cost no request. Otherwise a token is taken from the shared
+        rate budget first; with wait unset, None is returned instead of blocking
+        when the budget is empty. Raises on API errors.
+        """
+        query = normalize_query(query)
+        offset = page * self.page_size
+        if not query or offset >= MAX_OFFSET:
+            return {"items": [], "total": 0, "offset": offset}
+        
+        cached = self.cache.get(query, offset)
+        if cached is not None:
+            return cached
+        
+        if wait:
+            self.rate_budget.acquire()
+        elif not self.rate_budget.try_acquire():
+            return None
+        
+        result = self.player.search_tracks(query, limit=self.page_size, offset=offset)["tracks"]
+        result_page = {
+            "items": [_summarize(track) for track in result["items"] if track],
+            "total": min(result["total"], MAX_OFFSET),
+            "offset": offset,
+            "fetched_at": time.time()
+        }
+        self.cache.put(query, offset, result_page)
+        logger.info("Searched catalog at offset %d: %d results", offset, result_page["total"],
+                    extra={"event": "catalog_search"})
+        return result_page
+    
+    def page_count(self, result_page):
+        """Get the number of pages for the query a result page belongs to."""
+        return max(1, -(-result_page["total"] // self.page_size))
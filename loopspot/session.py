@@ -0,0 +1,47 @@
+import os
+import logging
+import json
+import threading
+from datetime import datetime
+from .utils import get_application_path, atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+class SessionStore:
+    """Persist the current loop session so a restart can resume it."""
+    
+    def __init__(self, storage_dir="data"):
+        """Initialize session storage."""
+        self.storage_dir = get_application_path()
+        self.session_path = os.path.join(self.storage_dir, storage_dir, "session.json")
+        os.makedirs(os.path.dirname(self.session_path), exist_ok=True)
+        self._lock = threading.Lock()
+    
+    def load(self):
+        """Load the last saved session, or None if there is none."""
+        if os.path.exists(self.session_path):
+            try:
+                with open(self.session_path, 'r') as f:
+                    return json.load(f)
+            except Exception as e:
+                logger.error("Error loading session: %s", e)
+        return None
+    
+    def save(self, state, device_id=None):
+        """Save a loop state snapshot together with the selected device."""
+        session = {
+            "track_id": state.track_id,
+            "point_a": state.point_a,
+            "point_b": state.point_b,
+            "loop_name": state.loop_name,
+            "active": state.active,
+            "device_id": device_id,
+            "saved_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+        
+        try:
+            # Writers may run on the engine thread and the UI thread at once
+            with self._lock:
+                atomic_write_json(self.session_path, session, indent=2)
+        except Exception as e:
+            logger.error("Error saving session: %s", e)
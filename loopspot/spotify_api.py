@@ -1,4 +1,81 @@
+import logging
+import json
 import time
+import threading
+from collections import Counter
+from spotipy.exceptions import SpotifyException
+from .rate_limit import RateBudget
+from .resilience import CircuitBreaker, SpotifyAPIError, classify_error, CIRCUIT_OPEN, RATE_LIMITED, UNAUTHORIZED
+
+try:
+    import orjson  # Optional, faster parser for the polling hot path
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+class PollStats:
+    """Running totals of bytes and CPU time spent per playback poll."""
+    
+    def __init__(self):
+        self.polls = 0
+        self.bytes = 0
+        self.cpu_ns = 0
+    
+    def record(self, size, cpu_ns):
+        self.polls += 1
+        self.bytes += size
+        self.cpu_ns += cpu_ns
+    
+    def summary(self):
+        """Get (average bytes, average CPU ms) per poll."""
+        if not self.polls:
+            return 0, 0.0
+        return self.bytes // self.polls, self.cpu_ns / self.polls / 1e6
+
+class DeviceRegistry:
+    """Cache of the user's Spotify Connect devices and the pinned target device."""
+    
+    def __init__(self, fetch_devices, ttl=30.0):
+        """Initialize with a callable returning the devices() response."""
+        self.fetch_devices = fetch_devices
+        self.ttl = ttl
+        self.pinned_device_id = None
+        self._devices = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+    
+    def get_devices(self, force=False):
+        """Get the list of available devices, refreshing the cache when stale."""
+        with self._lock:
+            expired = time.monotonic() - self._fetched_at > self.ttl
+            if force or self._devices is None or expired:
+                response = self.fetch_devices()
+                self._devices = response.get('devices', []) if response else []
+                self._fetched_at = time.monotonic()
+            return self._devices
+    
+    def find(self, device_id):
+        """Get a cached device by ID, or None if it is not online."""
+        for device in self.get_devices():
+            if device['id'] == device_id:
+                return device
+        return None
+    
+    def invalidate(self):
+        """Drop the cached device list so the next lookup refetches it."""
+        with self._lock:
+            self._devices = None
+    
+    def pin(self, device_id):
+        """Send all playback commands to this device (None to unpin)."""
+        self.pinned_device_id = device_id
+    
+    def mark_active(self, device_id):
+        """Record that playback is now on the given device."""
+        with self._lock:
+            for device in self._devices or []:
+                device['is_active'] = device['id'] == device_id
 
 class SpotifyPlayer:
     """Wrapper for Spotify API player functions."""
@@ -6,22 +83,64 @@ class SpotifyPlayer:
     def __init__(self, spotify_client):
         """Initialize with a Spotify client."""
         self.sp = spotify_client
+        self.last_device_id = None  # Device seen in the most recent playback state
+        self.devices = DeviceRegistry(lambda: self._call(lambda: self.sp.devices()))
+        self.account_name = "main"  # Label shown when mirroring to several accounts
+        self.rate_budget = RateBudget()  # Shared by background jobs, not the loop engine
+        self.poll_stats = PollStats()
+        self._last_sample = None  # (poll_state result, monotonic time the server sampled it)
+        self.breaker = CircuitBreaker()
+        self.error_counts = Counter()  # Failed calls per error class
+        self.token_refresher = None  # Callable that swaps in a fresh client; returns success
+    
+    def _call(self, request, retry_auth=True):
+        """Run an API request through the circuit breaker.
         
+        request is a zero-argument callable, so a retry after a token refresh
+        uses the new client. Failures are raised as SpotifyAPIError with their class.
+        """
+        try:
+            self.breaker.before_call()
+        except SpotifyAPIError:
+            self.error_counts[CIRCUIT_OPEN] += 1
+            raise
+        
+        try:
+            result = request()
+        except Exception as e:
+            error_class, retry_after = classify_error(e)
+            self.error_counts[error_class] += 1
+            self.breaker.record_failure(error_class, retry_after)
+            if error_class == RATE_LIMITED:
+                # Background jobs share the budget, so they back off too
+                self.rate_budget.penalize(retry_after or 1)
+            
+            if error_class == UNAUTHORIZED and retry_auth and self.token_refresher and self.token_refresher():
+                return self._call(request, retry_auth=False)
+            raise SpotifyAPIError(error_class, str(e), retry_after) from e
+        
+        self.breaker.record_success()
+        return result
+    
     def get_current_playback(self):
         """Get the current playback state."""
         try:
-            return self.sp.current_playback()
+            playback = self._call(lambda: self.sp.current_playback())
+            device = playback.get('device') if playback else None
+            self.last_device_id = device['id'] if device else None
+            return playback
         except Exception as e:
-            print(f"Error getting playback: {e}")
+            logger.error("Error getting playback: %s", e, extra={"error_class": getattr(e, 'error_class', None)})
             return None
     
     def get_current_track(self):
         """Get information about the currently playing track."""
         try:
+            sent = time.monotonic()
             playback = self.get_current_playback()
             if playback and playback['item']:
                 track = playback['item']
-                return {
+                current = {
                     'id': track['id'],
                     'name': track['name'],
                     'artist': ', '.join([artist['name'] for artist in track['artists']]),
@@ -29,10 +148,74 @@ class SpotifyPlayer:
                     'is_playing': playback['is_playing'],
                     'progress_ms': playback['progress_ms']
                 }
+                self._last_sample = (current, (sent + time.monotonic()) / 2)
+                return current
         except Exception as e:
-            print(f"Error getting track: {e}")
+            logger.error("Error getting track: %s", e)
         return None
     
+    def _get_raw(self, path, params):
+        """GET an API path and return the raw body, bypassing spotipy's JSON handling."""
+        response = self.sp._session.get(
+            self.sp.prefix + path,
+            params=params,
+            headers=self.sp._auth_headers(),
+            proxies=self.sp.proxies,
+            timeout=self.sp.requests_timeout
+        )
+        if response.status_code >= 400:
+            raise SpotifyException(response.status_code, -1, f"{response.url}: {response.text}",
+                                   headers=response.headers)
+        return response.content
+    
+    def poll_state(self):
+        """Lean playback poll for the loop engine.
+        
+        Returns {'id', 'progress_ms', 'is_playing', 'duration_ms'}, or None if nothing
+        is playing. Raises on API errors instead of hiding them.
+        """
+        started = time.thread_time_ns()
+        sent = time.monotonic()
+        # currently-playing omits the device block, and a market drops available_markets
+        body = self._call(lambda: self._get_raw("me/player/currently-playing",
+                                                {"market": "from_token", "additional_types": "track"}))
+        # Assume the server read the position halfway through the request
+        sampled_at = (sent + time.monotonic()) / 2
+        if not body:
+            self.poll_stats.record(0, time.thread_time_ns() - started)
+            self._last_sample = (None, sampled_at)
+            return None
+        
+        playback = orjson.loads(body) if orjson else json.loads(body)
+        item = playback.get('item')
+        state = None
+        if item:
+            state = {
+                'id': item['id'],
+                'progress_ms': playback['progress_ms'],
+                'is_playing': playback['is_playing'],
+                'duration_ms': item['duration_ms']
+            }
+        self.poll_stats.record(len(body), time.thread_time_ns() - started)
+        self._last_sample = (state, sampled_at)
+        return state
+    
+    def sample_playback(self, max_age=0.0):
+        """Get (poll_state result, monotonic time it was sampled).
+        
+        Reuses the last sample if it is at most max_age seconds old, e.g. one taken
+        by the loop engine, and polls otherwise. Raises on API errors.
+        """
+        sample = self._last_sample
+        if sample is None or time.monotonic() - sample[1] > max_age:
+            self.poll_state()
+            sample = self._last_sample
+        return sample
+    
+    def last_sample(self):
+        """Get the newest (playback state, monotonic sample time) seen by any poll, without calling the API."""
+        return self._last_sample
+    
     def get_playback_position(self):
         """Get the current playback position in milliseconds."""
         try:
@@ -40,30 +223,80 @@ class SpotifyPlayer:
             if playback:
                 return playback['progress_ms']
         except Exception as e:
-            print(f"Error getting position: {e}")
+            logger.error("Error getting position: %s", e)
         return None
     
+    def _ensure_device_active(self, device_id):
+        """Transfer playback to the pinned device if it has gone idle."""
+        if self.last_device_id == device_id:
+            return
+        
+        device = self.devices.find(device_id)
+        if device is None:
+            logger.warning("Pinned device is not online.", extra={"event": "device_offline", "device_id": device_id})
+            return
+        
+        if not device['is_active']:
+            self._call(lambda: self.sp.transfer_playback(device_id, force_play=False))
+            self.devices.mark_active(device_id)
+        self.last_device_id = device_id
+    
+    def _control(self, method, *args, **kwargs):
+        """Run a playback control method of the client against the pinned device, if any."""
+        device_id = self.devices.pinned_device_id
+        try:
+            if device_id:
+                self._ensure_device_active(device_id)
+                kwargs['device_id'] = device_id
+            return self._call(lambda: getattr(self.sp, method)(*args, **kwargs))
+        except SpotifyAPIError as e:
+            # The device list is probably stale; refetch on the next command.
+            # Not while the API is throttling us, though: that would only add calls.
+            if e.error_class not in (CIRCUIT_OPEN, RATE_LIMITED):
+                self.devices.invalidate()
+                self.last_device_id = None
+            raise
+    
     def seek_to_position(self, position_ms):
         """Seek to a specific position in the current track."""
         try:
-            self.sp.seek_track(position_ms)
+            self._control("seek_track", position_ms)
             return True
         except Exception as e:
-            print(f"Error seeking: {e}")
+            logger.error("Error seeking: %s", e, extra={"event": "seek_failed", "position_ms": position_ms,
+                                                        "error_class": getattr(e, 'error_class', None)})
             return False
     
-    def format_time(self, milliseconds):
-        """Format milliseconds as mm:ss."""
+    def format_time(self, milliseconds, precise=False):
+        """Format milliseconds as mm:ss, or mm:ss.mmm when precise is set."""
         if milliseconds is None:
-            return "00:00"
+            return "00:00.000" if precise else "00:00"
         
-        seconds = milliseconds // 1000
+        seconds, millis = divmod(int(milliseconds), 1000)
         minutes, seconds = divmod(seconds, 60)
+        if precise:
+            return f"{minutes:02d}:{seconds:02d}.{millis:03d}"
         return f"{minutes:02d}:{seconds:02d}"
     
-    def get_pretty_playback_status(self):
-        """Get a formatted string with current playback information."""
-        track = self.get_current_track()
+    def get_tracks(self, track_ids):
+        """Get full track objects for up to 50 IDs; raises on API errors."""
+        return self._call(lambda: self.sp.tracks(track_ids, market="from_token"))
+    
+    def search_tracks(self, query, limit=10, offset=0):
+        """Search the catalog for tracks playable in the user's market; raises on API errors."""
+        return self._call(lambda: self.sp.search(q=query, limit=limit, offset=offset, type="track",
+                                                 market="from_token"))
+    
+    def get_audio_analysis(self, track_id):
+        """Get the audio analysis for a track; raises if it is unavailable."""
+        return self._call(lambda: self.sp.audio_analysis(track_id))
+    
+    def get_pretty_playback_status(self, track=None):
+        """Get a formatted string with current playback information.
+        
+        Uses the given get_current_track() result, or fetches one.
+        """
+        track = track or self.get_current_track()
         
         if not track:
             return "No track is currently playing."
@@ -74,15 +307,15 @@ class SpotifyPlayer:
         
         return f"{status}: {track['name']} - {track['artist']} [{progress}/{duration}]"
     
-    def play_track(self, track_uri):
-        """Play a specific track."""
+    def play_track(self, track_uri, position_ms=None):
+        """Play a specific track, optionally starting at a position."""
         try:
-            self.sp.start_playback(uris=[f"spotify:track:{track_uri}"])
+            self._control("start_playback", uris=[f"spotify:track:{track_uri}"], position_ms=position_ms)
             # Wait a short time for playback to start
             time.sleep(0.5)
             return True
         except Exception as e:
-            print(f"Error playing track: {e}")
+            logger.error("Error playing track: %s", e, extra={"track_id": track_uri})
             return False
     
     def resume_playback(self):
@@ -90,11 +323,11 @@ class SpotifyPlayer:
         try:
             playback = self.get_current_playback()
             if playback and not playback['is_playing']:
-                self.sp.start_playback()
+                self._control("start_playback")
                 return True
             return False  # Already playing
         except Exception as e:
-            print(f"Error resuming: {e}")
+            logger.error("Error resuming: %s", e)
             return False
             
     def seek_to_position_and_play(self, position_ms):
@@ -109,5 +342,5 @@ class SpotifyPlayer:
             self.resume_playback()
             return True
         except Exception as e:
-            print(f"Error seeking and playing: {e}")
+            logger.error("Error seeking and playing: %s", e)
             return False 
\ No newline at end of file
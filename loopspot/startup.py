@@ -0,0 +1,56 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+class StartupPipeline:
+    """Run startup stages concurrently, each starting as soon as its dependencies are done.
+    
+    Stages are added in dependency order; a stage's function receives the results
+    of its dependencies as arguments. Start and end times are recorded per stage.
+    """
+    
+    def __init__(self, max_workers=4):
+        """Initialize the thread pool and the clock all timings are relative to."""
+        self.started = time.perf_counter()
+        self.timings = {}  # stage name -> (start ms, end ms)
+        self._futures = {}
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="startup")
+    
+    def _elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+    
+    def add(self, name, fn, deps=()):
+        """Schedule a stage that runs fn(*dependency results) once its dependencies are done."""
+        dep_futures = [self._futures[dep] for dep in deps]
+        
+        def run():
+            args = [future.result() for future in dep_futures]
+            start = self._elapsed_ms()
+            try:
+                return fn(*args)
+            finally:
+                self.timings[name] = (start, self._elapsed_ms())
+        
+        self._futures[name] = self._pool.submit(run)
+    
+    def result(self, name):
+        """Wait for a stage and get its result; re-raises the stage's exception."""
+        return self._futures[name].result()
+    
+    def mark(self, name):
+        """Record a point in time, such as the first frame being drawn."""
+        now = self._elapsed_ms()
+        self.timings[name] = (now, now)
+    
+    def shutdown(self):
+        """Release the worker threads once every stage has finished."""
+        self._pool.shutdown(wait=False)
+    
+    def format_timings(self):
+        """Get the recorded timings as printable lines, in start order."""
+        lines = ["Startup timings (ms):"]
+        for name, (start, end) in sorted(self.timings.items(), key=lambda item: item[1]):
+            if start == end:
+                lines.append(f"  {name:<14} {'':>8}   at {end:8.1f}")
+            else:
+                lines.append(f"  {name:<14} {start:8.1f} -> {end:8.1f}  ({end - start:.1f})")
+        return lines
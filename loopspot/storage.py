@@ -1,8 +1,25 @@
 import os
+import logging
 import json
 import sys
+import time
+import uuid
+import heapq
+import itertools
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-from .utils import get_application_path
+from .utils import get_application_path, atomic_write_json, file_lock
+from .sync import SyncState, version_node
+
+logger = logging.getLogger(__name__)
+
+# Usage statistics are per machine: they are not versioned, so using a loop
+# creates no sync traffic, and a synced edit keeps the local values
+LOCAL_FIELDS = ("last_used", "use_count")
+
+class StorageError(Exception):
+    """The library file exists but could not be read."""
 
 class LoopStorage:
     """Handle storage of loop points."""
@@ -11,51 +28,272 @@ class LoopStorage:
         """Initialize storage."""
         self.storage_dir = get_application_path()
         self.storage_path = os.path.join(self.storage_dir, storage_dir, "loop_points.json")
+        self.lock_path = self.storage_path + ".lock"
         os.makedirs(os.path.dirname(self.storage_path), exist_ok=True)
+        self._lock = threading.RLock()  # Guards self.loops within this process
+        self._signature = None  # (mtime_ns, size) of the file as last read or written
+        self.change_listeners = []  # Called with the set of track IDs changed on disk
+        self.revision = 0  # Bumped on every write or reload, so caches can tell they are stale
+        self._watch_thread = None
+        self._transaction_depth = 0  # Nested transactions join the outermost one
+        self.sync_state = SyncState(os.path.join(os.path.dirname(self.storage_path), "sync_state.json"))
         self.loops = self._load_loops()
+        self._assign_missing_ids()
+    
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.storage_path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            return None
+    
+    def _read_loops(self):
+        """Read the storage file; returns (loops, signature). Raises StorageError if it cannot be read."""
+        signature = self._file_signature()
+        if signature is None:
+            return {}, None
+        try:
+            with open(self.storage_path, 'r') as f:
+                return json.load(f), signature
+        except Exception as e:
+            raise StorageError(f"Error loading loops: {e}") from e
     
     def _load_loops(self):
         """Load loops from storage file."""
-        if os.path.exists(self.storage_path):
-            try:
-                with open(self.storage_path, 'r') as f:
-                    return json.load(f)
-            except Exception as e:
-                print(f"Error loading loops: {e}")
-                return {}
-        return {}
+        try:
+            loops, self._signature = self._read_loops()
+        except StorageError as e:
+            # The signature stays unset, so writes retry the read instead of replacing the file
+            logger.error("%s", e)
+            return {}
+        return loops
     
     def _save_loops(self):
         """Save loops to storage file."""
         try:
-            with open(self.storage_path, 'w') as f:
-                json.dump(self.loops, f, indent=2)
+            # Replace the file atomically so other processes never read a partial write
+            atomic_write_json(self.storage_path, self.loops, indent=2)
+            self._signature = self._file_signature()
         except Exception as e:
-            print(f"Error saving loops: {e}")
+            logger.error("Error saving loops: %s", e)
+    
+    def _reload_changed(self, strict=False):
+        """Reload the file if another process changed it, replacing only tracks that differ.
+        
+        Returns the set of changed track IDs. If the file cannot be read, the loops
+        in memory are kept; with strict set, StorageError is raised instead.
+        """
+        signature = self._file_signature()
+        if signature is None or signature == self._signature:
+            return set()
+        
+        try:
+            fresh, signature = self._read_loops()
+        except StorageError as e:
+            if strict:
+                raise
+            logger.warning("%s; keeping the loops in memory", e)
+            return set()
+        self._signature = signature
+        changed = {track_id for track_id in self.loops.keys() | fresh.keys()
+                   if self.loops.get(track_id) != fresh.get(track_id)}
+        for track_id in changed:
+            if track_id in fresh:
+                self.loops[track_id] = fresh[track_id]
+            else:
+                del self.loops[track_id]
+        return changed
+    
+    @contextmanager
+    def _transaction(self):
+        """Read-modify-write under the file lock, starting from the latest file contents.
+        
+        A transaction opened inside another one joins it, so the file is written
+        once when the outermost transaction ends.
+        """
+        with self._lock:
+            if self._transaction_depth:
+                self._transaction_depth += 1
+                try:
+                    yield
+                finally:
+                    self._transaction_depth -= 1
+                return
+            
+            with file_lock(self.lock_path):
+                # Writing on top of a file that could not be read would lose the library
+                changed = self._reload_changed(strict=True)
+                self.sync_state.reload_if_changed()
+                self._transaction_depth = 1
+                try:
+                    yield
+                finally:
+                    self._transaction_depth = 0
+                self._save_loops()
+                self.sync_state.save()
+                self.revision += 1
+            self._notify(changed)
+    
+    def bulk(self):
+        """Group many writes into one transaction that saves the file once at the end.
+        
+        Other processes wait on the file lock until the block is done.
+        """
+        return self._transaction()
+    
+    def _notify(self, changed):
+        if changed:
+            for listener in self.change_listeners:
+                listener(changed)
+    
+    def _new_loop_id(self):
+        return uuid.uuid4().hex
+    
+    def _stamp(self, loop):
+        """Give a loop a new sync version after a local change."""
+        loop["version"] = self.sync_state.clock.tick()
+    
+    def _assign_missing_ids(self):
+        """Give loops saved by older versions a stable ID and sync version so writers can merge by ID."""
+        if all("id" in loop and "version" in loop for loops in self.loops.values() for loop in loops):
+            return
+        with self._transaction():
+            for loops in self.loops.values():
+                for loop in loops:
+                    loop.setdefault("id", self._new_loop_id())
+                    if "version" not in loop:
+                        self._stamp(loop)
+    
+    def _find_index(self, track_id, loop_id):
+        for index, loop in enumerate(self.loops.get(track_id, [])):
+            if loop.get("id") == loop_id:
+                return index
+        return None
+    
+    def refresh(self):
+        """Pick up changes written by other processes; returns the changed track IDs."""
+        with self._lock:
+            changed = self._reload_changed()
+            if changed:
+                self.revision += 1
+        self._notify(changed)
+        return changed
+    
+    def start_watching(self, interval=0.5):
+        """Poll the file for external changes on a background thread."""
+        if self._watch_thread and self._watch_thread.is_alive():
+            return
+        
+        def watch():
+            while True:
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logger.error("Error reloading loops: %s", e)
+                time.sleep(interval)
+        
+        self._watch_thread = threading.Thread(target=watch, daemon=True)
+        self._watch_thread.start()
     
     def save_loop(self, track_id, track_name, artist, point_a, point_b, name=None):
         """Save a loop for a track."""
-        if track_id not in self.loops:
-            self.loops[track_id] = []
+        with self._transaction():
+            if track_id not in self.loops:
+                self.loops[track_id] = []
+            
+            # Create a new loop entry
+            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            loop_name = name or f"Loop {len(self.loops[track_id]) + 1}"
+            
+            loop = {
+                "id": self._new_loop_id(),
+                "name": loop_name,
+                "track_name": track_name,
+                "artist": artist,
+                "point_a": point_a,
+                "point_b": point_b,
+                "created": timestamp,
+                "last_used": timestamp
+            }
+            self._stamp(loop)
+            
+            # Add the loop to the list
+            self.loops[track_id].append(loop)
+        return loop
+    
+    def add_loops(self, records):
+        """Add a batch of loop records (each with a track_id) with a single write."""
+        if not records:
+            return 0
         
-        # Create a new loop entry
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        loop_name = name or f"Loop {len(self.loops[track_id]) + 1}"
+        with self._transaction():
+            for record in records:
+                loop = dict(record)
+                track_id = loop.pop("track_id")
+                loop.setdefault("id", self._new_loop_id())
+                self._stamp(loop)
+                self.loops.setdefault(track_id, []).append(loop)
+        return len(records)
+    
+    def apply_track_metadata(self, metadata, repair=False):
+        """Refresh names from {track_id: metadata} and flag or repair loops that no longer fit.
         
-        loop = {
-            "name": loop_name,
-            "track_name": track_name,
-            "artist": artist,
-            "point_a": point_a,
-            "point_b": point_b,
-            "created": timestamp,
-            "last_used": timestamp
-        }
+        Metadata is None for tracks that were removed from the catalog. With repair,
+        point B is clamped to the track duration and relinked tracks are moved to
+        their new ID. Returns a report dict.
+        """
+        report = {"renamed": 0, "relinked": 0, "repaired": 0, "flagged": []}
         
-        # Add the loop to the list
-        self.loops[track_id].append(loop)
-        self._save_loops()
-        return loop
+        with self._transaction():
+            involved = [track_id for track_id in metadata if track_id in self.loops]
+            before = {loop["id"]: (track_id, dict(loop)) for track_id in involved for loop in self.loops[track_id]}
+            self._apply_track_metadata(metadata, repair, report)
+            
+            # Stamp loops that changed, including ones moved to a relinked track ID
+            targets = set(involved) | {metadata[track_id]["id"] for track_id in involved if metadata[track_id]}
+            for track_id in targets:
+                for loop in self.loops.get(track_id, []):
+                    previous = before.get(loop["id"])
+                    if previous and previous != (track_id, loop):
+                        self._stamp(loop)
+        return report
+    
+    def _apply_track_metadata(self, metadata, repair, report):
+        for track_id, track in metadata.items():
+            loops = self.loops.get(track_id)
+            if not loops:
+                continue
+            
+            if track is None or not track["is_playable"]:
+                for loop in loops:
+                    loop["issue"] = "unavailable"
+                    report["flagged"].append((loop["track_name"], loop["name"], "unavailable"))
+                continue
+            
+            for loop in loops:
+                if loop["track_name"] != track["name"] or loop["artist"] != track["artist"]:
+                    loop["track_name"] = track["name"]
+                    loop["artist"] = track["artist"]
+                    report["renamed"] += 1
+                
+                loop.pop("issue", None)
+                if loop["point_b"] > track["duration_ms"]:
+                    if repair and loop["point_a"] < track["duration_ms"]:
+                        loop["point_b"] = track["duration_ms"]
+                        report["repaired"] += 1
+                    else:
+                        loop["issue"] = "outside_duration"
+                        report["flagged"].append((loop["track_name"], loop["name"], "outside_duration"))
+            
+            # Relinked tracks play under a different ID, which the looper compares against
+            if track["id"] != track_id:
+                if repair:
+                    self.loops.setdefault(track["id"], []).extend(self.loops.pop(track_id))
+                    report["relinked"] += len(loops)
+                else:
+                    for loop in loops:
+                        loop.setdefault("issue", "relinked")
+                        report["flagged"].append((loop["track_name"], loop["name"], "relinked"))
     
     def get_loops_for_track(self, track_id):
         """Get all loops for a track."""
@@ -71,7 +309,16 @@ class LoopStorage:
     def update_loop(self, track_id, loop_index, point_a=None, point_b=None, name=None):
         """Update an existing loop."""
         loop = self.get_loop(track_id, loop_index)
-        if loop:
+        if not loop:
+            return False
+        
+        with self._transaction():
+            # Another process may have reordered the list; find the loop by ID
+            index = self._find_index(track_id, loop["id"])
+            if index is None:
+                return False
+            loop = self.loops[track_id][index]
+            
             if point_a is not None:
                 loop["point_a"] = point_a
             if point_b is not None:
@@ -80,30 +327,159 @@ class LoopStorage:
                 loop["name"] = name
             
             loop["last_used"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            self._save_loops()
-            return True
-        return False
+            self._stamp(loop)
+        return True
+    
+    def mark_used(self, track_id, loop_id):
+        """Update last_used and the use count of a loop; returns the updated loop."""
+        with self._transaction():
+            index = self._find_index(track_id, loop_id)
+            if index is None:
+                return None
+            loop = self.loops[track_id][index]
+            loop["last_used"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            loop["use_count"] = loop.get("use_count", 0) + 1
+        return loop
+    
+    def find_loop(self, track_id, loop_id):
+        """Get a loop by its stable ID, or None if it no longer exists."""
+        index = self._find_index(track_id, loop_id)
+        if index is None:
+            return None
+        return self.loops[track_id][index]
     
     def delete_loop(self, track_id, loop_index):
         """Delete a loop."""
-        loops = self.get_loops_for_track(track_id)
-        if 0 <= loop_index < len(loops):
-            loops.pop(loop_index)
-            self._save_loops()
-            return True
-        return False
+        loop = self.get_loop(track_id, loop_index)
+        if not loop:
+            return False
+        
+        with self._transaction():
+            index = self._find_index(track_id, loop["id"])
+            if index is None:
+                return False
+            self.loops[track_id].pop(index)
+            # Remember the delete so sync can pass it on instead of resurrecting the loop
+            self.sync_state.add_tombstone(loop["id"], track_id, self.sync_state.clock.tick())
+        return True
+    
+    def _track_entry(self, track_id, loops):
+        return {
+            "track_id": track_id,
+            "track_name": loops[0]["track_name"],
+            "artist": loops[0]["artist"],
+            "loops": loops
+        }
+    
+    def count_tracks(self, exclude=None):
+        """Count tracks that have loops, optionally leaving one track out."""
+        with self._lock:
+            return sum(1 for track_id, loops in self.loops.items() if loops and track_id != exclude)
+    
+    def iter_tracks(self, offset=0, limit=None, order_by=None, exclude=None):
+        """Iterate over one page of tracks that have loops, grouped like get_all_loops.
+        
+        order_by is None (insertion order), "recent" (most recently used first) or
+        "name". Only offset + limit sort keys are kept, so paging through a large
+        library never copies it.
+        """
+        with self._lock:
+            items = ((track_id, loops) for track_id, loops in self.loops.items() if loops and track_id != exclude)
+            end = None if limit is None else offset + limit
+            
+            if order_by == "recent":
+                # Timestamps are "%Y-%m-%d %H:%M:%S" strings, so they sort chronologically
+                key = lambda item: max(loop.get("last_used", "") for loop in item[1])
+                ordered = heapq.nlargest(end, items, key=key) if end is not None else sorted(items, key=key, reverse=True)
+            elif order_by == "name":
+                key = lambda item: (item[1][0]["track_name"].lower(), item[1][0]["artist"].lower())
+                ordered = heapq.nsmallest(end, items, key=key) if end is not None else sorted(items, key=key)
+            elif order_by is None:
+                ordered = items
+            else:
+                raise ValueError(f"unknown order: {order_by!r}")
+            
+            page = [self._track_entry(track_id, loops) for track_id, loops in itertools.islice(ordered, offset, end)]
+        yield from page
     
     def get_all_loops(self):
         """Get all loops, grouped by track."""
-        result = []
-        for track_id, loops in self.loops.items():
-            if loops:  # Only add tracks that have loops
-                track_name = loops[0]["track_name"]
-                artist = loops[0]["artist"]
-                result.append({
-                    "track_id": track_id,
-                    "track_name": track_name,
-                    "artist": artist,
-                    "loops": loops
-                })
-        return result 
\ No newline at end of file
+        return list(self.iter_tracks())
+    
+    def sync_peer(self, url):
+        """Get the {"cursor", "pushed"} position of this library at a sync server."""
+        with self._lock:
+            self.sync_state.reload_if_changed()
+            return dict(self.sync_state.peers.get(url, {"cursor": 0, "pushed": ""}))
+    
+    def set_sync_peer(self, url, cursor, pushed):
+        """Record how far this library is synced with a server."""
+        with self._lock:
+            with file_lock(self.lock_path):
+                self.sync_state.reload_if_changed()
+                self.sync_state.peers[url] = {"cursor": cursor, "pushed": pushed}
+                self.sync_state.dirty = True
+                self.sync_state.save()
+    
+    def local_changes(self, since):
+        """Get sync records for loops and deletes made on this machine after version since."""
+        self.refresh()
+        node_id = self.sync_state.node_id
+        changes = []
+        with self._lock:
+            for track_id, loops in self.loops.items():
+                for loop in loops:
+                    version = loop.get("version", "")
+                    if version > since and version_node(version) == node_id:
+                        record = {key: value for key, value in loop.items() if key != "version"}
+                        changes.append({"id": loop["id"], "track_id": track_id, "version": version, "loop": record})
+            for loop_id, tombstone in self.sync_state.tombstones.items():
+                version = tombstone["version"]
+                if version > since and version_node(version) == node_id:
+                    changes.append({"id": loop_id, "track_id": tombstone["track_id"], "version": version, "deleted": True})
+        return changes
+    
+    def apply_remote_changes(self, records):
+        """Merge records from a sync server, keeping whichever version is newer.
+        
+        Returns the number of records that changed the library.
+        """
+        if not records:
+            return 0
+        
+        applied = 0
+        with self._transaction():
+            location = {loop["id"]: track_id for track_id, loops in self.loops.items() for loop in loops}
+            for record in records:
+                self.sync_state.clock.observe(record["version"])
+                loop_id = record["id"]
+                track_id = location.get(loop_id)
+                index = self._find_index(track_id, loop_id) if track_id else None
+                if index is not None:
+                    local_version = self.loops[track_id][index].get("version", "")
+                else:
+                    local_version = self.sync_state.tombstones.get(loop_id, {}).get("version", "")
+                if record["version"] <= local_version:
+                    continue
+                
+                if record.get("deleted"):
+                    if index is not None:
+                        self.loops[track_id].pop(index)
+                        del location[loop_id]
+                    self.sync_state.add_tombstone(loop_id, record["track_id"], record["version"])
+                else:
+                    loop = dict(record["loop"], version=record["version"])
+                    if index is not None:
+                        local = self.loops[track_id][index]
+                        loop.update((key, local[key]) for key in LOCAL_FIELDS if key in local)
+                    if index is not None and track_id == record["track_id"]:
+                        self.loops[track_id][index] = loop
+                    else:
+                        if index is not None:
+                            self.loops[track_id].pop(index)
+                        self.loops.setdefault(record["track_id"], []).append(loop)
+                        location[loop_id] = record["track_id"]
+                    self.sync_state.remove_tombstone(loop_id)
+                applied += 1
+            self.sync_state.dirty = True  # The clock moved past the remote versions
+        return applied
\ No newline at end of file
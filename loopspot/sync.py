@@ -0,0 +1,251 @@
+import os
+import logging
+import json
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import requests
+from .utils import get_application_path, atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8765
+
+def version_node(version):
+    """Get the node ID a version was stamped by."""
+    return version.rsplit(".", 1)[1]
+
+class HybridClock:
+    """Hybrid logical clock that stamps loop versions.
+    
+    Versions are "<wall ms>.<counter>.<node>" with fixed-width numbers, so they
+    compare correctly as plain strings and the node ID breaks ties between
+    machines deterministically.
+    """
+    
+    def __init__(self, node_id, last=None):
+        """Initialize the clock, continuing after the last version it issued."""
+        self.node_id = node_id
+        self.physical = 0
+        self.counter = 0
+        self._lock = threading.Lock()
+        if last:
+            self.observe(last)
+    
+    def tick(self):
+        """Get a new version, greater than every version issued or observed so far."""
+        with self._lock:
+            now = int(time.time() * 1000)
+            if now > self.physical:
+                self.physical, self.counter = now, 0
+            else:
+                self.counter += 1
+            return self.last()
+    
+    def observe(self, version):
+        """Move the clock past a version received from another node."""
+        physical, counter, _ = version.split(".")
+        with self._lock:
+            if (int(physical), int(counter)) > (self.physical, self.counter):
+                self.physical, self.counter = int(physical), int(counter)
+    
+    def last(self):
+        return f"{self.physical:013d}.{self.counter:06d}.{self.node_id}"
+
+class SyncState:
+    """Per-library sync bookkeeping: node ID, clock, tombstones and peer cursors.
+    
+    Kept in sync_state.json next to loop_points.json, so the library file keeps
+    its format. LoopStorage reads and writes it under its own file lock.
+    """
+    
+    def __init__(self, path):
+        """Load the state, creating a node ID for a library that never had one."""
+        self.path = path
+        self._signature = None
+        self.dirty = False
+        self._load()
+    
+    def _load(self):
+        state = {}
+        if os.path.exists(self.path):
+            try:
+                stat = os.stat(self.path)
+                with open(self.path, 'r') as f:
+                    state = json.load(f)
+                self._signature = (stat.st_mtime_ns, stat.st_size)
+            except Exception as e:
+                logger.error("Error loading sync state: %s", e)
+        
+        self.node_id = state.get("node_id") or uuid.uuid4().hex[:8]
+        self.clock = HybridClock(self.node_id, state.get("clock"))
+        self.tombstones = state.get("tombstones", {})  # loop ID -> {"track_id", "version"}
+        self.peers = state.get("peers", {})  # server URL -> {"cursor", "pushed"}
+        self.dirty = "node_id" not in state
+    
+    def reload_if_changed(self):
+        """Pick up tombstones and cursors written by another process."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if (stat.st_mtime_ns, stat.st_size) != self._signature:
+            clock = self.clock.last()
+            self._load()
+            self.clock.observe(clock)
+    
+    def save(self):
+        """Write the state if anything changed since it was loaded."""
+        if not self.dirty:
+            return
+        state = {
+            "node_id": self.node_id,
+            "clock": self.clock.last(),
+            "tombstones": self.tombstones,
+            "peers": self.peers
+        }
+        try:
+            atomic_write_json(self.path, state, indent=2)
+            stat = os.stat(self.path)
+            self._signature = (stat.st_mtime_ns, stat.st_size)
+            self.dirty = False
+        except Exception as e:
+            logger.error("Error saving sync state: %s", e)
+    
+    def add_tombstone(self, loop_id, track_id, version):
+        self.tombstones[loop_id] = {"track_id": track_id, "version": version}
+        self.dirty = True
+    
+    def remove_tombstone(self, loop_id):
+        if self.tombstones.pop(loop_id, None):
+            self.dirty = True
+
+class SyncHub:
+    """Server side of sync: the newest version of every loop, ordered by change sequence.
+    
+    Every accepted change gets the next sequence number, so a client that
+    remembers the last number it saw only receives what changed after it.
+    """
+    
+    def __init__(self, storage_dir="data"):
+        """Load the hub file from the data directory."""
+        self.path = os.path.join(get_application_path(), storage_dir, "sync_hub.json")
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self.seq = 0
+        self.records = OrderedDict()  # loop ID -> record, in ascending seq order
+        
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                hub = json.load(f)
+            self.seq = hub["seq"]
+            self.records = OrderedDict((record["id"], record) for record in hub["records"])
+    
+    def _save(self):
+        atomic_write_json(self.path, {"seq": self.seq, "records": list(self.records.values())})
+    
+    def exchange(self, cursor, changes):
+        """Apply a client's changes and get (new cursor, records changed since its cursor).
+        
+        A change only wins if its version is newer than the hub's copy, so every
+        node converges on the same last-writer-wins result.
+        """
+        with self._lock:
+            accepted = set()
+            for change in changes:
+                current = self.records.get(change["id"])
+                if current is None or change["version"] > current["version"]:
+                    self.seq += 1
+                    self.records[change["id"]] = dict(change, seq=self.seq)
+                    self.records.move_to_end(change["id"])
+                    accepted.add(change["id"])
+            if accepted:
+                self._save()
+            
+            # Walk back from the newest change; only the delta is touched
+            outgoing = []
+            for record in reversed(self.records.values()):
+                if record["seq"] <= cursor:
+                    break
+                if record["id"] not in accepted:
+                    outgoing.append(record)
+            outgoing.reverse()
+            return self.seq, outgoing
+
+class SyncRequestHandler(BaseHTTPRequestHandler):
+    """Handle POST /sync requests for a SyncServer."""
+    
+    def do_POST(self):
+        if self.path != "/sync":
+            self.send_error(404)
+            return
+        if self.server.token and self.headers.get("Authorization") != f"Bearer {self.server.token}":
+            self.send_error(401)
+            return
+        
+        try:
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            cursor, changes = self.server.hub.exchange(request.get("cursor", 0), request.get("changes", []))
+        except (ValueError, KeyError, TypeError) as e:
+            self.send_error(400, str(e))
+            return
+        
+        body = json.dumps({"cursor": cursor, "changes": changes}, separators=(",", ":")).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        logger.info("Sync from %s: %d in, %d out", self.client_address[0], len(request.get("changes", [])),
+                    len(changes), extra={"event": "sync_served"})
+    
+    def log_message(self, format, *args):
+        """Suppress server logs."""
+        return
+
+class SyncServer(ThreadingHTTPServer):
+    """Small HTTP sync server; bind to 127.0.0.1 for a local hub or 0.0.0.0 for a LAN."""
+    
+    daemon_threads = True
+    
+    def __init__(self, hub, host="127.0.0.1", port=DEFAULT_PORT, token=None):
+        """Initialize the server around a SyncHub."""
+        super().__init__((host, port), SyncRequestHandler)
+        self.hub = hub
+        self.token = token
+
+class SyncClient:
+    """Exchange library changes with a sync server."""
+    
+    def __init__(self, storage, url, token=None, timeout=30):
+        """Initialize with a LoopStorage and the server URL."""
+        self.storage = storage
+        self.url = url.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+    
+    def sync(self):
+        """Push local changes, pull remote ones and merge them; returns transfer stats."""
+        peer = self.storage.sync_peer(self.url)
+        changes = self.storage.local_changes(peer["pushed"])
+        body = json.dumps({"cursor": peer["cursor"], "changes": changes}, separators=(",", ":")).encode()
+        
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        response = requests.post(self.url + "/sync", data=body, headers=headers, timeout=self.timeout)
+        response.raise_for_status()
+        reply = response.json()
+        
+        applied = self.storage.apply_remote_changes(reply["changes"])
+        pushed = max([peer["pushed"]] + [change["version"] for change in changes])
+        self.storage.set_sync_peer(self.url, cursor=reply["cursor"], pushed=pushed)
+        return {
+            "pushed": len(changes),
+            "pulled": len(reply["changes"]),
+            "applied": applied,
+            "bytes_sent": len(body),
+            "bytes_received": len(response.content)
+        }
@@ -0,0 +1,96 @@
+import sys
+import time
+import threading
+
+BAR_WIDTH = 24
+
+# ANSI sequences: save the cursor, go up one line to the start, clear it, restore the cursor
+SAVE_CURSOR = "\0337"
+RESTORE_CURSOR = "\0338"
+LINE_ABOVE = "\033[1A\r"
+CLEAR_LINE = "\033[K"
+
+def extrapolate(sample, now):
+    """Get the playback position at monotonic time now from a (state, sample time) pair."""
+    state, sampled_at = sample
+    position = state['progress_ms']
+    if state['is_playing']:
+        position += (now - sampled_at) * 1000
+    return min(position, state['duration_ms'])
+
+def progress_bar(position, start, end, width=BAR_WIDTH):
+    """Draw how far position is between start and end."""
+    fraction = (position - start) / (end - start) if end > start else 0
+    filled = int(max(0.0, min(fraction, 1.0)) * width)
+    return "█" * filled + "░" * (width - filled)
+
+def format_ticker(sample, loop_state, format_time, now=None):
+    """Build the live status line from the last playback sample and loop state.
+    
+    Inside an active loop the extrapolated position wraps from B back to A, as
+    the engine will jump there, so the line keeps moving between polls.
+    """
+    if not sample or not sample[0]:
+        return "No track is currently playing."
+    
+    state = sample[0]
+    position = extrapolate(sample, time.monotonic() if now is None else now)
+    looping = (loop_state.active and loop_state.track_id == state['id']
+               and loop_state.point_a is not None and loop_state.point_b is not None)
+    if looping and state['is_playing'] and position >= loop_state.point_b > loop_state.point_a:
+        position = loop_state.point_a + (position - loop_state.point_a) % (loop_state.point_b - loop_state.point_a)
+    
+    icon = "▶" if state['is_playing'] else "⏸"
+    # Tenths of a second are enough to look continuous
+    line = f"{icon} {format_time(position, precise=True)[:-2]} / {format_time(state['duration_ms'])}"
+    if not looping:
+        return f"{line}  [{progress_bar(position, 0, state['duration_ms'])}]"
+    
+    bar = progress_bar(position, loop_state.point_a, loop_state.point_b)
+    line += f"  A {format_time(loop_state.point_a)} [{bar}] {format_time(loop_state.point_b)} B"
+    if state['is_playing']:
+        line += f"  jump in {max(0.0, (loop_state.point_b - position) / 1000):.1f}s"
+    return line
+
+class LiveTicker:
+    """Redraw the line above the cursor in place, several times a second.
+    
+    Used while the menu waits for input. Only the output lock is shared with
+    other writers; whoever redraws the whole screen holds it meanwhile.
+    """
+    
+    def __init__(self, render, interval=0.1, stream=None):
+        """Initialize with a callable that returns the line to show."""
+        self.render = render
+        self.interval = interval
+        self.stream = stream  # Default: sys.stdout at the time of writing
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        """Start redrawing, unless output is not a terminal."""
+        if not (self.stream or sys.stdout).isatty() or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="loopspot-ticker")
+        self._thread.daemon = True
+        self._thread.start()
+    
+    def stop(self):
+        """Stop redrawing and wait for the last frame to finish."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                line = self.render()
+            except Exception:
+                continue  # A half-updated state is simply skipped; the next frame catches up
+            stream = self.stream or sys.stdout
+            with self.lock:
+                stream.write(SAVE_CURSOR + LINE_ABOVE + line + CLEAR_LINE + RESTORE_CURSOR)
+                stream.flush()
@@ -1,5 +1,14 @@
 import os
 import sys
+import json
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
 def get_application_path():
     """Get the correct application base path whether running from source or frozen executable."""
@@ -12,4 +21,73 @@ def get_application_path():
         return base_dir
     else:
         # Running as a normal Python script
-        return os.path.dirname(os.path.dirname(os.path.abspath(__file__))) 
\ No newline at end of file
+        return os.path.dirname(os.path.dirname(os.path.abspath(__file__))) 
+
+def atomic_write_json(path, data, **dump_kwargs):
+    """Write JSON to path atomically so a crash never leaves a partial file."""
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, **dump_kwargs)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+@contextmanager
+def file_lock(lock_path):
+    """Hold an exclusive advisory lock on lock_path, shared with other LoopSpot processes."""
+    with open(lock_path, 'a+') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+def try_lock_file(lock_path):
+    """Take an exclusive lock without blocking; returns the open lock file, or None if it is held.
+    
+    The lock is released when the returned file is closed or the process exits.
+    """
+    lock_file = open(lock_path, 'a+')
+    try:
+        if fcntl:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+def parse_timestamp(timestamp):
+    """Parse a mm:ss or mm:ss.mmm timestamp into milliseconds.
+    
+    Raises ValueError if the timestamp is malformed.
+    """
+    parts = timestamp.strip().split(':')
+    if len(parts) != 2:
+        raise ValueError(f"invalid timestamp: {timestamp!r}")
+    
+    minutes = int(parts[0])
+    seconds_text, _, fraction = parts[1].partition('.')
+    seconds = int(seconds_text)
+    if fraction and not fraction.isdigit():
+        raise ValueError(f"invalid timestamp: {timestamp!r}")
+    
+    # Pad or trim the fraction to exactly three digits of milliseconds
+    milliseconds = int((fraction + "000")[:3])
+    return (minutes * 60 + seconds) * 1000 + milliseconds
@@ -0,0 +1,95 @@
+import os
+import json
+import numpy as np
+import pytest
+from conftest import FIXTURES
+from loopspot.analysis import AnalysisCache, snap_to_grid
+
+with open(os.path.join(FIXTURES, "audio_analysis.json")) as f:
+    ANALYSIS = json.load(f)  # 120 BPM: beats every 500 ms from 250 ms, bars every 2 s
+
+class FakeAnalysisAPI:
+    """Stands in for SpotifyPlayer.get_audio_analysis and counts requests."""
+    
+    def __init__(self, analysis=ANALYSIS):
+        self.analysis = analysis
+        self.calls = []
+    
+    def __call__(self, track_id):
+        self.calls.append(track_id)
+        if self.analysis is None:
+            raise RuntimeError("analysis unavailable")
+        return self.analysis
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return str(tmp_path)
+
+def test_grids_are_built_from_the_analysis(cache_dir):
+    grids = AnalysisCache(FakeAnalysisAPI(), storage_dir=cache_dir).get("track1")
+    assert grids["beat"][:3].tolist() == [250, 750, 1250]
+    assert grids["bar"].tolist() == [250, 2250, 4250, 6250]
+
+def test_snap_to_nearest_beat_and_bar(cache_dir):
+    grids = AnalysisCache(FakeAnalysisAPI(), storage_dir=cache_dir).get("track1")
+    assert snap_to_grid(grids["beat"], 1100) == 1250
+    assert snap_to_grid(grids["beat"], 900) == 750
+    assert snap_to_grid(grids["bar"], 3000) == 2250
+    assert snap_to_grid(grids["bar"], 3400) == 4250
+
+def test_snap_ties_go_to_the_earlier_point():
+    assert snap_to_grid(np.array([1000, 2000]), 1500) == 1000
+
+def test_snap_clamps_to_the_first_and_last_grid_point(cache_dir):
+    grids = AnalysisCache(FakeAnalysisAPI(), storage_dir=cache_dir).get("track1")
+    assert snap_to_grid(grids["beat"], 0) == 250
+    assert snap_to_grid(grids["beat"], 8500) == 7750
+    assert snap_to_grid(grids["bar"], 10 ** 6) == 6250
+
+def test_snap_arrays_and_empty_grids():
+    grid = np.array([250, 750, 1250])
+    assert snap_to_grid(grid, np.array([0, 600, 2000])).tolist() == [250, 750, 1250]
+    assert snap_to_grid(np.array([], dtype=np.int32), 1234) == 1234
+    assert snap_to_grid(None, 1234) == 1234
+    assert snap_to_grid(np.array([500]), 9000) == 500
+
+def test_cache_reloads_from_disk_without_fetching(cache_dir):
+    api = FakeAnalysisAPI()
+    first = AnalysisCache(api, storage_dir=cache_dir).get("track1")
+    
+    reloaded = AnalysisCache(api, storage_dir=cache_dir).get("track1")
+    assert api.calls == ["track1"]
+    assert reloaded["beat"].tolist() == first["beat"].tolist()
+    assert reloaded["bar"].tolist() == first["bar"].tolist()
+
+def test_memory_cache_is_lru(cache_dir):
+    api = FakeAnalysisAPI()
+    cache = AnalysisCache(api, storage_dir=cache_dir, memory_items=2)
+    cache.get("a")
+    cache.get("b")
+    cache.get("a")  # b is now the least recently used
+    cache.get("c")
+    assert list(cache._memory) == ["a", "c"]
+
+def test_disk_cache_evicts_least_recently_used_files(cache_dir):
+    api = FakeAnalysisAPI()
+    cache = AnalysisCache(api, storage_dir=cache_dir)
+    cache.get("a")
+    file_size = os.path.getsize(cache._path("a"))
+    cache.max_bytes = 2 * file_size
+    
+    cache.get("b")
+    os.utime(cache._path("a"), (1, 1))  # Make a the oldest file
+    os.utime(cache._path("b"), (2, 2))
+    cache.get("c")
+    
+    assert not os.path.exists(cache._path("a"))
+    assert os.path.exists(cache._path("b"))
+    assert os.path.exists(cache._path("c"))
+
+def test_unavailable_analysis_is_not_refetched(cache_dir):
+    api = FakeAnalysisAPI(analysis=None)
+    cache = AnalysisCache(api, storage_dir=cache_dir)
+    assert cache.get("track1") is None
+    assert cache.get("track1") is None
+    assert api.calls == ["track1"]
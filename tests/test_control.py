@@ -0,0 +1,41 @@
+import time
+import pytest
+from loopspot.control import ControlChannel
+
+@pytest.fixture
+def channel(tmp_path):
+    return ControlChannel(storage_dir=str(tmp_path))
+
+def recording_handler(calls):
+    def handle(action, params):
+        calls.append((action, params))
+        return {"ok": True}
+    return handle
+
+def test_command_is_answered(channel):
+    calls = []
+    channel.watch(recording_handler(calls), interval=0.01)
+    
+    command_id = channel.send("loop", expires_in=2.0, point_a=1000, point_b=2000)
+    
+    assert channel.wait_result(command_id, timeout=2.0) == {"ok": True}
+    assert calls == [("loop", {"point_a": 1000, "point_b": 2000})]
+
+def test_command_given_up_on_is_never_applied(channel):
+    command_id = channel.send("stop", expires_in=5.0)
+    assert channel.wait_result(command_id, timeout=0.1) is None
+    
+    # An engine host that starts right after the sender gave up must not run it
+    calls = []
+    channel.watch(recording_handler(calls), interval=0.01)
+    time.sleep(0.2)
+    assert calls == []
+
+def test_expired_command_is_ignored(channel):
+    channel.send("stop", expires_in=0.05)
+    time.sleep(0.1)
+    
+    calls = []
+    channel.watch(recording_handler(calls), interval=0.01)
+    time.sleep(0.2)
+    assert calls == []
@@ -0,0 +1,137 @@
+import threading
+import time
+import pytest
+from loopspot.loop_logic import LoopController
+
+DURATION = 6000
+NEXT_TRACK = "t2"
+
+class ClockPlayer:
+    """Fake player whose position follows the monotonic clock, with request latency.
+    
+    Like Spotify, it moves on to the next track when playback reaches the end,
+    or, with queue_end, stops at the start of the same track.
+    """
+    
+    def __init__(self, latency, start_ms, queue_end=False, slow_seek=None):
+        self.latency = latency  # Round trip of every request, in seconds
+        self.queue_end = queue_end
+        self.slow_seek = slow_seek  # Number of the seek that takes eight times as long
+        self.fanout_players = []
+        self.events = []
+        self.seeks = 0
+        self._lock = threading.Lock()
+        self._track, self._position, self._since, self._playing = "t1", start_ms, time.monotonic(), True
+        self._last = None
+    
+    def _position_now(self, now):
+        return self._position + ((now - self._since) * 1000 if self._playing else 0)
+    
+    def _advance(self):
+        now = time.monotonic()
+        if self._track != "t1" or not self._playing or self._position_now(now) < DURATION:
+            return
+        ended_at = self._since + (DURATION - self._position) / 1000
+        self.events.append(("advance",))
+        if self.queue_end:
+            self._track, self._position, self._since, self._playing = "t1", 0, now, False
+        else:
+            self._track, self._position, self._since = NEXT_TRACK, 0, ended_at
+    
+    def poll_state(self):
+        time.sleep(self.latency / 2)
+        with self._lock:
+            self._advance()
+            sampled_at = time.monotonic()
+            state = {"id": self._track, "progress_ms": int(self._position_now(sampled_at)),
+                     "is_playing": self._playing, "duration_ms": DURATION if self._track == "t1" else 200000}
+        time.sleep(self.latency / 2)
+        self._last = (state, sampled_at)
+        return state
+    
+    def sample_playback(self, max_age=0.0):
+        self.poll_state()
+        return self._last
+    
+    def get_current_track(self):
+        return self.poll_state()
+    
+    def seek_to_position_and_play(self, position_ms):
+        self.seeks += 1
+        latency = self.latency * (8 if self.seeks == self.slow_seek else 1)
+        time.sleep(latency / 2)
+        with self._lock:
+            self._advance()
+            self._position, self._since, self._playing = position_ms, time.monotonic(), True
+            self.events.append(("seek", self._track, position_ms))
+        time.sleep(latency / 2)
+        return True
+    
+    def seek_to_position(self, position_ms):
+        return self.seek_to_position_and_play(position_ms)
+    
+    def play_track(self, track_id, position_ms=None):
+        time.sleep(self.latency)
+        with self._lock:
+            self._track, self._position, self._since, self._playing = track_id, position_ms or 0, time.monotonic(), True
+            self.events.append(("play", track_id, position_ms))
+        return True
+    
+    def format_time(self, milliseconds, precise=False):
+        return str(milliseconds)
+
+def run_loop(player, point_a, point_b, seconds):
+    """Loop A-B on the fake player for a while; returns the loop state at the end."""
+    controller = LoopController(player)
+    controller._update_state(track_id="t1", point_a=point_a, point_b=point_b)
+    assert controller.start_loop()
+    try:
+        time.sleep(seconds)
+        return controller.state
+    finally:
+        controller.shutdown()
+
+def count(player, kind):
+    return sum(1 for event in player.events if event[0] == kind)
+
+@pytest.mark.parametrize("point_b, latency", [
+    (DURATION, 0.05),
+    (DURATION - 300, 0.1),
+    (DURATION - 600, 0.25),
+])
+def test_loop_near_the_track_end_keeps_running(point_b, latency):
+    point_a = point_b - 1200
+    player = ClockPlayer(latency, start_ms=point_a)
+    
+    state = run_loop(player, point_a, point_b, 3.5)
+    
+    assert state.active
+    assert count(player, "advance") == 0
+    assert count(player, "seek") >= 2
+    assert all(event[1] == "t1" and event[2] == point_a for event in player.events if event[0] == "seek")
+
+def test_auto_advance_restarts_the_loop():
+    point_a = DURATION - 1200
+    # The first jump is so slow that Spotify reaches the end and moves on before it lands
+    player = ClockPlayer(0.1, start_ms=point_a, slow_seek=1)
+    
+    state = run_loop(player, point_a, DURATION, 4.0)
+    
+    assert state.active
+    assert count(player, "advance") == 1
+    assert ("seek", NEXT_TRACK, point_a) in player.events
+    assert ("play", "t1", point_a) in player.events
+    # Looping goes on normally on the original track afterwards
+    restarted = player.events.index(("play", "t1", point_a))
+    assert any(event[:2] == ("seek", "t1") for event in player.events[restarted:])
+
+def test_queue_end_pause_loops_back():
+    point_a = DURATION - 1200
+    player = ClockPlayer(0.1, start_ms=point_a, queue_end=True, slow_seek=1)
+    
+    state = run_loop(player, point_a, DURATION, 3.0)
+    
+    assert state.active
+    assert count(player, "advance") == 1
+    assert count(player, "play") == 0
+    assert count(player, "seek") >= 2
@@ -0,0 +1,57 @@
+import os
+import sys
+import time
+import pytest
+from loopspot.keys import read_key, single_keys, _read_rest, KEY_ESCAPE, KEY_UP, KEY_DOWN, KEY_DELETE
+
+def read_from(payload):
+    """Decode one key from bytes written to a pipe; returns the key and any bytes left unread."""
+    read_fd, write_fd = os.pipe()
+    try:
+        os.write(write_fd, payload)
+        os.close(write_fd)
+        write_fd = None
+        key = _read_rest(read_fd, os.read(read_fd, 1))
+        return key, os.read(read_fd, 16)
+    finally:
+        os.close(read_fd)
+        if write_fd is not None:
+            os.close(write_fd)
+
+@pytest.mark.parametrize("payload, key", [
+    (b"a", "a"),
+    ("é".encode(), "é"),
+    ("€".encode(), "€"),
+    ("😀".encode(), "😀"),
+    (b"\x1b[A", KEY_UP),
+    (b"\x1bOB", KEY_DOWN),
+    (b"\x1b[3~", KEY_DELETE),
+    (b"\x1b", KEY_ESCAPE),
+])
+def test_reads_whole_keys(payload, key):
+    assert read_from(payload) == (key, b"")
+
+def test_unknown_sequence_is_consumed_as_one_key():
+    key, rest = read_from(b"\x1b[1;5Cx")
+    assert key == "\x1b[1;5C"
+    assert rest == b"x"
+
+def test_end_of_input_is_empty():
+    assert read_from(b"") == ("", b"")
+
+@pytest.mark.skipif(not hasattr(os, "openpty"), reason="needs a pseudo-terminal")
+def test_key_typed_between_reads_is_kept(monkeypatch):
+    controller_fd, terminal_fd = os.openpty()
+    terminal = os.fdopen(terminal_fd, "r")
+    monkeypatch.setattr(sys, "stdin", terminal)
+    try:
+        with single_keys():
+            os.write(controller_fd, b"a")
+            assert read_key(timeout=1)[0] == "a"
+            # Typed while point A is still being set, before the next read starts
+            os.write(controller_fd, b"b")
+            time.sleep(0.05)
+            assert read_key(timeout=1)[0] == "b"
+    finally:
+        terminal.close()
+        os.close(controller_fd)
@@ -0,0 +1,106 @@
+import pytest
+from loopspot.storage import LoopStorage
+from loopspot.rate_limit import RateBudget
+from loopspot.resilience import SpotifyAPIError, CIRCUIT_OPEN
+from loopspot.library_check import LibraryValidator, TrackMetadataCache, TRACKS_PER_REQUEST
+
+def catalog_track(track_id, name="Track", artist="Artist", duration_ms=200000, playable=True):
+    return {"id": track_id, "name": name, "artists": [{"name": artist}], "duration_ms": duration_ms,
+            "is_playable": playable}
+
+class FakeCatalogPlayer:
+    """Local stand-in for the batch tracks endpoint."""
+    
+    def __init__(self, catalog, failing=()):
+        self.catalog = catalog  # track ID -> track object; missing IDs come back as null
+        self.failing = set(failing)  # Requests containing these IDs fail
+        self.requests = []
+        self.rate_budget = RateBudget(rate=1000, burst=1000)
+    
+    def get_tracks(self, track_ids):
+        self.requests.append(list(track_ids))
+        assert len(track_ids) <= TRACKS_PER_REQUEST
+        if self.failing & set(track_ids):
+            raise SpotifyAPIError(CIRCUIT_OPEN, "circuit open")
+        return {"tracks": [self.catalog.get(track_id) for track_id in track_ids]}
+
+@pytest.fixture
+def storage(tmp_path):
+    return LoopStorage(storage_dir=str(tmp_path / "library"))
+
+@pytest.fixture
+def cache(tmp_path):
+    return TrackMetadataCache(storage_dir=str(tmp_path / "cache"))
+
+def test_renames_and_flags_loops(storage, cache):
+    storage.save_loop("renamed", "Old Name", "Old Artist", 1000, 2000)
+    storage.save_loop("gone", "Gone", "Artist", 1000, 2000)
+    storage.save_loop("short", "Short", "Artist", 1000, 90000)
+    player = FakeCatalogPlayer({
+        "renamed": catalog_track("renamed", name="New Name", artist="New Artist"),
+        "short": catalog_track("short", name="Short", duration_ms=60000)
+    })
+    
+    report = LibraryValidator(player, storage, cache=cache).run()
+    
+    assert report["renamed"] == 1
+    assert report["unchecked"] == 0
+    assert sorted(issue for _, _, issue in report["flagged"]) == ["outside_duration", "unavailable"]
+    assert storage.loops["renamed"][0]["track_name"] == "New Name"
+    assert storage.loops["short"][0]["point_b"] == 90000
+
+def test_repair_clamps_and_relinks(storage, cache):
+    storage.save_loop("short", "Short", "Artist", 1000, 90000)
+    storage.save_loop("old-id", "Relinked", "Artist", 1000, 2000)
+    player = FakeCatalogPlayer({
+        "short": catalog_track("short", name="Short", duration_ms=60000),
+        "old-id": catalog_track("new-id", name="Relinked")
+    })
+    
+    report = LibraryValidator(player, storage, cache=cache).run(repair=True)
+    
+    assert report["repaired"] == 1
+    assert report["relinked"] == 1
+    assert storage.loops["short"][0]["point_b"] == 60000
+    assert "old-id" not in storage.loops
+    assert storage.loops["new-id"][0]["track_name"] == "Relinked"
+
+def test_requests_are_batched_and_cached(storage, cache):
+    track_ids = [f"track{i:03d}" for i in range(120)]
+    storage.add_loops([{"track_id": track_id, "name": "Loop 1", "track_name": "Track", "artist": "Artist",
+                        "point_a": 0, "point_b": 1000} for track_id in track_ids])
+    player = FakeCatalogPlayer({track_id: catalog_track(track_id) for track_id in track_ids})
+    
+    LibraryValidator(player, storage, cache=cache).run()
+    assert sorted(len(ids) for ids in player.requests) == [20, 50, 50]
+    
+    LibraryValidator(player, storage, cache=cache).run()
+    assert len(player.requests) == 3  # Every track came from the cache the second time
+
+def test_failed_batch_is_reported_and_the_rest_applied(storage, cache):
+    track_ids = [f"track{i:03d}" for i in range(100)]
+    storage.add_loops([{"track_id": track_id, "name": "Loop 1", "track_name": "Old", "artist": "Artist",
+                        "point_a": 0, "point_b": 1000} for track_id in track_ids])
+    player = FakeCatalogPlayer({track_id: catalog_track(track_id, name="New") for track_id in track_ids},
+                               failing={"track000"})
+    
+    report = LibraryValidator(player, storage, cache=cache, max_concurrency=1).run()
+    
+    assert report["unchecked"] == 50
+    assert report["renamed"] == 50
+    assert report["flagged"] == []  # Unchecked tracks are not mistaken for removed ones
+    renamed = [track_id for track_id in track_ids if storage.loops[track_id][0]["track_name"] == "New"]
+    assert len(renamed) == 50
+
+def test_apply_track_metadata_stamps_only_changed_loops(storage):
+    storage.save_loop("same", "Track", "Artist", 1000, 2000)
+    storage.save_loop("changed", "Old", "Artist", 1000, 2000)
+    versions = {track_id: storage.loops[track_id][0]["version"] for track_id in ("same", "changed")}
+    
+    storage.apply_track_metadata({
+        "same": {"id": "same", "name": "Track", "artist": "Artist", "duration_ms": 200000, "is_playable": True},
+        "changed": {"id": "changed", "name": "New", "artist": "Artist", "duration_ms": 200000, "is_playable": True}
+    })
+    
+    assert storage.loops["same"][0]["version"] == versions["same"]
+    assert storage.loops["changed"][0]["version"] > versions["changed"]
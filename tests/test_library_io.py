@@ -0,0 +1,52 @@
+import json
+import pytest
+from loopspot.storage import LoopStorage
+from loopspot.library_io import import_library, export_library
+
+def write_dump(path, count, track_id="track1"):
+    with open(path, "w") as f:
+        for i in range(count):
+            f.write(json.dumps({"track_id": track_id, "name": f"Loop {i}", "track_name": "Track", "artist": "Artist",
+                                "point_a": i * 1000, "point_b": i * 1000 + 500, "created": "2024-01-01 00:00:00",
+                                "last_used": "2024-01-01 00:00:00", "use_count": 0}) + "\n")
+
+@pytest.fixture
+def storage(tmp_path):
+    return LoopStorage(storage_dir=str(tmp_path / "library"))
+
+def test_import_writes_the_library_once(storage, tmp_path, monkeypatch):
+    dump = tmp_path / "dump.jsonl"
+    write_dump(dump, 250)
+    saves = []
+    original_save = storage._save_loops
+    monkeypatch.setattr(storage, "_save_loops", lambda: (saves.append(1), original_save()))
+    
+    stats = import_library(storage, str(dump), batch_size=40, workers=1)
+    
+    assert stats == {"imported": 250, "duplicates": 0, "rejected": 0}
+    assert len(saves) == 1
+    assert len(LoopStorage(storage_dir=str(tmp_path / "library")).loops["track1"]) == 250
+
+def test_import_skips_duplicates_of_the_library_and_the_dump(storage, tmp_path):
+    storage.save_loop("track1", "Track", "Artist", 0, 500)
+    dump = tmp_path / "dump.jsonl"
+    write_dump(dump, 3)
+    with open(dump, "a") as f:
+        f.write(open(dump).readline())  # The first record again
+        f.write("not json\n")
+    
+    stats = import_library(storage, str(dump), workers=1)
+    
+    assert stats == {"imported": 2, "duplicates": 2, "rejected": 1}
+    assert [loop["point_a"] for loop in storage.loops["track1"]] == [0, 1000, 2000]
+
+def test_export_import_round_trip(storage, tmp_path):
+    storage.save_loop("track1", "Track", "Artist", 1000, 2000, name="Intro")
+    storage.save_loop("track2", "Other", "Someone", 3000, 4000, name="Chorus")
+    
+    for fmt in ("jsonl", "csv", "bin"):
+        path = str(tmp_path / f"export.{fmt}")
+        assert export_library(storage, path, fmt) == 2
+        target = LoopStorage(storage_dir=str(tmp_path / f"target-{fmt}"))
+        assert import_library(target, path, fmt, workers=1)["imported"] == 2
+        assert target.loops["track2"][0]["name"] == "Chorus"
@@ -0,0 +1,41 @@
+import queue
+import logging
+import logging.handlers
+from loopspot.log import DuplicateFilter, SinkListener
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+    
+    def emit(self, record):
+        self.records.append(record)
+
+def make_record(message, created):
+    record = logging.LogRecord("loopspot.test", logging.WARNING, __file__, 1, message, None, None)
+    record.created = created
+    return record
+
+def test_duplicate_filter_counts_repeats():
+    handler = ListHandler()
+    handler.addFilter(DuplicateFilter(window=30.0))
+    for created in (0.0, 1.0, 2.0):
+        handler.handle(make_record("Spotify API unavailable", created))
+    handler.handle(make_record("Recovered", 3.0))
+    
+    assert [record.getMessage() for record in handler.records] == ["Spotify API unavailable", "Recovered"]
+    assert handler.records[1].previous_repeats == 2
+
+def test_repeat_counts_stay_in_their_sink():
+    deduplicated, other = ListHandler(), ListHandler()
+    deduplicated.addFilter(DuplicateFilter(window=30.0))
+    log_queue = queue.SimpleQueue()
+    listener = SinkListener(log_queue, deduplicated, other)
+    listener.start()
+    for created in (0.0, 1.0, 2.0, 40.0):
+        log_queue.put(make_record("Spotify API unavailable", created))
+    listener.stop()
+    
+    assert [getattr(record, "repeats", None) for record in deduplicated.records] == [None, 2]
+    assert len(other.records) == 4
+    assert all(getattr(record, "repeats", None) is None for record in other.records)
@@ -0,0 +1,68 @@
+import pytest
+from loopspot.loop_logic import LoopController
+from loopspot.resilience import CircuitBreaker, SpotifyAPIError, RATE_LIMITED, TRANSIENT
+
+class FlakyPlayer:
+    """Player whose playback requests fail while `failing` is set."""
+    
+    def __init__(self, track):
+        self.track = track
+        self.failing = False
+        self.seeks = []
+        self.fanout_players = []
+    
+    def sample_playback(self, max_age=0.0):
+        if self.failing:
+            raise SpotifyAPIError(TRANSIENT, "timed out")
+        return dict(self.track), 0.0
+    
+    def seek_to_position(self, position_ms):
+        self.seeks.append(position_ms)
+        return True
+    
+    def seek_to_position_and_play(self, position_ms):
+        return self.seek_to_position(position_ms)
+    
+    def format_time(self, ms, precise=False):
+        return f"{ms}ms"
+
+@pytest.fixture
+def controller():
+    player = FlakyPlayer({"id": "t1", "progress_ms": 5000, "is_playing": True, "duration_ms": 200000})
+    controller = LoopController(player)
+    controller._ensure_engine = lambda: None  # No engine thread needed to check the state
+    controller.set_point_a_timestamp("0:10")
+    controller.set_point_b_timestamp("0:20")
+    return controller
+
+def test_start_loop_keeps_points_when_spotify_fails(controller, capsys):
+    controller.player.failing = True
+    assert not controller.start_loop()
+    assert "Spotify unavailable, try again." in capsys.readouterr().out
+    assert (controller.point_a, controller.point_b, controller.current_track_id) == (10000, 20000, "t1")
+    
+    controller.player.failing = False
+    assert controller.start_loop()
+    assert controller.active
+
+def test_point_and_load_commands_keep_state_when_spotify_fails(controller, capsys):
+    controller.player.failing = True
+    assert not controller.set_point_a()
+    assert not controller.set_point_b_timestamp("0:30")
+    assert not controller.load_loop({"track_id": "t1", "point_a": 1000, "point_b": 2000})
+    assert capsys.readouterr().out.count("Spotify unavailable, try again.") == 3
+    assert (controller.point_a, controller.point_b) == (10000, 20000)
+
+def test_start_loop_clears_points_when_track_changed(controller):
+    controller.player.track["id"] = "t2"
+    assert not controller.start_loop()
+    assert controller.point_a is None and controller.point_b is None
+
+def test_rate_limit_opens_circuit_for_retry_after():
+    breaker = CircuitBreaker(reset_timeout=10.0)
+    breaker.record_failure(RATE_LIMITED, retry_after=2)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker._open_for == 2
+    
+    breaker.record_failure(RATE_LIMITED)
+    assert breaker._open_for == 10.0
@@ -0,0 +1,41 @@
+import json
+import pytest
+from loopspot.storage import LoopStorage, StorageError
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = LoopStorage(storage_dir=str(tmp_path / "library"))
+    storage.save_loop("track1", "Track", "Artist", 1000, 2000, name="Verse")
+    return storage
+
+def corrupt(storage):
+    """Leave a truncated library file behind, as an interrupted writer would."""
+    with open(storage.storage_path, "r") as f:
+        content = f.read()
+    with open(storage.storage_path, "w") as f:
+        f.write(content[:len(content) // 2])
+    return content[:len(content) // 2]
+
+def test_unreadable_file_keeps_loops_in_memory(storage):
+    corrupt(storage)
+    
+    assert storage.refresh() == set()
+    assert [loop["name"] for loop in storage.loops["track1"]] == ["Verse"]
+
+def test_write_over_unreadable_file_is_refused(storage):
+    truncated = corrupt(storage)
+    
+    with pytest.raises(StorageError):
+        storage.save_loop("track2", "Other", "Artist", 1000, 2000)
+    with open(storage.storage_path, "r") as f:
+        assert f.read() == truncated
+    assert "track2" not in storage.loops
+
+def test_reload_after_repair_picks_up_changes(storage):
+    corrupt(storage)
+    other = {"track3": [dict(storage.loops["track1"][0], id="other")]}
+    with open(storage.storage_path, "w") as f:
+        json.dump(other, f)
+    
+    assert storage.refresh() == {"track1", "track3"}
+    assert list(storage.loops) == ["track3"]
@@ -0,0 +1,89 @@
+import time
+import threading
+import pytest
+import requests
+from loopspot.storage import LoopStorage
+from loopspot.sync import SyncHub, SyncServer, SyncClient
+
+@pytest.fixture
+def libraries(tmp_path):
+    """Two libraries on different machines, with one loop synced from the first to the second."""
+    first = LoopStorage(storage_dir=str(tmp_path / "first"))
+    second = LoopStorage(storage_dir=str(tmp_path / "second"))
+    first.save_loop("track1", "Track", "Artist", 1000, 2000, name="Verse")
+    second.apply_remote_changes(first.local_changes(""))
+    return first, second
+
+def test_using_a_loop_creates_no_sync_changes(libraries):
+    first, second = libraries
+    loop = second.loops["track1"][0]
+    
+    second.mark_used("track1", loop["id"])
+    
+    assert second.loops["track1"][0]["use_count"] == 1
+    assert second.local_changes("") == []
+
+def test_synced_edit_keeps_local_usage(libraries):
+    first, second = libraries
+    loop_id = second.loops["track1"][0]["id"]
+    second.mark_used("track1", loop_id)
+    used = dict(second.loops["track1"][0])
+    pushed = first.local_changes("")[-1]["version"]
+    
+    first.update_loop("track1", 0, point_b=3000)
+    assert second.apply_remote_changes(first.local_changes(pushed)) == 1
+    
+    loop = second.find_loop("track1", loop_id)
+    assert loop["point_b"] == 3000
+    assert (loop["use_count"], loop["last_used"]) == (used["use_count"], used["last_used"])
+
+@pytest.fixture
+def server(tmp_path):
+    """Sync server on a free loopback port."""
+    server = SyncServer(SyncHub(storage_dir=str(tmp_path / "hub")), host="127.0.0.1", port=0, token="secret")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+def sync(storage, url):
+    return SyncClient(storage, url, token="secret", timeout=5).sync()
+
+def test_round_trip_through_server(tmp_path, server):
+    first = LoopStorage(storage_dir=str(tmp_path / "first"))
+    second = LoopStorage(storage_dir=str(tmp_path / "second"))
+    loop = first.save_loop("track1", "Track", "Artist", 1000, 2000, name="Verse")
+    
+    # Push from the first library, pull into the second
+    assert sync(first, server)["pushed"] == 1
+    stats = sync(second, server)
+    assert (stats["pushed"], stats["pulled"], stats["applied"]) == (0, 1, 1)
+    assert second.find_loop("track1", loop["id"])["point_b"] == 2000
+    
+    # Nothing changed since the saved cursors, so the next exchanges are empty
+    for storage in (first, second):
+        stats = sync(storage, server)
+        assert (stats["pushed"], stats["pulled"]) == (0, 0)
+    
+    # Concurrent edits: the later version wins on both sides
+    first.update_loop("track1", 0, point_b=3000)
+    time.sleep(0.01)
+    second.update_loop("track1", 0, point_b=4000)
+    sync(first, server)
+    sync(second, server)
+    sync(first, server)
+    assert first.find_loop("track1", loop["id"])["point_b"] == 4000
+    assert second.find_loop("track1", loop["id"])["point_b"] == 4000
+    
+    # A delete travels as a tombstone
+    assert first.delete_loop("track1", 0)
+    assert sync(first, server)["pushed"] == 1
+    assert sync(second, server)["applied"] == 1
+    assert second.find_loop("track1", loop["id"]) is None
+    assert loop["id"] in second.sync_state.tombstones
+
+def test_server_rejects_wrong_token(tmp_path, server):
+    storage = LoopStorage(storage_dir=str(tmp_path / "library"))
+    with pytest.raises(requests.HTTPError):
+        SyncClient(storage, server, token="wrong", timeout=5).sync()